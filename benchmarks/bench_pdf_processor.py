@@ -0,0 +1,209 @@
+"""PDF处理各阶段的性能基准
+
+本地生成合成PDF（纯文字、扫描图片、A3/A4混排，1-500页），分别测量
+add_watermark、convert_pdf_to_images、watermark_and_convert的耗时、每秒页数、
+峰值RSS和每页输出字节数，并与保存的基线对比，超出容差时以退出码1结束。
+
+    python benchmarks/bench_pdf_processor.py                  # 快速用例并与基线对比
+    python benchmarks/bench_pdf_processor.py --full           # 包含100页和500页用例
+    python benchmarks/bench_pdf_processor.py --save-baseline  # 把本次结果写入基线
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "wechat_publisher_bench_corpus")
+WATERMARK_IMAGE = os.path.join(ROOT, "resources", "watermark.png")
+
+CORPORA = ("text", "scanned", "mixed")
+STAGES = ("add_watermark", "convert_pdf_to_images", "watermark_and_convert")
+QUICK_PAGES = (1, 20)
+FULL_PAGES = (1, 20, 100, 500)
+
+# 与基线对比的指标：(指标名, 越大越好)
+METRICS = (("pages_per_sec", True), ("peak_rss_mb", False), ("bytes_per_page", False))
+
+WORDS = ("paper", "exam", "answer", "question", "score", "review", "chapter", "figure", "table", "result")
+
+
+def make_corpus(kind, pages, corpus_dir=DEFAULT_CORPUS_DIR):
+    """生成（或复用已生成的）合成PDF，返回路径；内容由随机种子固定，多次生成结果一致"""
+    from reportlab.lib.pagesizes import A3, A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f"{kind}_{pages}.pdf")
+    if os.path.exists(path):
+        return path
+    rng = random.Random(f"{kind}-{pages}")
+    scans = [ImageReader(_scan_image(rng)) for _ in range(4)] if kind == "scanned" else None
+    tmp_path = path + ".tmp"
+    c = canvas.Canvas(tmp_path)
+    for page_num in range(pages):
+        pagesize = A3 if kind == "mixed" and page_num % 3 == 2 else A4
+        c.setPageSize(pagesize)
+        width, height = pagesize
+        if kind == "scanned":
+            # 扫描件：每页一张约150 DPI的灰度图片
+            c.drawImage(scans[page_num % len(scans)], 0, 0, width=width, height=height)
+        else:
+            c.setFont("Helvetica", 10)
+            for y in range(int(height) - 50, 40, -14):
+                c.drawString(40, y, " ".join(rng.choice(WORDS) for _ in range(int(width) // 45)))
+        c.showPage()
+    c.save()
+    os.replace(tmp_path, path)
+    return path
+
+
+def _scan_image(rng):
+    """模拟扫描页：白底上的深色文字行加轻微噪点"""
+    from PIL import Image, ImageDraw
+    image = Image.new("L", (1240, 1754), 245)
+    draw = ImageDraw.Draw(image)
+    for y in range(80, 1680, 30):
+        x = 80
+        while x < 1120:
+            word = rng.randint(20, 90)
+            draw.rectangle((x, y, min(x + word, 1160), y + 14), fill=rng.randint(20, 70))
+            x += word + rng.randint(10, 25)
+    noise = Image.effect_noise(image.size, 12)
+    return Image.blend(image, noise, 0.08)
+
+
+def run_case(kind, pages, stage, render_workers=1, corpus_dir=DEFAULT_CORPUS_DIR):
+    """在当前进程中运行一个用例，返回指标字典；峰值RSS按进程统计，应在独立子进程中调用"""
+    from file_manager import FileManager
+    from pdf_processor import PDFProcessor
+
+    pdf_path = make_corpus(kind, pages, corpus_dir)
+    with tempfile.TemporaryDirectory() as output_dir:
+        file_manager = FileManager(desktop_path=corpus_dir, output_base_path=output_dir)
+        processor = PDFProcessor(file_manager, watermark_image=WATERMARK_IMAGE, render_workers=render_workers)
+        try:
+            start = time.perf_counter()
+            if stage == "add_watermark":
+                output_pdf = os.path.join(output_dir, "watermarked.pdf")
+                processor.add_watermark(pdf_path, output_pdf)
+                output_bytes = os.path.getsize(output_pdf)
+            else:
+                if stage == "convert_pdf_to_images":
+                    folder = processor.convert_pdf_to_images(pdf_path)
+                else:
+                    folder = processor.watermark_and_convert(pdf_path)
+                output_bytes = sum(entry.stat().st_size for entry in os.scandir(folder))
+            seconds = time.perf_counter() - start
+        finally:
+            processor.close()
+    return {
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(pages / seconds, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "bytes_per_page": round(output_bytes / pages),
+    }
+
+
+def _peak_rss_mb():
+    """本进程及已结束子进程（渲染进程池）的峰值RSS之和，单位MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux上ru_maxrss单位为KB，macOS上为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_isolated(kind, pages, stage, render_workers=1, corpus_dir=DEFAULT_CORPUS_DIR):
+    """在新的子进程中运行用例，使峰值RSS只反映该用例"""
+    make_corpus(kind, pages, corpus_dir)
+    case = json.dumps({"kind": kind, "pages": pages, "stage": stage,
+                       "render_workers": render_workers, "corpus_dir": corpus_dir})
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", case],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def case_key(kind, pages, stage):
+    return f"{stage}/{kind}/{pages}"
+
+
+def compare(results, baseline, tolerance=0.2):
+    """与基线对比，返回回退列表[(用例, 指标, 基线值, 本次值)]；基线中没有的用例跳过"""
+    regressions = []
+    for key, metrics in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            if metric not in expected:
+                continue
+            if higher_is_better:
+                regressed = metrics[metric] < expected[metric] * (1 - tolerance)
+            else:
+                regressed = metrics[metric] > expected[metric] * (1 + tolerance)
+            if regressed:
+                regressions.append((key, metric, expected[metric], metrics[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF processing stages on synthetic PDFs")
+    parser.add_argument("--full", action="store_true", help="Include the 100- and 500-page cases")
+    parser.add_argument("--corpus", choices=CORPORA, action="append", help="Only run these corpora")
+    parser.add_argument("--stage", choices=STAGES, action="append", help="Only run these stages")
+    parser.add_argument("--pages", type=int, action="append", help="Only run these page counts")
+    parser.add_argument("--render-workers", type=int, default=1, help="PDFProcessor render_workers")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to the baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Where the synthetic PDFs are cached")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        case = json.loads(args.run_case)
+        print(json.dumps(run_case(**case)))
+        return 0
+
+    page_counts = args.pages or (FULL_PAGES if args.full else QUICK_PAGES)
+    results = {}
+    for stage in args.stage or STAGES:
+        for kind in args.corpus or CORPORA:
+            for pages in page_counts:
+                key = case_key(kind, pages, stage)
+                results[key] = run_isolated(kind, pages, stage, args.render_workers, args.corpus_dir)
+                metrics = results[key]
+                print(f"{key:<40} {metrics['seconds']:>8.2f}s {metrics['pages_per_sec']:>8.1f} 页/秒 "
+                      f"{metrics['peak_rss_mb']:>8.1f} MB {metrics['bytes_per_page']:>10} 字节/页", flush=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "cpus": os.cpu_count(),
+                       "results": dict(sorted(baseline.items()))}, f, ensure_ascii=False, indent=1)
+        print(f"基线已保存：{args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for key, metric, expected, actual in regressions:
+        print(f"性能回退：{key} {metric} 基线 {expected}，本次 {actual}")
+    if not baseline:
+        print(f"未找到基线，使用 --save-baseline 生成：{args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
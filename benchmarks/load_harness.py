@@ -0,0 +1,133 @@
+"""端到端压测：在本地模拟微信接口上运行main.main()
+
+启动wechat_standin模拟服务，生成内容互不相同的合成PDF（避免命中上传缓存），
+把WECHAT_API_BASE指向模拟服务后多轮调用main.main()，输出每小时文章数和服务端统计，
+用于离线调整上传并发、限流和重试参数。
+
+    python benchmarks/load_harness.py --pdfs 8 --pages 3 --latency 0.2 --quota-error-rate 0.05
+    UPLOAD_RATE=10 python benchmarks/load_harness.py --upload-workers 8 --rate-limit 20
+    python benchmarks/load_harness.py --accounts 3   # 多公众号模式
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(os.path.dirname(ROOT), "src"))
+
+import wechat_standin  # noqa: E402
+from bench_pdf_processor import WATERMARK_IMAGE, WORDS  # noqa: E402
+
+COVER_IMAGE = os.path.join(os.path.dirname(ROOT), "resources", "cover_image.jpg")
+
+
+def make_pdf(path, pages, seed):
+    """生成一份按seed区分内容的文字PDF，每页都不相同；行距与试卷相近，编码后不超过uploadimg的1MB限制"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    width, height = A4
+    c = canvas.Canvas(path, pagesize=A4)
+    for page_num in range(pages):
+        c.setFont("Helvetica", 10)
+        c.drawString(40, height - 30, f"{seed} page {page_num + 1}")
+        for y in range(int(height) - 60, 40, -28):
+            c.drawString(40, y, " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))))
+        c.showPage()
+    c.save()
+    return path
+
+
+def run_round(base_url, work_dir, round_num, pdfs, pages, env=None):
+    """生成一批PDF并运行一次main.main()，返回耗时（秒）"""
+    import main as app
+
+    pdf_folder = os.path.join(work_dir, f"round_{round_num}")
+    os.makedirs(pdf_folder, exist_ok=True)
+    for index in range(pdfs):
+        make_pdf(os.path.join(pdf_folder, f"doc_{round_num}_{index + 1:03d}.pdf"), pages,
+                 seed=f"{work_dir}-{round_num}-{index}")
+
+    environ = {
+        "WECHAT_APPID": "standin_appid",
+        "WECHAT_APPSECRET": "standin_secret",
+        "WECHAT_API_BASE": base_url,
+        "OUTPUT_BASE_PATH": os.path.join(work_dir, "output"),
+        "TOKEN_CACHE_DIR": work_dir,
+        "UPLOAD_CACHE_PATH": os.path.join(work_dir, "upload_cache.sqlite3"),
+        "RUN_REPORT_PATH": os.path.join(work_dir, f"run_report_{round_num}.json"),
+        "WATERMARK_IMAGE": WATERMARK_IMAGE,
+        "COVER_IMAGE_PATH": COVER_IMAGE,
+        # 合成PDF刚写入，不等待写入完成判定
+        "SCAN_SETTLE_SECONDS": "0",
+    }
+    environ.update(env or {})
+    os.makedirs(environ["OUTPUT_BASE_PATH"], exist_ok=True)
+    start = time.perf_counter()
+    with mock.patch.dict(os.environ, environ), mock.patch.object(sys, "argv", ["main.py", "--folder", pdf_folder]):
+        app.main()
+    return time.perf_counter() - start
+
+
+def run_load(config, pdfs=8, pages=3, rounds=1, env=None):
+    """启动模拟服务跑完所有轮次，返回结果摘要；多公众号模式下文章数按账号累计"""
+    accounts = len((env or {}).get("WECHAT_ACCOUNTS", "x").split(","))
+    with tempfile.TemporaryDirectory() as work_dir, wechat_standin.WeChatStandinServer(config) as server:
+        seconds = sum(run_round(server.base_url, work_dir, round_num, pdfs, pages, env)
+                      for round_num in range(1, rounds + 1))
+        stats = server.stats()
+    return {
+        "seconds": round(seconds, 3),
+        "articles": stats["articles"],
+        "expected_articles": pdfs * rounds * accounts,
+        "articles_per_hour": round(stats["articles"] / seconds * 3600, 1) if seconds else 0.0,
+        "pages_per_sec": round(stats.get("requests:media/uploadimg", 0) / seconds, 3) if seconds else 0.0,
+        "server": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive main.main() against the local WeChat API stand-in")
+    parser.add_argument("--pdfs", type=int, default=8, help="PDFs per round (sharded into drafts of at most 8)")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per PDF")
+    parser.add_argument("--rounds", type=int, default=1, help="Number of main.main() runs")
+    parser.add_argument("--accounts", type=int, default=1, help="Publish to this many accounts (fan-out mode)")
+    parser.add_argument("--upload-workers", type=int, default=None, help="Override UPLOAD_WORKERS")
+    parser.add_argument("--upload-rate", type=float, default=None, help="Override UPLOAD_RATE")
+    parser.add_argument("--verbose", action="store_true", help="Show the application log")
+    wechat_standin.add_arguments(parser)
+    args = parser.parse_args()
+
+    import main as app  # noqa: F401  导入时配置日志，之后再调整级别
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    env = {}
+    if args.accounts > 1:
+        names = [f"account{index}" for index in range(1, args.accounts + 1)]
+        env["WECHAT_ACCOUNTS"] = ",".join(names)
+        for name in names:
+            env[f"WECHAT_APPID_{name.upper()}"] = f"standin_{name}"
+            env[f"WECHAT_APPSECRET_{name.upper()}"] = "standin_secret"
+    if args.upload_workers is not None:
+        env["UPLOAD_WORKERS"] = str(args.upload_workers)
+    if args.upload_rate is not None:
+        env["UPLOAD_RATE"] = str(args.upload_rate)
+    result = run_load(wechat_standin.config_from_args(args), pdfs=args.pdfs, pages=args.pages,
+                      rounds=args.rounds, env=env)
+    print(json.dumps(result, ensure_ascii=False, indent=1))
+    print(f"{result['articles']}/{result['expected_articles']} 篇文章，耗时 {result['seconds']:.1f}秒，"
+          f"{result['articles_per_hour']:.0f} 篇/小时")
+    return 0 if result["articles"] == result["expected_articles"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
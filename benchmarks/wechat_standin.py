@@ -0,0 +1,334 @@
+"""本地微信接口模拟服务
+
+实现cgi-bin/token、material/add_material、media/uploadimg、draft/add
+（以及缓存校验用到的material/get_material和图片HEAD请求），
+延迟、5xx错误率、配额错误码、token失效、每秒请求上限和图片大小限制均可配置，
+用于离线压测上传并发和重试策略。
+
+    python benchmarks/wechat_standin.py --port 8900 --latency 0.2 --quota-error-rate 0.05
+    WECHAT_API_BASE=http://127.0.0.1:8900 python src/main.py
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StandinConfig:
+    """模拟服务的行为配置"""
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, quota_error_rate=0.0,
+                 quota_errcode=45009, invalid_token_rate=0.0, token_ttl=7200, rate_limit=None,
+                 uploadimg_max_bytes=1024 * 1024, material_max_bytes=10 * 1024 * 1024, max_articles=8,
+                 seed=None):
+        # 每个请求的固定延迟加上[0, latency_jitter)的随机延迟，单位秒
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        # 返回HTTP 503的概率
+        self.error_rate = error_rate
+        # 上传接口返回配额错误码（默认45009）的概率
+        self.quota_error_rate = quota_error_rate
+        self.quota_errcode = quota_errcode
+        # 已登录请求的token随机作废并返回40001（token被其他进程刷新等）的概率
+        self.invalid_token_rate = invalid_token_rate
+        # token有效期，过期后返回42001
+        self.token_ttl = token_ttl
+        # 上传与草稿接口每秒最多处理的请求数，超出时返回45011
+        self.rate_limit = rate_limit
+        # 图片大小限制：uploadimg 1MB，永久素材10MB
+        self.uploadimg_max_bytes = uploadimg_max_bytes
+        self.material_max_bytes = material_max_bytes
+        # 单个草稿最多包含的文章数，超出时返回45008
+        self.max_articles = max_articles
+        self.seed = seed
+
+
+class WeChatStandinServer(ThreadingHTTPServer):
+    """模拟微信公众号接口的本地HTTP服务，记录各接口的调用统计"""
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.config = config or StandinConfig()
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tokens = {}
+        self._images = set()
+        self._materials = set()
+        self._window = (0, 0)
+        self._thread = None
+        self.drafts = []
+        self.counters = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中运行，返回self"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def stats(self):
+        """返回调用统计：各接口请求数、错误码次数、上传字节数、草稿和文章数"""
+        with self.lock:
+            return dict(self.counters, drafts=len(self.drafts), articles=sum(len(d) for d in self.drafts))
+
+    def chance(self, probability):
+        with self.lock:
+            return probability > 0 and self.random.random() < probability
+
+    def next_id(self):
+        with self.lock:
+            return next(self._ids)
+
+    def issue_token(self):
+        token = f"standin_token_{self.next_id()}"
+        with self.lock:
+            self._tokens[token] = time.monotonic() + self.config.token_ttl
+        return token
+
+    def check_token(self, token):
+        """校验access_token，返回错误码或None"""
+        with self.lock:
+            expires_at = self._tokens.get(token)
+        if expires_at is None:
+            return 40001
+        if time.monotonic() >= expires_at:
+            return 42001
+        if self.chance(self.config.invalid_token_rate):
+            # 模拟token在别处被刷新而作废：之后再用该token同样失败
+            with self.lock:
+                self._tokens.pop(token, None)
+            return 40001
+        return None
+
+    def acquire_rate(self):
+        """按每秒请求上限放行，超出时返回False"""
+        if not self.config.rate_limit:
+            return True
+        second = int(time.monotonic())
+        with self.lock:
+            window, used = self._window
+            if window != second:
+                window, used = second, 0
+            allowed = used < self.config.rate_limit
+            self._window = (window, used + 1 if allowed else used)
+        return allowed
+
+    def add_image(self, kind):
+        identifier = self.next_id()
+        with self.lock:
+            if kind == "material":
+                media_id = f"standin_media_{identifier}"
+                self._materials.add(media_id)
+                return media_id
+            path = f"/mmbiz/{identifier}.png"
+            self._images.add(path)
+        return f"{self.base_url}{path}"
+
+    def has_image(self, path):
+        with self.lock:
+            return path in self._images
+
+    def has_material(self, media_id):
+        with self.lock:
+            return media_id in self._materials
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_HEAD(self):
+        path = urlsplit(self.path).path
+        self._delay()
+        self.send_response(200 if self.server.has_image(path) else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _handle(self, method):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        endpoint = parts.path[len("/cgi-bin/"):] if parts.path.startswith("/cgi-bin/") else parts.path
+        server = self.server
+        server.count(f"requests:{endpoint}")
+        self._delay()
+
+        if server.chance(server.config.error_rate):
+            server.count("http_503")
+            return self._send(503, {"errcode": -1, "errmsg": "service unavailable"})
+
+        routes = {
+            ("GET", "token"): self._token,
+            ("POST", "material/add_material"): self._add_material,
+            ("POST", "media/uploadimg"): self._uploadimg,
+            ("POST", "draft/add"): self._draft_add,
+            ("POST", "material/get_material"): self._get_material,
+        }
+        handler = routes.get((method, endpoint))
+        if handler is None:
+            return self._send(404, {"errcode": 404, "errmsg": "not found"})
+        if endpoint != "token":
+            errcode = server.check_token(query.get("access_token"))
+            if errcode is not None:
+                return self._error(errcode, "invalid credential" if errcode == 40001 else "access_token expired")
+            if not server.acquire_rate():
+                return self._error(45011, "api minute-quota reach limit")
+        return handler(query, body)
+
+    def _token(self, query, body):
+        if not query.get("appid") or not query.get("secret"):
+            return self._error(40013, "invalid appid")
+        return self._send(200, {"access_token": self.server.issue_token(), "expires_in": self.server.config.token_ttl})
+
+    def _add_material(self, query, body):
+        return self._upload(body, "material", self.server.config.material_max_bytes)
+
+    def _uploadimg(self, query, body):
+        return self._upload(body, "uploadimg", self.server.config.uploadimg_max_bytes)
+
+    def _upload(self, body, kind, max_bytes):
+        server = self.server
+        if server.chance(server.config.quota_error_rate):
+            return self._error(server.config.quota_errcode, "reach max api daily quota limit")
+        media = _multipart_file(self.headers.get("Content-Type", ""), body, "media")
+        if media is None:
+            return self._error(41005, "media data missing")
+        if len(media) > max_bytes:
+            return self._error(40009, "invalid image size")
+        server.count(f"bytes:{kind}", len(media))
+        value = server.add_image(kind)
+        if kind == "material":
+            return self._send(200, {"media_id": value, "url": f"{server.base_url}/mmbiz/{value}"})
+        return self._send(200, {"url": value})
+
+    def _draft_add(self, query, body):
+        try:
+            articles = json.loads(body.decode("utf-8"))["articles"]
+        except (ValueError, KeyError):
+            return self._error(44002, "empty post data")
+        if len(articles) > self.server.config.max_articles:
+            return self._error(45008, "article size out of limit")
+        with self.server.lock:
+            self.server.drafts.append(articles)
+        return self._send(200, {"media_id": f"standin_draft_{self.server.next_id()}"})
+
+    def _get_material(self, query, body):
+        try:
+            media_id = json.loads(body.decode("utf-8"))["media_id"]
+        except (ValueError, KeyError):
+            return self._error(40007, "invalid media_id")
+        if not self.server.has_material(media_id):
+            return self._error(40007, "invalid media_id")
+        return self._send(200, {"title": "", "description": "", "down_url": ""})
+
+    def _delay(self):
+        config = self.server.config
+        delay = config.latency + (self.server.random.uniform(0, config.latency_jitter) if config.latency_jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _error(self, errcode, errmsg):
+        self.server.count(f"errcode:{errcode}")
+        return self._send(200, {"errcode": errcode, "errmsg": errmsg})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; encoding=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _multipart_file(content_type, body, field):
+    """从multipart/form-data请求体中取出指定字段的文件内容"""
+    if not content_type.startswith("multipart/form-data"):
+        return None
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == field:
+            return part.get_payload(decode=True)
+    return None
+
+
+def add_arguments(parser):
+    """添加模拟服务行为相关的命令行参数，压测脚本共用"""
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed latency per request in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of HTTP 503")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="Probability of a quota errcode")
+    parser.add_argument("--quota-errcode", type=int, default=45009)
+    parser.add_argument("--invalid-token-rate", type=float, default=0.0, help="Probability of errcode 40001")
+    parser.add_argument("--token-ttl", type=int, default=7200, help="Token lifetime in seconds")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Max upload/draft requests per second")
+    parser.add_argument("--uploadimg-max-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--max-articles", type=int, default=8, help="Max articles per draft")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the random errors and jitter")
+
+
+def config_from_args(args):
+    return StandinConfig(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                         quota_error_rate=args.quota_error_rate, quota_errcode=args.quota_errcode,
+                         invalid_token_rate=args.invalid_token_rate, token_ttl=args.token_ttl,
+                         rate_limit=args.rate_limit, uploadimg_max_bytes=args.uploadimg_max_bytes,
+                         max_articles=args.max_articles, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the WeChat official account API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = WeChatStandinServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"模拟微信接口已启动：{server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), ensure_ascii=False, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+import fitz
+from PIL import Image
+
+# 色彩模式：rgb 不处理；auto 按页面统计自动选择；gray/bilevel/palette 强制转换
+COLOR_MODES = ("rgb", "auto", "gray", "bilevel", "palette")
+
+
+class ColorReducer:
+    """扫描试卷的色彩缩减：用NumPy统计页面像素，近似黑白的页面输出灰度或1位图
+
+    先用低分辨率探测图判断页面是否含有彩色：色度（RGB最大值-最小值）超过chroma_threshold的像素
+    占比不超过color_ratio时视为黑白页面，可直接以灰度渲染，像素内存降为三分之一；
+    其中接近纯黑/纯白的像素占比达到bilevel_ratio时再用Otsu阈值二值化为1位图。
+    确实含有彩色的页面保持RGB。判断时排除水印区域，二值化时水印区域用抖动保留层次。
+    """
+
+    def __init__(self, mode="auto", chroma_threshold=24, color_ratio=0.002, bilevel_ratio=0.97,
+                 palette_colors=16, probe_dpi=50):
+        if mode not in COLOR_MODES:
+            raise ValueError(f"不支持的色彩模式：{mode}，可选：{', '.join(COLOR_MODES)}")
+        self.mode = mode
+        self.chroma_threshold = chroma_threshold
+        self.color_ratio = color_ratio
+        self.bilevel_ratio = bilevel_ratio
+        self.palette_colors = palette_colors
+        self.probe_dpi = probe_dpi
+
+    def choose_mode(self, page, exclude=None):
+        """决定页面的输出色彩模式，exclude为不参与统计的区域（相对页面的比例坐标x0, y0, x1, y1）"""
+        if self.mode != "auto":
+            return self.mode
+        zoom = self.probe_dpi / 72
+        probe = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+        return self.classify(probe, exclude)
+
+    def classify(self, pix, exclude=None):
+        """根据像素统计返回"rgb"、"gray"或"bilevel\""""
+        samples = _samples(pix)
+        keep = _keep_mask(samples.shape[0], samples.shape[1], exclude)
+        if samples.shape[2] >= 3:
+            rgb = samples[..., :3]
+            chroma = rgb.max(axis=2).astype(np.int16) - rgb.min(axis=2)
+            if (chroma[keep] > self.chroma_threshold).mean() > self.color_ratio:
+                return "rgb"
+        gray = _luminance(samples)
+        extremes = ((gray < 64) | (gray > 191))[keep].mean()
+        return "bilevel" if extremes >= self.bilevel_ratio else "gray"
+
+    def colorspace(self, mode):
+        """按输出模式选择渲染色彩空间，黑白页面直接渲染灰度"""
+        return fitz.csGRAY if mode in ("gray", "bilevel") else fitz.csRGB
+
+    def apply(self, pix, mode, protect=None):
+        """把渲染结果转换为目标模式，返回Pixmap（无需转换时）或PIL图片"""
+        if mode == "rgb" or (mode == "gray" and pix.n == 1):
+            return pix
+        samples = _samples(pix)
+        if mode == "gray":
+            return Image.fromarray(_luminance(samples))
+        if mode == "palette":
+            image = Image.fromarray(samples[..., 0] if samples.shape[2] == 1 else samples[..., :3])
+            return image.quantize(colors=self.palette_colors, method=Image.Quantize.MEDIANCUT
+                                  if image.mode == "RGB" else Image.Quantize.FASTOCTREE)
+
+        gray = _luminance(samples)
+        bilevel = Image.fromarray(gray > _otsu_threshold(gray))
+        if protect:
+            # 半透明水印二值化后会变成色块，改用抖动保留层次
+            height, width = gray.shape
+            box = (int(protect[0] * width), int(protect[1] * height),
+                   int(np.ceil(protect[2] * width)), int(np.ceil(protect[3] * height)))
+            if box[2] > box[0] and box[3] > box[1]:
+                region = Image.fromarray(gray).crop(box).convert("1")
+                bilevel.paste(region, box[:2])
+        return bilevel
+
+
+def _samples(pix):
+    """Pixmap像素转为(高, 宽, 通道)的uint8数组，不复制数据"""
+    return np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+
+def _luminance(samples):
+    """计算灰度（ITU-R 601-2），单通道时直接返回"""
+    if samples.shape[2] < 3:
+        return samples[..., 0]
+    rgb = samples[..., :3].astype(np.uint32)
+    return ((rgb[..., 0] * 299 + rgb[..., 1] * 587 + rgb[..., 2] * 114) // 1000).astype(np.uint8)
+
+
+def _keep_mask(height, width, exclude):
+    keep = np.ones((height, width), dtype=bool)
+    if exclude:
+        x0, y0 = int(exclude[0] * width), int(exclude[1] * height)
+        x1, y1 = int(np.ceil(exclude[2] * width)), int(np.ceil(exclude[3] * height))
+        keep[max(0, y0):y1, max(0, x0):x1] = False
+        if not keep.any():
+            keep[:] = True
+    return keep
+
+
+def _otsu_threshold(gray):
+    """Otsu法计算二值化阈值"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    levels = np.arange(256)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = total - weight_background
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_background = cumulative_mean / np.maximum(weight_background, 1)
+    mean_foreground = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_foreground, 1)
+    between = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    return int(np.argmax(between))
@@ -0,0 +1,101 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 渲染一页时同时存在的像素副本：Pixmap、色彩缩减/编码用的PIL图片、缩放副本
+WORKING_COPIES = 3
+
+
+class DocumentEstimate:
+    """渲染前读取的PDF规模：页数和最大一页的300 DPI RGB像素字节数"""
+
+    def __init__(self, pdf_path, pages, page_bytes, total_bytes):
+        self.pdf_path = pdf_path
+        self.pages = pages
+        self.page_bytes = page_bytes
+        # 所有页面的像素字节数之和，用于小文档优先排序
+        self.total_bytes = total_bytes
+
+
+def estimate_document(pdf_path, dpi=300, channels=3):
+    """只读取页面尺寸估算渲染规模，不渲染页面"""
+    import fitz
+    zoom = dpi / 72
+    page_bytes = total_bytes = 0
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            rect = page.rect
+            size = round(rect.width * zoom) * round(rect.height * zoom) * channels
+            page_bytes = max(page_bytes, size)
+            total_bytes += size
+        return DocumentEstimate(pdf_path, len(doc), page_bytes, total_bytes)
+
+
+class DocumentScheduler:
+    """按内存预算决定同时渲染哪些PDF
+
+    所有PDF共用同一组渲染进程，进程池的工作内存（渲染进程数×最大页面像素×WORKING_COPIES）
+    在开始调度时通过reserve预留一次；每个PDF只按渲染完成、等待上传的结果计费，
+    内存模式下为整份PDF的编码结果（每页result_bytes），写临时文件时结果只是路径，不计费。
+    预留加已准入PDF的占用不超过memory_budget（字节）且不超过max_documents个时才准入下一个；
+    没有PDF在渲染时总是准入，单个PDF超出预算时退化为逐个处理。
+    小文档优先，先完成的PDF尽早进入上传。
+    """
+
+    def __init__(self, memory_budget, max_documents=None):
+        if memory_budget <= 0:
+            raise ValueError("内存预算必须大于0")
+        self.memory_budget = memory_budget
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._in_use = 0
+        self._running = 0
+
+    @staticmethod
+    def order(items):
+        """小文档优先：items的第一个元素为DocumentEstimate，按像素总量、页数排序，规模相同时保持原顺序"""
+        return sorted(items, key=lambda item: (item[0].total_bytes, item[0].pages))
+
+    @staticmethod
+    def working_set(estimates, workers):
+        """渲染进程池的峰值工作内存（字节）：每个进程同时只渲染一页，按所有PDF中最大的一页估算"""
+        page_bytes = max((estimate.page_bytes for estimate in estimates), default=0)
+        return page_bytes * WORKING_COPIES * max(1, workers)
+
+    @staticmethod
+    def cost(estimate, result_bytes=0):
+        """估算一个PDF在渲染完成到上传前缓冲的结果占用（字节）"""
+        return estimate.pages * result_bytes
+
+    def reserve(self, working_set):
+        """为共用的渲染进程池预留工作内存，调度结束后reserve(0)归还"""
+        with self._lock:
+            self._reserved = working_set
+        if working_set > self.memory_budget:
+            logger.warning(f"渲染进程预计占用{working_set / 1024 ** 2:.0f} MB，超出内存预算"
+                           f"{self.memory_budget / 1024 ** 2:.0f} MB，逐个处理PDF")
+
+    @property
+    def in_use(self):
+        return self._reserved + self._in_use
+
+    def try_admit(self, cost):
+        """预算允许时占用cost并返回True"""
+        with self._lock:
+            if self._running and (self._reserved + self._in_use + cost > self.memory_budget or
+                                  (self.max_documents and self._running >= self.max_documents)):
+                return False
+            if not self._running and self._reserved + cost > self.memory_budget:
+                logger.warning(f"单个PDF预计占用{(self._reserved + cost) / 1024 ** 2:.0f} MB，超出内存预算"
+                               f"{self.memory_budget / 1024 ** 2:.0f} MB，单独处理")
+            self._in_use += cost
+            self._running += 1
+            return True
+
+    def release(self, cost):
+        """PDF渲染完成（或失败）后归还占用"""
+        with self._lock:
+            self._in_use -= cost
+            self._running -= 1
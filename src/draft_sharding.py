@@ -0,0 +1,94 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 微信限制单个草稿最多包含8篇图文消息
+MAX_ARTICLES_PER_DRAFT = 8
+
+# 分片前的排序方式：input保持输入顺序，filename按文件名，date按修改时间（旧的在前），size按文件大小（小的在前）
+DRAFT_ORDERS = ("input", "filename", "date", "size")
+
+
+class FanoutDraftError(Exception):
+    """多公众号模式下草稿只在部分账号提交成功：media_ids为已成功账号的{账号名: media_id}，errors为失败账号的错误
+
+    草稿接口不是幂等的，续传时只能向失败的账号重新提交。
+    """
+
+    def __init__(self, media_ids, errors):
+        super().__init__("草稿提交失败的公众号：" + "，".join(f"{name}（{error}）" for name, error in errors.items()))
+        self.media_ids = media_ids
+        self.errors = errors
+
+
+class PartialDraftError(Exception):
+    """部分草稿分片提交失败：shards为全部分片，成功分片的media_id和失败分片的错误都记录在其中"""
+
+    def __init__(self, shards):
+        failed = [shard for shard in shards if not shard.ok]
+        super().__init__(f"{len(failed)}/{len(shards)}个草稿分片提交失败：" +
+                         "；".join(f"分片{shard.index + 1}（{shard.error}）" for shard in failed))
+        self.shards = shards
+
+
+class DraftShard:
+    """一个草稿分片：包含的PDF下标、图文消息，以及提交后的media_id或错误"""
+
+    def __init__(self, index, doc_indexes, articles):
+        self.index = index
+        self.doc_indexes = doc_indexes
+        self.articles = articles
+        self.media_id = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.media_id is not None
+
+
+def order_documents(pdf_paths, order="input"):
+    """按排序方式返回PDF下标列表，排序键相同时保持输入顺序"""
+    if order not in DRAFT_ORDERS:
+        raise ValueError(f"不支持的草稿排序方式：{order}，可选：{', '.join(DRAFT_ORDERS)}")
+    indexes = list(range(len(pdf_paths)))
+    if order == "filename":
+        return sorted(indexes, key=lambda i: os.path.basename(pdf_paths[i]).lower())
+    if order == "date":
+        return sorted(indexes, key=lambda i: os.path.getmtime(pdf_paths[i]))
+    if order == "size":
+        return sorted(indexes, key=lambda i: os.path.getsize(pdf_paths[i]))
+    return indexes
+
+
+def shard_articles(entries, max_articles=MAX_ARTICLES_PER_DRAFT):
+    """把按顺序排列的[(doc_index, article)]切分为每片不超过max_articles篇的DraftShard列表"""
+    if max_articles < 1:
+        raise ValueError("单个草稿的文章数上限必须大于0")
+    shards = []
+    for start in range(0, len(entries), max_articles):
+        chunk = entries[start:start + max_articles]
+        shards.append(DraftShard(len(shards), [doc_index for doc_index, _ in chunk],
+                                 [article for _, article in chunk]))
+    return shards
+
+
+def submit_shards(wechat_uploader, shards, workers=4):
+    """并发提交各分片草稿，结果记录在分片的media_id或error中，单个分片失败不影响其他分片"""
+    def submit(shard):
+        try:
+            shard.media_id = wechat_uploader.add_draft(shard.articles)
+            logger.info(f"草稿分片{shard.index + 1}/{len(shards)}提交成功（{len(shard.articles)}篇）, "
+                        f"media_id: {shard.media_id}")
+        except Exception as e:
+            shard.error = e
+            logger.error(f"草稿分片{shard.index + 1}/{len(shards)}提交失败（{len(shard.articles)}篇）, 错误：{e}")
+
+    if len(shards) <= 1 or workers <= 1:
+        for shard in shards:
+            submit(shard)
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+            list(executor.map(submit, shards))
+    return shards
@@ -0,0 +1,116 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from draft_sharding import FanoutDraftError
+from wechat_uploader import WeChatUploader, _read_image
+
+logger = logging.getLogger(__name__)
+
+
+def load_accounts(names=None):
+    """读取多公众号凭据，返回[(name, appid, appsecret)]
+
+    names为逗号分隔的账号名（默认取WECHAT_ACCOUNTS），
+    每个账号的凭据配置在WECHAT_APPID_<NAME>和WECHAT_APPSECRET_<NAME>中。
+    """
+    names = names if names is not None else os.getenv("WECHAT_ACCOUNTS", "")
+    accounts = []
+    for name in (name.strip() for name in names.split(",")):
+        if not name:
+            continue
+        appid = os.getenv(f"WECHAT_APPID_{name.upper()}")
+        appsecret = os.getenv(f"WECHAT_APPSECRET_{name.upper()}")
+        if not appid or not appsecret:
+            raise ValueError(f"公众号{name}的AppID或AppSecret未配置：WECHAT_APPID_{name.upper()}/"
+                             f"WECHAT_APPSECRET_{name.upper()}")
+        accounts.append((name, appid, appsecret))
+    if len({appid for _, appid, _ in accounts}) != len(accounts):
+        raise ValueError("多个公众号配置了相同的AppID")
+    return accounts
+
+
+class FanoutUploader:
+    """把同一份渲染结果并发上传到多个公众号
+
+    与WeChatUploader接口一致，可直接交给UploadPipeline：页面和封面只读取一次，
+    再并发上传到各公众号，返回{账号名: url/media_id}；草稿也按账号分别提交。
+    每个账号使用独立的WeChatUploader，Access Token缓存、令牌桶限流和连接池互不影响。
+    任一账号上传失败时该页面视为失败，已成功的账号在重试时命中上传缓存，不会重复上传；
+    草稿只在部分账号提交成功时，续传只向其余账号提交。
+    """
+
+    def __init__(self, uploaders):
+        if not uploaders:
+            raise ValueError("至少需要一个公众号")
+        self.uploaders = dict(uploaders)
+        # 每个账号保留各自的上传并发度
+        self._executor = ThreadPoolExecutor(
+            max_workers=sum(uploader.upload_concurrency for uploader in self.uploaders.values()))
+
+    @classmethod
+    def from_accounts(cls, accounts, file_manager, **kwargs):
+        """按load_accounts的结果为每个账号创建WeChatUploader，其余参数原样传入"""
+        return cls({name: WeChatUploader(file_manager, appid=appid, appsecret=appsecret, **kwargs)
+                    for name, appid, appsecret in accounts})
+
+    @property
+    def accounts(self):
+        return list(self.uploaders)
+
+    def _fan_out(self, action, call):
+        """对每个账号并发执行call(name, uploader)，返回{name: 结果}；有账号失败时等全部完成后抛出首个错误"""
+        results, errors = self._run_all(action, call, self.uploaders)
+        if errors:
+            raise next(iter(errors.values()))
+        return results
+
+    def _run_all(self, action, call, names):
+        """对names中的账号并发执行call(name, uploader)，等全部完成后返回({name: 结果}, {name: 错误})"""
+        futures = {name: self._executor.submit(call, name, self.uploaders[name]) for name in names}
+        results = {}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"公众号{name}{action}失败：{e}")
+                errors[name] = e
+        return results, errors
+
+    def upload_image(self, image, filename=None):
+        """上传永久素材图片（如封面）到所有公众号，返回{账号名: media_id}"""
+        filename, data = _read_image(image, filename)
+        return self._fan_out("上传封面", lambda name, uploader: uploader.upload_image(data, filename))
+
+    def upload_page(self, image, filename=None):
+        """上传单页图片到所有公众号，返回{账号名: url}"""
+        filename, data = _read_image(image, filename)
+        return self._fan_out(f"上传图片{filename}", lambda name, uploader: uploader.upload_page(data, filename))
+
+    def build_article(self, title, cover_media_id, image_media_urls):
+        """为每个公众号构建使用其自身素材的图文消息，返回{账号名: article}"""
+        return {name: uploader.build_article(title, cover_media_id[name], [urls[name] for urls in image_media_urls])
+                for name, uploader in self.uploaders.items()}
+
+    def add_draft(self, articles):
+        """在图文消息包含的公众号提交草稿，返回{账号名: media_id}
+
+        articles为build_article的结果，续传时调用方可去掉已提交过的账号，只向其余账号提交。
+        有账号失败时抛出FanoutDraftError，其中带有已成功账号的media_id，调用方据此避免重复提交。
+        """
+        def submit(name, uploader):
+            media_id = uploader.add_draft([article[name] for article in articles])
+            logger.info(f"公众号{name}草稿提交成功, media_id: {media_id}")
+            return media_id
+        media_ids, errors = self._run_all("提交草稿", submit, [name for name in self.uploaders if name in articles[0]])
+        if errors:
+            raise FanoutDraftError(media_ids, errors) from next(iter(errors.values()))
+        return media_ids
+
+    def http_stats(self):
+        return {name: uploader.http_stats() for name, uploader in self.uploaders.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for uploader in self.uploaders.values():
+            uploader.close()
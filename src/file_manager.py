@@ -4,32 +4,45 @@ import shutil
 
 
 class FileManager:
-    def __init__(self, desktop_path=None, output_base_path="output"):
+    def __init__(self, desktop_path=None, output_base_path="output", scanner=None, create_output_base=True):
         # 默认使用用户桌面路径
         self.desktop_path = desktop_path or str(Path.home() / "Desktop")
         self.output_base_path = output_base_path
-        # 确保输出目录存在
-        os.makedirs(self.output_base_path, exist_ok=True)
+        # 可选的FolderScanner：递归、过滤、排序和增量扫描
+        self.scanner = scanner
+        # 确保输出目录存在；只读环境下（--no-temp-files）不创建，需要时由create_output_folder创建
+        if create_output_base:
+            os.makedirs(self.output_base_path, exist_ok=True)
 
     def get_pdf_files(self):
-        """获取桌面文件夹中的所有PDF文件"""
-        pdf_files = []
-        for file in os.listdir(self.desktop_path):
-            if file.lower().endswith(".pdf"):
-                pdf_files.append(os.path.join(self.desktop_path, file))
-        return pdf_files
+        """获取桌面文件夹中的PDF文件，按文件名排序；设置了scanner时只返回待处理的PDF"""
+        if self.scanner is not None:
+            return self.scanner.scan()
+        with os.scandir(self.desktop_path) as entries:
+            return sorted(entry.path for entry in entries
+                          if entry.name.lower().endswith(".pdf") and entry.is_file())
+
+    def mark_processed(self, pdf_paths):
+        """记录PDF已处理完成，增量扫描时不再返回"""
+        if self.scanner is not None:
+            self.scanner.mark_done(pdf_paths)
+
+    def output_name(self, pdf_path):
+        """输出文件夹名：PDF文件名，位于扫描目录的子目录中时带上相对路径，避免同名文件冲突"""
+        rel_path = os.path.relpath(os.path.abspath(pdf_path), os.path.abspath(self.desktop_path))
+        if rel_path.startswith(os.pardir) or os.path.dirname(rel_path) == "":
+            rel_path = os.path.basename(pdf_path)
+        return os.path.splitext(rel_path)[0].replace(os.sep, "_")
 
     def create_output_folder(self, pdf_path):
         """为PDF文件创建以其命名的输出文件夹"""
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        output_folder = os.path.join(self.output_base_path, pdf_name)
+        output_folder = os.path.join(self.output_base_path, self.output_name(pdf_path))
         os.makedirs(output_folder, exist_ok=True)
         return output_folder
 
     def get_output_folder(self, pdf_path):
         """获取PDF文件的输出文件夹路径"""
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        output_folder = os.path.join(self.output_base_path, pdf_name)
+        output_folder = os.path.join(self.output_base_path, self.output_name(pdf_path))
         if not os.path.exists(output_folder):
             raise FileNotFoundError(f"输出文件夹未找到：{output_folder}")
         return output_folder
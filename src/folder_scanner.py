@@ -0,0 +1,186 @@
+import fnmatch
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# 返回顺序：name按相对路径，mtime按修改时间（旧的在前），size按文件大小（小的在前）
+SCAN_ORDERS = ("name", "mtime", "size")
+
+# 目录修改时间距扫描开始不足该秒数时不记入快照，避免同一时间粒度内的后续变化被漏掉
+_DIR_MTIME_GUARD = 2.0
+
+
+def match_patterns(rel_path, name, patterns):
+    """文件名或相对路径（以/分隔）是否匹配任一通配符，patterns需为小写，匹配不区分大小写"""
+    name = name.lower()
+    rel_path = rel_path.replace(os.sep, "/").lower()
+    return any(fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel_path, pattern)
+               for pattern in patterns)
+
+
+class FolderScanner:
+    """基于os.scandir的增量PDF扫描器
+
+    支持递归子目录、include/exclude通配符（不区分大小写，匹配文件名或相对路径，
+    exclude同样用于跳过子目录）以及按名称、修改时间或大小排序。
+    修改时间距今不足settle_seconds秒的文件视为仍在写入，本次不返回。
+
+    传入snapshot_path时把每个文件的(inode, 大小, 修改时间)和每个目录的修改时间持久化：
+    scan()只返回新增或有变化、且已写入完成的PDF，调用mark_done()后不再返回；
+    修改时间未变的目录不再列出其中的文件，只复查尚未处理完的文件和已知的子目录，
+    因此大目录树的每次运行不必全量扫描。目录修改时间不反映原地改写的文件，需要时用scan(full=True)。
+    """
+
+    def __init__(self, root, recursive=False, include=("*.pdf",), exclude=(), order="name",
+                 settle_seconds=2.0, snapshot_path=None):
+        if order not in SCAN_ORDERS:
+            raise ValueError(f"不支持的扫描排序方式：{order}，可选：{', '.join(SCAN_ORDERS)}")
+        self.root = root
+        self.recursive = recursive
+        self.include = tuple(pattern.lower() for pattern in include)
+        self.exclude = tuple(pattern.lower() for pattern in exclude)
+        self.order = order
+        self.settle_seconds = settle_seconds
+        self.snapshot_path = snapshot_path
+        self._snapshot = self._load()
+
+    def _options(self):
+        """影响扫描结果的配置，变化时快照作废"""
+        return {"root": os.path.abspath(self.root), "recursive": self.recursive,
+                "include": list(self.include), "exclude": list(self.exclude)}
+
+    def _load(self):
+        empty = {"options": self._options(), "dirs": {}, "files": {}}
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return empty
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"扫描快照无法读取，重新全量扫描：{self.snapshot_path}, 错误：{e}")
+            return empty
+        if snapshot.get("options") != empty["options"]:
+            logger.info("扫描配置已变化，重新全量扫描")
+            return empty
+        return snapshot
+
+    def _save(self):
+        if not self.snapshot_path:
+            return
+        # 写临时文件后原子替换，进程中途退出也不会留下损坏的快照
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.snapshot_path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def scan(self, full=False):
+        """返回新增或有变化、已写入完成且未处理过的PDF绝对路径列表；full为True时不沿用未变化目录的快照"""
+        now = time.time()
+        old_dirs = self._snapshot["dirs"]
+        old_files = self._snapshot["files"]
+        dirs = {}
+        files = {}
+        ready = []
+        listed = reused = 0
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            abs_dir = os.path.join(self.root, rel_dir)
+            try:
+                dir_mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            previous = old_dirs.get(rel_dir)
+            if not full and previous is not None and previous["mtime_ns"] == dir_mtime_ns:
+                # 目录项未变化：沿用快照中的文件和子目录，只复查尚未处理完的文件
+                reused += 1
+                dirs[rel_dir] = previous
+                for name in previous["files"]:
+                    rel_path = os.path.join(rel_dir, name)
+                    entry = old_files.get(rel_path)
+                    if entry is not None and entry["done"]:
+                        files[rel_path] = entry
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(self.root, rel_path))
+                    except FileNotFoundError:
+                        continue
+                    files[rel_path] = self._check(rel_path, stat, entry, now, ready)
+                pending.extend(os.path.join(rel_dir, name) for name in previous["subdirs"])
+                continue
+
+            listed += 1
+            names = []
+            subdirs = []
+            try:
+                with os.scandir(abs_dir) as entries:
+                    for dir_entry in entries:
+                        rel_path = os.path.join(rel_dir, dir_entry.name)
+                        try:
+                            if dir_entry.is_dir(follow_symlinks=False):
+                                if self.recursive and not match_patterns(rel_path, dir_entry.name, self.exclude):
+                                    subdirs.append(dir_entry.name)
+                                continue
+                            if not dir_entry.is_file():
+                                continue
+                            if not match_patterns(rel_path, dir_entry.name, self.include) or \
+                                    match_patterns(rel_path, dir_entry.name, self.exclude):
+                                continue
+                            stat = dir_entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        names.append(dir_entry.name)
+                        files[rel_path] = self._check(rel_path, stat, old_files.get(rel_path), now, ready)
+            except (FileNotFoundError, NotADirectoryError, PermissionError) as e:
+                logger.warning(f"无法扫描目录：{abs_dir}, 错误：{e}")
+                continue
+            recent = now - dir_mtime_ns / 1e9 < _DIR_MTIME_GUARD
+            dirs[rel_dir] = {"mtime_ns": None if recent else dir_mtime_ns, "files": names, "subdirs": subdirs}
+            pending.extend(os.path.join(rel_dir, name) for name in subdirs)
+
+        changed = listed > 0 or len(files) != len(old_files) or any(
+            entry is not old_files.get(rel_path) for rel_path, entry in files.items())
+        self._snapshot = {"options": self._options(), "dirs": dirs, "files": files}
+        if changed:
+            self._save()
+        logger.debug(f"扫描{self.root}：列出{listed}个目录，沿用快照{reused}个目录，{len(ready)}个PDF待处理")
+        return [os.path.join(self.root, rel_path) for rel_path, _ in self._sort(ready)]
+
+    def _check(self, rel_path, stat, entry, now, ready):
+        """对比快照中的记录，需要处理的文件加入ready，返回新的快照记录"""
+        signature = [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+        if entry is not None and entry["signature"] == signature:
+            if not entry["done"] and stat.st_size > 0:
+                # 与上次扫描相比大小和修改时间都未变化，视为写入完成
+                ready.append((rel_path, stat))
+            return entry
+        if stat.st_size > 0 and now - stat.st_mtime >= self.settle_seconds:
+            ready.append((rel_path, stat))
+        return {"signature": signature, "done": False}
+
+    def _sort(self, ready):
+        if self.order == "mtime":
+            return sorted(ready, key=lambda item: (item[1].st_mtime_ns, item[0]))
+        if self.order == "size":
+            return sorted(ready, key=lambda item: (item[1].st_size, item[0]))
+        return sorted(ready)
+
+    def mark_done(self, pdf_paths):
+        """记录这些PDF已处理完成，之后除非文件发生变化不再返回"""
+        changed = False
+        for pdf_path in pdf_paths:
+            entry = self._snapshot["files"].get(os.path.relpath(pdf_path, self.root))
+            if entry is not None and not entry["done"]:
+                entry["done"] = True
+                changed = True
+        if changed:
+            self._save()
@@ -0,0 +1,192 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import time
+from folder_scanner import match_patterns
+
+logger = logging.getLogger(__name__)
+
+# inotify事件：写入完成、移入、新建、删除
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+
+class _Inotify:
+    """通过libc的inotify监听目录变化，只用作唤醒信号，具体变化由重新扫描目录得出"""
+
+    def __init__(self, folder):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        try:
+            self.add(folder)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add(self, folder):
+        """监听一个目录；目录被删除后内核自动移除对应的监听"""
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch失败：{folder}")
+
+    def wait(self, timeout):
+        """等待目录事件或超时，返回是否有事件"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """监听文件夹中新到达或被修改的PDF文件
+
+    优先使用inotify（Linux），不可用时退回按poll_interval轮询。
+    文件大小和修改时间连续settle_seconds秒不变才认为写入完成，避免处理写了一半的文件。
+    已交付的文件只有再次被修改时才会重新交付。
+    recursive/include/exclude与FolderScanner的含义相同，批量模式和监听模式处理同一组文件；
+    递归时每个子目录都加入inotify监听，新建的子目录在下一次扫描时加入。
+    """
+
+    def __init__(self, folder, settle_seconds=2.0, poll_interval=5.0, use_inotify=True,
+                 recursive=False, include=("*.pdf",), exclude=()):
+        self.folder = folder
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.recursive = recursive
+        self.include = tuple(pattern.lower() for pattern in include)
+        self.exclude = tuple(pattern.lower() for pattern in exclude)
+        self._pending = {}
+        self._delivered = {}
+        self._inotify = None
+        self._watched_dirs = set()
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(folder)
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify不可用，改为每{poll_interval}秒轮询：{e}")
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def poll(self):
+        """扫描一次文件夹，返回已写入完成、尚未交付的PDF路径列表"""
+        now = time.monotonic()
+        seen = set()
+        ready = []
+        visited_dirs = set()
+        for entry in self._candidates(visited_dirs):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            path = entry.path
+            signature = (stat.st_size, stat.st_mtime_ns)
+            seen.add(path)
+            if self._delivered.get(path) == signature:
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                # 新文件或仍在写入，重新计时
+                self._pending[path] = (signature, now)
+            elif stat.st_size > 0 and now - pending[1] >= self.settle_seconds:
+                ready.append(path)
+        for path in set(self._pending) - seen:
+            del self._pending[path]
+        for path in set(self._delivered) - seen:
+            del self._delivered[path]
+        for path in ready:
+            self._delivered[path] = self._pending.pop(path)[0]
+        # 已删除的子目录由内核移除监听，重新创建时需要再次添加
+        self._watched_dirs &= visited_dirs
+        return sorted(ready)
+
+    def _candidates(self, visited_dirs):
+        """列出符合include/exclude的文件，recursive时进入未被exclude的子目录并记入visited_dirs"""
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            abs_dir = os.path.join(self.folder, rel_dir)
+            if rel_dir:
+                visited_dirs.add(abs_dir)
+                self._watch(abs_dir)
+            try:
+                with os.scandir(abs_dir) as entries:
+                    for entry in entries:
+                        rel_path = os.path.join(rel_dir, entry.name)
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive and not match_patterns(rel_path, entry.name, self.exclude):
+                                    pending.append(rel_path)
+                                continue
+                            if not entry.is_file():
+                                continue
+                        except FileNotFoundError:
+                            continue
+                        if match_patterns(rel_path, entry.name, self.include) and \
+                                not match_patterns(rel_path, entry.name, self.exclude):
+                            yield entry
+            except (FileNotFoundError, NotADirectoryError, PermissionError) as e:
+                if not rel_dir:
+                    raise
+                logger.warning(f"无法扫描目录：{abs_dir}, 错误：{e}")
+
+    def _watch(self, folder):
+        """把子目录加入inotify监听，每个目录只添加一次"""
+        if self._inotify is None or folder in self._watched_dirs:
+            return
+        try:
+            self._inotify.add(folder)
+        except OSError as e:
+            logger.warning(f"无法监听子目录，其中的变化将在下一次扫描时发现：{e}")
+            return
+        self._watched_dirs.add(folder)
+
+    def batches(self, stop_event=None):
+        """持续产出一批批写入完成的PDF路径，stop_event被设置时退出"""
+        changed = True
+        while stop_event is None or not stop_event.is_set():
+            # inotify模式下只有目录有事件或有文件等待写入完成时才重新扫描
+            if changed or self._pending:
+                ready = self.poll()
+                if ready:
+                    yield ready
+                    continue
+            changed = self._wait(stop_event)
+
+    def _wait(self, stop_event):
+        """等待目录事件或下一次轮询，返回是否需要重新扫描"""
+        timeout = self.poll_interval
+        if self._pending:
+            # 有文件等待写入完成时按settle间隔复查
+            timeout = min(timeout, max(0.05, self.settle_seconds / 2))
+        if self._inotify is not None:
+            # 限制单次等待时长，以便及时响应stop_event
+            return self._inotify.wait(min(timeout, 1.0))
+        if stop_event is not None:
+            stop_event.wait(timeout)
+        else:
+            time.sleep(timeout)
+        return True
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
@@ -0,0 +1,160 @@
+import logging
+from io import BytesIO
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# 支持的编码格式 -> 文件扩展名
+IMAGE_FORMATS = {
+    "png": "png",
+    "png-optimized": "png",
+    "jpeg": "jpg",
+    "webp": "webp",
+}
+
+
+class EncodedImage:
+    """一页图片的编码结果"""
+
+    def __init__(self, data, image_format, quality=None, scale=1.0, baseline_bytes=None):
+        self.data = data
+        self.image_format = image_format
+        self.extension = IMAGE_FORMATS[image_format]
+        self.quality = quality
+        self.scale = scale
+        # 对照基准：png格式为原尺寸无损PNG的大小，其他格式为未压缩像素的大小
+        self.baseline_bytes = baseline_bytes
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def bytes_saved(self):
+        if self.baseline_bytes is None:
+            return 0
+        return self.baseline_bytes - self.size
+
+
+class ImageEncoder:
+    """把渲染好的页面编码为PNG、优化PNG、JPEG或WebP
+
+    指定max_bytes时在内存中搜索满足字节预算的最高质量：JPEG/WebP二分查找quality，
+    优化PNG依次尝试无损压缩和256色调色板；仍超出预算时逐步缩小尺寸，不低于min_scale。
+    节省的字节数只用于统计：png格式对照首次尝试的原尺寸无损PNG，其他格式对照未压缩像素大小，不为此额外编码。
+    """
+
+    def __init__(self, image_format="png", max_bytes=None, min_quality=40, max_quality=95,
+                 min_scale=0.5, scale_step=0.85):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式：{image_format}，可选：{', '.join(IMAGE_FORMATS)}")
+        if image_format == "webp" and not features.check("webp"):
+            raise ValueError("当前Pillow不支持WebP编码")
+        self.image_format = image_format
+        self.max_bytes = max_bytes
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.min_scale = min_scale
+        self.scale_step = scale_step
+
+    @property
+    def extension(self):
+        return IMAGE_FORMATS[self.image_format]
+
+    def encode(self, source):
+        """编码PyMuPDF的Pixmap或PIL图片（如色彩缩减后的灰度/1位图），返回EncodedImage"""
+        image = source if isinstance(source, Image.Image) else None
+        if self.image_format == "png":
+            lossless = _save(image, "PNG") if image is not None else source.tobytes("png")
+            if self._fits(lossless):
+                return EncodedImage(lossless, "png", baseline_bytes=len(lossless))
+            baseline_bytes = len(lossless)
+        else:
+            baseline_bytes = _raw_size(source)
+
+        if image is None:
+            image = _pixmap_to_image(source)
+        # 无损PNG原尺寸已超出预算，直接从缩小一档开始
+        scale = self.scale_step if self.image_format == "png" else 1.0
+        while True:
+            scaled = image if scale == 1.0 else _resize(image, scale)
+            data, quality = self._encode_image(scaled)
+            result = EncodedImage(data, self.image_format, quality=quality, scale=scale, baseline_bytes=baseline_bytes)
+            if self._fits(data) or scale <= self.min_scale:
+                break
+            scale = max(self.min_scale, scale * self.scale_step)
+        if not self._fits(result.data):
+            logger.warning(f"图片缩小到{scale:.2f}倍仍超出{self.max_bytes}字节预算：{result.size}字节")
+        return result
+
+    def _fits(self, data):
+        return self.max_bytes is None or len(data) <= self.max_bytes
+
+    def _encode_image(self, image):
+        """按当前格式编码PIL图片，返回(最佳编码数据, quality)"""
+        if self.image_format == "png":
+            return _save(image, "PNG"), None
+        if self.image_format == "png-optimized":
+            data = _save(image, "PNG", optimize=True)
+            if self._fits(data):
+                return data, None
+            # 无损仍超出预算时退到自适应256色调色板
+            palette = image.convert("RGB").quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            return _save(palette, "PNG", optimize=True), None
+        return self._search_quality(image)
+
+    def _search_quality(self, image):
+        """二分查找满足字节预算的最高quality，都不满足时返回最低quality的结果"""
+        pil_format = "JPEG" if self.image_format == "jpeg" else "WEBP"
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("L" if image.mode == "1" else "RGB")
+        if self.max_bytes is None:
+            return _save(image, pil_format, quality=self.max_quality), self.max_quality
+
+        low, high = self.min_quality, self.max_quality
+        best = None
+        smallest = None
+        while low <= high:
+            quality = (low + high) // 2
+            data = _save(image, pil_format, quality=quality)
+            if self._fits(data):
+                best = (data, quality)
+                low = quality + 1
+            else:
+                if smallest is None or quality < smallest[1]:
+                    smallest = (data, quality)
+                high = quality - 1
+        return best or smallest
+
+
+def _pixmap_to_image(pix):
+    """把PyMuPDF的Pixmap转换为PIL图片，不经过临时文件"""
+    if pix.alpha:
+        pix = pix.__class__(pix, 0)  # 去掉alpha通道
+    mode = {1: "L", 3: "RGB", 4: "CMYK"}[pix.n]
+    image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    return image.convert("RGB") if mode == "CMYK" else image
+
+
+def _raw_size(source):
+    """Pixmap或PIL图片未压缩像素的字节数，不复制像素数据"""
+    if not isinstance(source, Image.Image):
+        return source.stride * source.height
+    if source.mode == "1":
+        return (source.width + 7) // 8 * source.height
+    return source.width * source.height * len(source.getbands())
+
+
+def _resize(image, scale):
+    """按比例缩小图片，1位图和调色板图片先转为灰度/RGB以便平滑缩放"""
+    if image.mode in ("1", "P"):
+        image = image.convert("L" if image.mode == "1" else "RGB")
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+
+def _save(image, pil_format, **params):
+    buffer = BytesIO()
+    if pil_format == "JPEG":
+        params.setdefault("optimize", True)
+    image.save(buffer, format=pil_format, **params)
+    return buffer.getvalue()
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class JobManifest:
+    """断点续传的任务清单，以JSON Lines日志保存在输出目录下
+
+    按源PDF记录文件指纹（路径、大小、修改时间、SHA-256）以及处理进度：
+    水印PDF、已渲染的页面、已上传的页面url、所属草稿，
+    以及多公众号模式下草稿只在部分账号提交成功时各账号的草稿media_id。
+    源文件内容变化时该PDF的进度自动作废。
+    每次进度变化只追加一行记录，不重写整个清单；加载时按顺序重放，
+    并和每次记录草稿后一样压缩为每个PDF一行的快照。已进入草稿的PDF只保留指纹和草稿media_id。
+    path为None时只记录在内存中，不写入磁盘（只读环境）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._documents = {}
+        self.load()
+
+    def load(self):
+        """从磁盘重放清单日志并压缩，文件不存在时从空清单开始；损坏的行（如写到一半退出）被忽略"""
+        self._documents = {}
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, TypeError, KeyError, AttributeError):
+                        continue
+        except OSError:
+            return
+        with self._lock:
+            self._compact()
+
+    def reset(self):
+        """清空清单，开始新的任务"""
+        with self._lock:
+            self._documents = {}
+            self._compact()
+
+    def document(self, pdf_path):
+        """登记源PDF并返回其进度记录的副本，文件已变化时重置进度"""
+        key = os.path.abspath(pdf_path)
+        stat = os.stat(pdf_path)
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is None or (entry["size"], entry["mtime"]) != (stat.st_size, stat.st_mtime):
+                # 大小或修改时间变化时用内容哈希确认是否真的变了
+                sha256 = _file_sha256(pdf_path)
+                if entry is None or entry["sha256"] != sha256:
+                    entry = {"path": key, "sha256": sha256, "page_count": None, "watermarked_pdf": None,
+                             "rendered": {}, "uploaded": {}, "drafted": None, "draft_accounts": {}}
+                entry.update(size=stat.st_size, mtime=stat.st_mtime, updated_at=time.time())
+                self._documents[key] = entry
+                self._append({"path": key, "entry": entry})
+            return json.loads(json.dumps(entry))
+
+    def set_page_count(self, pdf_path, page_count):
+        self._update(pdf_path, {"set": {"page_count": page_count}})
+
+    def mark_watermarked(self, pdf_path, watermarked_pdf):
+        self._update(pdf_path, {"set": {"watermarked_pdf": watermarked_pdf}})
+
+    def mark_rendered(self, pdf_path, page_num, image_path):
+        self._update(pdf_path, {"rendered": {str(page_num): image_path}})
+
+    def mark_uploaded(self, pdf_path, page_num, url, covered=()):
+        """记录页面已上传；covered为拼接进同一长图的后续页面，记为None，与首页一起写入"""
+        uploaded = {str(page_num): url}
+        uploaded.update(dict.fromkeys((str(covered_page) for covered_page in covered)))
+        self._update(pdf_path, {"uploaded": uploaded})
+
+    def mark_drafted(self, pdf_paths, media_id):
+        """记录这些PDF已进入草稿media_id；多公众号模式下media_id为{账号名: media_id}，与之前已提交的账号合并
+
+        已进入草稿的PDF不再需要页面进度，记录后压缩日志。
+        """
+        with self._lock:
+            for pdf_path in pdf_paths:
+                entry = self._documents[os.path.abspath(pdf_path)]
+                if isinstance(media_id, dict):
+                    entry["drafted"] = {**entry.get("draft_accounts", {}), **media_id}
+                else:
+                    entry["drafted"] = media_id
+                _prune_drafted(entry)
+            self._compact()
+
+    def mark_accounts_drafted(self, pdf_paths, media_ids):
+        """多公众号模式下草稿只在部分账号提交成功时，记录这些账号的{账号名: media_id}，续传时不再向其提交"""
+        for pdf_path in pdf_paths:
+            self._update(pdf_path, {"draft_accounts": media_ids})
+
+    def rendered_pages(self, pdf_path):
+        """返回{page_num: image_path}，只包含图片文件仍然存在的页面"""
+        entry = self._documents.get(os.path.abspath(pdf_path), {})
+        return {int(page_num): image_path for page_num, image_path in entry.get("rendered", {}).items()
+                if os.path.exists(image_path)}
+
+    def uploaded_pages(self, pdf_path):
+        """返回{page_num: url}，拼接进长图的后续页面url为None"""
+        entry = self._documents.get(os.path.abspath(pdf_path), {})
+        return {int(page_num): url for page_num, url in entry.get("uploaded", {}).items()}
+
+    def _update(self, pdf_path, record):
+        """应用一条进度记录并追加到日志"""
+        record = {"path": os.path.abspath(pdf_path), **record}
+        with self._lock:
+            self._apply(record)
+            self._append(record)
+
+    def _apply(self, record):
+        """把一条日志记录应用到内存中的清单：entry整体替换，set更新字段，其余字段合并到对应的字典"""
+        if "entry" in record:
+            self._documents[record["path"]] = record["entry"]
+            return
+        entry = self._documents[record["path"]]
+        entry.update(record.get("set", {}))
+        for field in ("rendered", "uploaded", "draft_accounts"):
+            if field in record:
+                entry.setdefault(field, {}).update(record[field])
+
+    def _append(self, record):
+        """追加一行记录，调用方需持有_lock"""
+        if self.path is None:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _compact(self):
+        """把清单重写为每个PDF一行的快照，调用方需持有_lock"""
+        if self.path is None:
+            return
+        # 写临时文件后原子替换，进程中途退出也不会留下损坏的清单
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for key, entry in self._documents.items():
+                    f.write(json.dumps({"path": key, "entry": entry}, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _prune_drafted(entry):
+    """已进入草稿的PDF只保留指纹和草稿media_id，去掉页面进度"""
+    entry.update(rendered={}, uploaded={}, draft_accounts={})
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -1,16 +1,140 @@
+import time
+
+# 冷启动计时起点：主模块开始加载
+_STARTED_AT = time.perf_counter()
+
 import os
 import logging
 import argparse
+import signal
+import threading
 from file_manager import FileManager
-from pdf_processor import PDFProcessor
-from wechat_uploader import WeChatUploader
 from dotenv import load_dotenv
+# PyMuPDF、PyPDF2、reportlab、numpy、requests等重量级依赖在用到的阶段才导入，
+# --help和--dry-run不会加载它们
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
 logger = logging.getLogger(__name__)
 
 
+def process_pdfs(pipeline, file_manager, pdf_files, cover_image_path, save_watermarked=False):
+    """把一批PDF处理成多篇文章草稿（超过单个草稿上限时分成多个），全部成功时删除临时图片文件夹，返回是否全部成功"""
+    titles = [f"试卷分享-{os.path.splitext(os.path.basename(pdf_path))[0]}" for pdf_path in pdf_files]
+    # 仅在显式要求时保存水印PDF
+    watermarked_pdfs = None
+    if save_watermarked:
+        os.makedirs(file_manager.output_base_path, exist_ok=True)
+        watermarked_pdfs = [os.path.join(file_manager.output_base_path,
+                                         f"{file_manager.output_name(pdf_path)}_watermarked.pdf")
+                            for pdf_path in pdf_files]
+
+    # 创建图文消息
+    try:
+        media_ids = pipeline.run(pdf_files, titles, cover_image_path, watermarked_pdfs=watermarked_pdfs)
+        logger.info(f"多篇文章草稿创建成功, media_id: {media_ids}")
+    except Exception as e:
+        logger.error(f"创建多文章图文消息失败，错误：{e}")
+        logger.info("保留已渲染的PNG图片，可使用 --resume 从中断处继续")
+        return False
+    # 已进入草稿的PDF在增量扫描中不再返回
+    file_manager.mark_processed([pdf_path for index, pdf_path in enumerate(pdf_files) if index not in pipeline.failed])
+
+    # 按分片报告草稿提交结果，部分分片失败时保留图片以便续传
+    failed_shards = [shard for shard in pipeline.shards if not shard.ok]
+    if failed_shards:
+        for shard in failed_shards:
+            names = [os.path.basename(pdf_files[doc_index]) for doc_index in shard.doc_indexes]
+            logger.error(f"草稿分片{shard.index + 1}/{len(pipeline.shards)}提交失败：{names}，错误：{shard.error}")
+        logger.info(f"{len(pipeline.shards) - len(failed_shards)}/{len(pipeline.shards)}个草稿提交成功，"
+                    "保留已渲染的PNG图片，可使用 --resume 重新提交失败的草稿")
+        return False
+
+    # 删除临时PNG文件夹
+    for output_folder in pipeline.output_folders:
+        try:
+            file_manager.delete_folder(output_folder)
+            logger.info(f"删除临时PNG文件夹：{output_folder}")
+        except Exception as e:
+            logger.error(f"删除临时文件失败：{output_folder}, 错误：{e}")
+    return True
+
+
+def export_metrics(metrics):
+    """输出各阶段耗时摘要，配置时写入JSON运行报告和Prometheus textfile"""
+    stages = metrics.report()["stages"]
+    logger.info("阶段耗时：" + ", ".join(f"{stage} {summary['seconds']:.2f}秒/{summary['count']}次"
+                                     for stage, summary in stages.items()))
+    report_path = os.getenv("RUN_REPORT_PATH")
+    textfile_path = os.getenv("METRICS_TEXTFILE")
+    try:
+        if report_path:
+            metrics.write_json(report_path)
+        if textfile_path:
+            metrics.write_prometheus(textfile_path)
+    except OSError as e:
+        logger.error(f"写入运行报告失败，错误：{e}")
+
+
+def watch_folder(pipeline, file_manager, pdf_folder, cover_image_path, save_watermarked=False):
+    """守护模式：监听文件夹，新PDF写入完成后用已初始化的组件立即处理
+
+    启动时文件夹中已有的PDF也会交付一次，已进入草稿的由任务清单跳过。
+    """
+    from folder_watcher import FolderWatcher
+    # 与批量模式使用同一组SCAN_RECURSIVE/SCAN_INCLUDE/SCAN_EXCLUDE设置
+    scanner = file_manager.scanner
+    scan_options = {} if scanner is None else \
+        {"recursive": scanner.recursive, "include": scanner.include, "exclude": scanner.exclude}
+    watcher = FolderWatcher(pdf_folder, settle_seconds=float(os.getenv("WATCH_SETTLE_SECONDS", 2)),
+                            poll_interval=float(os.getenv("WATCH_POLL_INTERVAL", 5)), **scan_options)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    logger.info(f"开始监听文件夹（{watcher.mode}）：{pdf_folder}")
+    try:
+        for pdf_files in watcher.batches(stop_event):
+            logger.info(f"检测到{len(pdf_files)}个新PDF：{pdf_files}")
+            process_pdfs(pipeline, file_manager, pdf_files, cover_image_path, save_watermarked)
+            # 守护模式下阶段耗时和计数器从启动起累计，按PDF的汇总只保留本批，每批处理后刷新报告
+            export_metrics(pipeline.metrics)
+            pipeline.metrics.reset_documents()
+            if pipeline.failed:
+                logger.warning("处理失败的PDF在文件再次修改后重试")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        logger.info("停止监听文件夹")
+
+
+def open_render_cache():
+    """按环境变量创建渲染缓存：设置了RENDER_CACHE_DIR时才启用，RENDER_CACHE_MAX_BYTES为0时关闭"""
+    cache_dir = os.getenv("RENDER_CACHE_DIR")
+    max_bytes = int(os.getenv("RENDER_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+    if not cache_dir or max_bytes <= 0:
+        return None
+    from render_cache import RenderCache
+    return RenderCache(cache_dir, max_bytes=max_bytes)
+
+
+def cache_command(action, max_bytes=None):
+    """cache子命令：stats输出渲染缓存统计，prune按容量上限（或max_bytes）淘汰最久未使用的页面"""
+    render_cache = open_render_cache()
+    if render_cache is None:
+        print("渲染缓存未启用（未设置RENDER_CACHE_DIR或RENDER_CACHE_MAX_BYTES=0）")
+        return
+    try:
+        if action == "prune":
+            removed, freed = render_cache.prune(max_bytes)
+            print(f"淘汰{removed}页，释放{freed / 1024 ** 2:.1f} MB")
+        stats = render_cache.stats()
+        print(f"渲染缓存：{stats['cache_dir']}")
+        print(f"页数：{stats['entries']}，占用：{stats['bytes'] / 1024 ** 2:.1f} MB / "
+              f"{stats['max_bytes'] / 1024 ** 2:.1f} MB")
+    finally:
+        render_cache.close()
+
+
 def main():
     """主程序：处理桌面PDF，添加水印，转换为PNG，上传到微信并发布图文消息"""
     # 解析命令行参数
@@ -21,11 +145,49 @@ def main():
         help="Folder containing PDF files to process (default: desktop)",
         default=None
     )
+    parser.add_argument(
+        "--save-watermarked",
+        action="store_true",
+        help="Also write <name>_watermarked.pdf to the output folder (skipped by default)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the previous interrupted run, skipping pages already rendered/uploaded"
+    )
+    parser.add_argument(
+        "--no-temp-files",
+        action="store_true",
+        help="Upload rendered pages straight from memory without writing temporary image folders"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and process PDFs as they arrive in the folder, reusing the initialized uploader"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="List the PDFs, page counts and estimated upload volume without rendering or uploading"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    cache_parser = subparsers.add_parser("cache", help="Show or prune the on-disk render cache")
+    cache_parser.add_argument("action", choices=("stats", "prune"))
+    cache_parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=None,
+        help="Prune least recently used pages until the cache fits in this many bytes (default: RENDER_CACHE_MAX_BYTES)"
+    )
     args = parser.parse_args()
 
     # 加载环境变量
     load_dotenv()
 
+    if args.command == "cache":
+        cache_command(args.action, args.max_bytes)
+        return
+
     # 设置PDF扫描路径
     default_desktop = os.path.expanduser("~/Desktop")
     desktop_path = os.getenv("DESKTOP_PATH", default_desktop)
@@ -39,79 +201,157 @@ def main():
     # 初始化FileManager
     # desktop_path = os.getenv("DESKTOP_PATH", os.path.expanduser("~/Desktop"))
     output_base_path = os.getenv("OUTPUT_BASE_PATH", os.path.join(os.path.dirname(__file__), "output"))
-    file_manager = FileManager(desktop_path=pdf_folder, output_base_path=output_base_path)
+    # 扫描：可递归子目录、按通配符过滤、按名称/修改时间/大小排序；配置SCAN_SNAPSHOT时只返回新增或变化的PDF
+    from folder_scanner import FolderScanner
+    scanner = FolderScanner(
+        pdf_folder,
+        recursive=os.getenv("SCAN_RECURSIVE", "0").lower() in ("1", "true", "yes"),
+        include=[pattern for pattern in os.getenv("SCAN_INCLUDE", "*.pdf").split(",") if pattern],
+        exclude=[pattern for pattern in os.getenv("SCAN_EXCLUDE", "").split(",") if pattern],
+        order=os.getenv("SCAN_ORDER", "name"),
+        settle_seconds=float(os.getenv("SCAN_SETTLE_SECONDS", 2)),
+        snapshot_path=os.getenv("SCAN_SNAPSHOT") or None,
+    )
+    # --no-temp-files面向只读容器，不创建输出目录
+    file_manager = FileManager(desktop_path=pdf_folder, output_base_path=output_base_path, scanner=scanner,
+                               create_output_base=not args.no_temp_files)
     logger.info(f"Desktop path: {desktop_path}, Output base path: {output_base_path}")
 
-    # 初始化PDFProcessor
-    watermark_image = os.getenv("WATERMARK_IMAGE", os.path.join(os.path.dirname(__file__), "resources/watermark.png"))
-    watermark_alpha = float(os.getenv("WATERMARK_ALPHA", 0.5))
-    pdf_processor = PDFProcessor(file_manager, watermark_image=watermark_image, watermark_alpha=watermark_alpha)
-    logger.info(f"Watermark image: {watermark_image}, Alpha: {watermark_alpha}")
-
-    # 初始化WeChatUploader
-    wechat_uploader = WeChatUploader(file_manager)
-    cover_image_path = os.getenv("COVER_IMAGE_PATH", os.path.join(os.path.dirname(__file__), "resources/cover_image.jpg"))
-    logger.info(f"Cover image: {cover_image_path}")
+    # 页面编码：格式与单页字节预算（微信uploadimg接口限制1MB）
+    image_format = os.getenv("IMAGE_FORMAT", "png")
+    image_max_bytes = int(os.getenv("IMAGE_MAX_BYTES", 1000000)) or None
+    # 长图拼接：连续页面拼成不超过该高度（像素）的长图上传，0表示逐页上传
+    stitch_max_height = int(os.getenv("STITCH_MAX_HEIGHT", 0))
 
-    # 获取桌面上的PDF文件
-    pdf_files = file_manager.get_pdf_files()
-    if not pdf_files:
-        logger.warning("未在桌面上找到PDF文件")
+    if args.dry_run:
+        # 只读取页面尺寸做估算，不渲染、不登录微信
+        from planner import plan_documents, format_plan
+        pdf_files = file_manager.get_pdf_files()
+        plans = plan_documents(pdf_files, image_format=image_format, max_bytes=image_max_bytes,
+                               stitch_max_height=stitch_max_height)
+        print(format_plan(plans))
+        logger.info(f"冷启动耗时：{time.perf_counter() - _STARTED_AT:.3f}秒")
         return
 
-    output_pdfs = []
-    titles = []
-    output_folders = []
+    from pdf_processor import PDFProcessor
+    from wechat_uploader import WeChatUploader
+    from fanout_uploader import FanoutUploader, load_accounts
+    from pipeline import UploadPipeline
+    from job_manifest import JobManifest
+    from image_encoder import ImageEncoder
+    from metrics import Metrics
 
-    # 处理每个PDF文件
-    for pdf_path in pdf_files:
-        try:
-            logger.info(f"处理PDF文件：{pdf_path}")
+    # 各阶段计时与统计，由渲染、上传和流水线共享
+    metrics = Metrics()
 
-            # 添加水印
-            output_pdf = os.path.join(file_manager.output_base_path,
-                                      f"{os.path.splitext(os.path.basename(pdf_path))[0]}_watermarked.pdf")
-            pdf_processor.add_watermark(pdf_path, output_pdf)
-            logger.info(f"水印PDF生成：{output_pdf}")
+    # 初始化PDFProcessor
+    watermark_image = os.getenv("WATERMARK_IMAGE", os.path.join(os.path.dirname(__file__), "resources/watermark.png"))
+    watermark_alpha = float(os.getenv("WATERMARK_ALPHA", 0.5))
+    render_workers = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+    encoder = ImageEncoder(image_format=image_format, max_bytes=image_max_bytes)
+    logger.info(f"Image format: {image_format}, Max bytes per page: {image_max_bytes}")
+    # 色彩缩减：rgb为关闭，auto按页面内容自动选择灰度/1位图/调色板
+    color_mode = os.getenv("COLOR_MODE", "rgb")
+    color_reducer = None
+    if color_mode != "rgb":
+        from color_reduction import ColorReducer
+        color_reducer = ColorReducer(color_mode)
+    logger.info(f"Color mode: {color_mode}")
+    # 空白页与重复页过滤：墨迹占比阈值（0为关闭）和重复页处理方式（off/collapse/drop）
+    page_blank_threshold = float(os.getenv("PAGE_BLANK_THRESHOLD", 0))
+    page_duplicates = os.getenv("PAGE_DUPLICATES", "off")
+    page_filter = None
+    if page_blank_threshold > 0 or page_duplicates != "off":
+        from page_filter import PageFilter
+        page_filter = PageFilter(blank_threshold=page_blank_threshold, duplicates=page_duplicates,
+                                 duplicate_distance=float(os.getenv("PAGE_DUPLICATE_DISTANCE", 0.03)))
+    logger.info(f"Blank threshold: {page_blank_threshold}, Duplicates: {page_duplicates}")
+    # 页边裁剪：只渲染内容范围（含水印区域），四周留出MARGIN_CROP_PADDING（pt）
+    cropper = None
+    if os.getenv("MARGIN_CROP", "0").lower() in ("1", "true", "yes"):
+        from margin_crop import MarginCropper
+        cropper = MarginCropper(padding=float(os.getenv("MARGIN_CROP_PADDING", 12)))
+    logger.info(f"Margin crop: {cropper is not None}")
+    # 渲染缓存需要显式配置目录；--no-temp-files时不读写缓存，保证不落盘
+    render_cache = None if args.no_temp_files else open_render_cache()
+    logger.info(f"Render cache: {render_cache.cache_dir if render_cache is not None else None}")
+    pdf_processor = PDFProcessor(file_manager, watermark_image=watermark_image, watermark_alpha=watermark_alpha,
+                                 render_workers=render_workers, encoder=encoder, color_reducer=color_reducer,
+                                 page_filter=page_filter, cropper=cropper,
+                                 render_cache=render_cache, metrics=metrics)
+    logger.info(f"Watermark image: {watermark_image}, Alpha: {watermark_alpha}, Render workers: {render_workers}")
 
-            # 转换为PNG图片
-            output_folder = pdf_processor.convert_pdf_to_images(output_pdf)
-            logger.info(f"PNG图片生成在：{output_folder}")
+    # 初始化WeChatUploader：并发上传线程数与共享令牌桶速率（每秒请求数）；首次上传时才获取Access Token
+    upload_workers = int(os.getenv("UPLOAD_WORKERS", 4))
+    upload_rate = float(os.getenv("UPLOAD_RATE", 2))
+    # --no-temp-files时token缓存和上传缓存只在显式配置路径时落盘，否则保存在进程内存中
+    token_cache_dir = os.getenv("TOKEN_CACHE_DIR", None if args.no_temp_files else output_base_path)
+    uploader_options = dict(upload_concurrency=upload_workers, upload_rate=upload_rate, token_cache_dir=token_cache_dir,
+                            upload_cache_path=os.getenv("UPLOAD_CACHE_PATH"), metrics=metrics,
+                            in_memory=args.no_temp_files)
+    # 多公众号模式：WECHAT_ACCOUNTS列出账号名时，渲染一次并发上传到所有账号，各账号独立缓存token和限流
+    accounts = load_accounts()
+    if accounts:
+        wechat_uploader = FanoutUploader.from_accounts(accounts, file_manager, **uploader_options)
+        logger.info(f"多公众号模式：{', '.join(name for name, _, _ in accounts)}")
+    else:
+        wechat_uploader = WeChatUploader(file_manager, **uploader_options)
+    cover_image_path = os.getenv("COVER_IMAGE_PATH", os.path.join(os.path.dirname(__file__), "resources/cover_image.jpg"))
+    logger.info(f"Cover image: {cover_image_path}")
 
-            # 收集
-            output_pdfs.append(output_pdf)
-            title = f"试卷分享-{os.path.splitext(os.path.basename(pdf_path))[0]}"
-            titles.append(title)
-            output_folders.append(output_folder)
+    # 任务清单：记录每个PDF每一页的进度，--resume时从中断处继续；守护模式下用于跳过已发布的PDF
+    # --no-temp-files时只在设置了JOB_MANIFEST_PATH时落盘
+    manifest_path = os.getenv("JOB_MANIFEST_PATH",
+                              None if args.no_temp_files else os.path.join(output_base_path, "job_manifest.jsonl"))
+    if manifest_path is None and args.resume:
+        logger.warning("--no-temp-files模式下未设置JOB_MANIFEST_PATH，没有可续传的进度")
+    manifest = JobManifest(manifest_path)
+    if not args.resume and not args.watch:
+        manifest.reset()
 
-        except Exception as e:
-            logger.error(f"处理PDF文件失败：{pdf_path}, 错误：{e}")
-            continue
+    # 渲染与上传流水线：页面渲染完成即进入队列上传
+    upload_queue_size = int(os.getenv("UPLOAD_QUEUE_SIZE", 16))
+    # 草稿分片：单个草稿的文章数上限与分片前的排序方式（input/filename/date/size）
+    draft_max_articles = int(os.getenv("DRAFT_MAX_ARTICLES", 8))
+    draft_order = os.getenv("DRAFT_ORDER", "input")
+    # 文档级调度：设置内存预算（MB）后多个PDF同时渲染，小文档优先；0为逐个处理
+    scheduler_memory_mb = int(os.getenv("SCHEDULER_MEMORY_MB", 0))
+    scheduler = None
+    if scheduler_memory_mb > 0:
+        from doc_scheduler import DocumentScheduler
+        scheduler = DocumentScheduler(scheduler_memory_mb * 1024 ** 2,
+                                      max_documents=int(os.getenv("SCHEDULER_MAX_DOCUMENTS", 0)) or None)
+    stitcher = None
+    if stitch_max_height > 0:
+        from page_stitcher import PageStitcher
+        stitcher = PageStitcher(encoder, max_height=stitch_max_height)
+    pipeline = UploadPipeline(pdf_processor, wechat_uploader,
+                              upload_workers=upload_workers, queue_size=upload_queue_size, manifest=manifest,
+                              in_memory=args.no_temp_files, stitcher=stitcher, metrics=metrics,
+                              max_articles=draft_max_articles, draft_order=draft_order, scheduler=scheduler)
+    logger.info(f"Upload workers: {upload_workers}, Rate: {upload_rate}/s, Queue size: {upload_queue_size}, "
+                f"Stitch max height: {stitch_max_height}, Draft: {draft_max_articles} articles by {draft_order}, "
+                f"Scheduler memory: {scheduler_memory_mb} MB")
+    logger.info(f"冷启动耗时：{time.perf_counter() - _STARTED_AT:.3f}秒")
 
-        if not output_pdfs:
-            logger.warning("没有成功处理PDF文件, 无法创建图文消息")
-            return
-
-    # 创建图文消息
     try:
-        article_media_id = wechat_uploader.create_article(output_pdfs, titles, cover_image_path=cover_image_path)
-        logger.info(f"多篇文章草稿创建成功, media_id: {article_media_id}")
+        if args.watch:
+            watch_folder(pipeline, file_manager, pdf_folder, cover_image_path, args.save_watermarked)
+            return
 
-    except Exception as e:
-        logger.error(f"创建多文章图文消息失败，错误：{e}")
-        return
+        # 获取桌面上的PDF文件
+        with metrics.span("scan"):
+            pdf_files = file_manager.get_pdf_files()
+        if not pdf_files:
+            logger.warning("未在桌面上找到PDF文件")
+            return
+        process_pdfs(pipeline, file_manager, pdf_files, cover_image_path, args.save_watermarked)
+        export_metrics(metrics)
 
     finally:
-        # 删除临时文件
-        for output_pdf, output_folder in zip(output_pdfs, output_folders):
-            try:
-                if os.path.exists(output_pdf):
-                    os.remove(output_pdf)
-                    logger.info(f"删除临时水印PDF：{output_pdf}")
-                file_manager.delete_folder(output_folder)
-                logger.info(f"删除临时PNG文件夹：{output_folder}")
-            except Exception as e:
-                logger.error(f"删除临时文件失败：{output_pdf} 或 {output_folder}, 错误：{e}")
+        pdf_processor.close()
+        logger.info(f"HTTP统计：{wechat_uploader.http_stats()}")
+        wechat_uploader.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import fitz
+import numpy as np
+from color_reduction import _luminance, _samples
+
+
+class MarginCropper:
+    """按页面内容范围裁掉空白页边
+
+    渲染前用低分辨率灰度探测图（未叠加水印）按行、列统计墨迹像素，得到内容包围盒，
+    与需要保护的区域（水印）合并后四周留出padding（pt），作为300 DPI渲染的clip，
+    页边像素不再渲染、编码和上传。
+    墨迹占比不超过noise的行和列视为扫描噪点；裁剪后面积节省不足min_saving时不裁剪。
+    """
+
+    def __init__(self, padding=12.0, ink_level=224, noise=0.005, min_saving=0.05, probe_dpi=50):
+        self.padding = max(0.0, padding)
+        self.ink_level = ink_level
+        self.noise = noise
+        self.min_saving = min_saving
+        self.probe_dpi = probe_dpi
+
+    def crop_box(self, page, protect=None):
+        """计算裁剪区域，按页面宽高的比例返回(x0, y0, x1, y1)，原点在左上角；无需裁剪时返回None
+
+        protect为必须保留的区域，坐标形式相同。
+        """
+        zoom = self.probe_dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        box = self.content_box(_luminance(_samples(pix)))
+        if box is None:
+            # 空白页保持原样，交给page_filter处理
+            return None
+        if protect:
+            box = (min(box[0], protect[0]), min(box[1], protect[1]),
+                   max(box[2], protect[2]), max(box[3], protect[3]))
+        rect = page.rect
+        pad_x, pad_y = self.padding / rect.width, self.padding / rect.height
+        box = (max(0.0, box[0] - pad_x), max(0.0, box[1] - pad_y),
+               min(1.0, box[2] + pad_x), min(1.0, box[3] + pad_y))
+        if (box[2] - box[0]) * (box[3] - box[1]) > 1 - self.min_saving:
+            return None
+        return box
+
+    def content_box(self, gray):
+        """墨迹包围盒，按探测图宽高的比例返回(x0, y0, x1, y1)；没有墨迹时返回None"""
+        height, width = gray.shape
+        ink = gray < self.ink_level
+        rows = np.flatnonzero(ink.mean(axis=1) > self.noise)
+        cols = np.flatnonzero(ink.mean(axis=0) > self.noise)
+        if rows.size == 0 or cols.size == 0:
+            return None
+        return cols[0] / width, rows[0] / height, (cols[-1] + 1) / width, (rows[-1] + 1) / height
+
+    @staticmethod
+    def clip_rect(page, box):
+        """把比例坐标的裁剪区域转换为页面坐标的fitz.Rect"""
+        rect = page.rect
+        return fitz.Rect(rect.x0 + box[0] * rect.width, rect.y0 + box[1] * rect.height,
+                         rect.x0 + box[2] * rect.width, rect.y0 + box[3] * rect.height)
+
+    @staticmethod
+    def relative_box(box, crop):
+        """把页面比例坐标的区域换算为相对裁剪区域的比例坐标"""
+        width, height = crop[2] - crop[0], crop[3] - crop[1]
+        return ((box[0] - crop[0]) / width, (box[1] - crop[1]) / height,
+                (box[2] - crop[0]) / width, (box[3] - crop[1]) / height)
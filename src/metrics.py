@@ -0,0 +1,177 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# 接口耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 流水线各阶段
+STAGES = ("scan", "filter", "watermark", "render", "encode", "write", "upload", "draft")
+
+PROMETHEUS_PREFIX = "wechat_publisher"
+
+
+class Metrics:
+    """一次运行的结构化计时与统计，线程安全
+
+    记录按阶段和PDF汇总的耗时、写入/上传字节数、按接口分组的延迟直方图
+    以及重试和错误次数，可导出为JSON运行报告和Prometheus textfile。
+    耗时在记录时即汇总，不保留逐页明细，常驻运行时内存占用不随处理页数增长。
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._documents = {}
+        self._counters = {}
+        self._latency = {}
+
+    @contextmanager
+    def span(self, stage, document=None, page=None):
+        """计时一个阶段，异常时同时记录该阶段的错误次数"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.count("errors", stage=stage)
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, document, page)
+
+    def record(self, stage, seconds, document=None, page=None):
+        """记录一段已测得的阶段耗时（如渲染子进程带回的计时），累加到阶段和PDF的汇总中"""
+        with self._lock:
+            summary = self._stages.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            summary["count"] += 1
+            summary["seconds"] += seconds
+            summary["max_seconds"] = max(summary["max_seconds"], seconds)
+            if document is not None:
+                entry = self._documents.setdefault(document, {"pages": set(), "stages": {}})
+                entry["stages"][stage] = entry["stages"].get(stage, 0.0) + seconds
+                if page is not None:
+                    entry["pages"].add(page)
+
+    def reset_documents(self):
+        """清空按PDF的汇总，守护模式下每批导出后调用，阶段汇总和计数器继续累计"""
+        with self._lock:
+            self._documents = {}
+
+    def count(self, name, value=1, **labels):
+        """累加计数器，如bytes_written、bytes_uploaded、http_retries、errors"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe_api(self, url, seconds):
+        """记录一次接口调用的耗时，按接口路径分组"""
+        endpoint = endpoint_name(url)
+        with self._lock:
+            histogram = self._latency.setdefault(endpoint, {"buckets": [0] * len(LATENCY_BUCKETS),
+                                                            "count": 0, "sum": 0.0})
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    def report(self):
+        """汇总为可JSON序列化的运行报告"""
+        with self._lock:
+            stages = {stage: dict(summary) for stage, summary in self._stages.items()}
+            documents = {document: {"pages": len(entry["pages"]), "stages": dict(entry["stages"])}
+                         for document, entry in self._documents.items()}
+            counters = dict(self._counters)
+            latency = {endpoint: dict(histogram, buckets=list(histogram["buckets"]))
+                       for endpoint, histogram in self._latency.items()}
+
+        return {
+            "started_at": self.started_at,
+            "duration_seconds": time.perf_counter() - self._start,
+            "stages": stages,
+            "documents": documents,
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(counters.items())],
+            "api_latency": {endpoint: dict(histogram, le=list(LATENCY_BUCKETS))
+                            for endpoint, histogram in sorted(latency.items())},
+        }
+
+    def write_json(self, path):
+        """写入JSON运行报告"""
+        _atomic_write(path, json.dumps(self.report(), ensure_ascii=False, indent=1))
+
+    def write_prometheus(self, path):
+        """写入node_exporter textfile收集器格式的指标文件"""
+        _atomic_write(path, self.prometheus_text())
+
+    def prometheus_text(self):
+        report = self.report()
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {p}_run_duration_seconds Duration of the last run.",
+            f"# TYPE {p}_run_duration_seconds gauge",
+            f"{p}_run_duration_seconds {report['duration_seconds']:.6f}",
+            f"# HELP {p}_run_started_timestamp_seconds Start time of the last run.",
+            f"# TYPE {p}_run_started_timestamp_seconds gauge",
+            f"{p}_run_started_timestamp_seconds {report['started_at']:.3f}",
+            f"# HELP {p}_stage_seconds Total time spent per stage in the last run.",
+            f"# TYPE {p}_stage_seconds gauge",
+        ]
+        for stage, summary in sorted(report["stages"].items()):
+            lines.append(f'{p}_stage_seconds{{stage="{stage}"}} {summary["seconds"]:.6f}')
+        lines += [f"# HELP {p}_stage_spans Number of timed spans per stage in the last run.",
+                  f"# TYPE {p}_stage_spans gauge"]
+        for stage, summary in sorted(report["stages"].items()):
+            lines.append(f'{p}_stage_spans{{stage="{stage}"}} {summary["count"]}')
+
+        counter_names = sorted({counter["name"] for counter in report["counters"]})
+        for name in counter_names:
+            lines += [f"# HELP {p}_{name} Counter {name} for the last run.", f"# TYPE {p}_{name} gauge"]
+            for counter in report["counters"]:
+                if counter["name"] == name:
+                    lines.append(f"{p}_{name}{_labels(counter['labels'])} {counter['value']}")
+
+        if report["api_latency"]:
+            lines += [f"# HELP {p}_api_latency_seconds WeChat API latency by endpoint in the last run.",
+                      f"# TYPE {p}_api_latency_seconds histogram"]
+        for endpoint, histogram in report["api_latency"].items():
+            for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                lines.append(f'{p}_api_latency_seconds_bucket{_labels({"endpoint": endpoint, "le": bound})} {count}')
+            lines.append(f'{p}_api_latency_seconds_bucket{_labels({"endpoint": endpoint, "le": "+Inf"})} '
+                         f'{histogram["count"]}')
+            lines.append(f'{p}_api_latency_seconds_sum{_labels({"endpoint": endpoint})} {histogram["sum"]:.6f}')
+            lines.append(f'{p}_api_latency_seconds_count{_labels({"endpoint": endpoint})} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+def endpoint_name(url):
+    """接口分组名：微信接口取/cgi-bin/之后的路径，其他地址取主机名"""
+    parts = urlsplit(url)
+    if parts.path.startswith("/cgi-bin/"):
+        return parts.path[len("/cgi-bin/"):]
+    return parts.netloc
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _atomic_write(path, text):
+    """写临时文件后原子替换，避免收集器读到写了一半的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
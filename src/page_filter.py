@@ -0,0 +1,100 @@
+import logging
+import fitz
+import numpy as np
+from PIL import Image
+from color_reduction import _luminance, _samples
+
+logger = logging.getLogger(__name__)
+
+# 重复页处理：off 不检测；collapse 只合并连续的重复页；drop 去掉与之前任一页重复的页面
+DUPLICATE_MODES = ("off", "collapse", "drop")
+
+
+class PageFilter:
+    """上传前过滤空白页和近似重复页
+
+    在渲染之前用低分辨率探测图（未叠加水印）做判断，被过滤的页面不再渲染、编码和上传。
+    空白页：去掉四周margin比例的页边后，灰度低于ink_level的墨迹像素占比不超过blank_threshold
+    （扫描件的空白背面、分隔页）；blank_threshold为0时不检测。
+    近似重复页：用墨迹区域的差值哈希（dHash）比较页面，汉明距离不超过哈希位数的duplicate_distance比例时视为重复，
+    保留第一次出现的页面。
+    """
+
+    def __init__(self, blank_threshold=0.0, duplicates="off", duplicate_distance=0.03, ink_level=128,
+                 margin=0.05, hash_size=16, probe_dpi=50):
+        if duplicates not in DUPLICATE_MODES:
+            raise ValueError(f"不支持的重复页处理方式：{duplicates}，可选：{', '.join(DUPLICATE_MODES)}")
+        self.blank_threshold = blank_threshold
+        self.duplicates = duplicates
+        self.duplicate_distance = duplicate_distance
+        self.ink_level = ink_level
+        self.margin = margin
+        self.hash_size = hash_size
+        self.probe_dpi = probe_dpi
+
+    @property
+    def enabled(self):
+        return self.blank_threshold > 0 or self.duplicates != "off"
+
+    def analyze(self, doc, page_nums=None):
+        """判断文档中需要跳过的页面，返回{page_num: 原因}，原因为"blank"或"duplicate:N"（与第N页重复）"""
+        skipped = {}
+        kept = []
+        max_distance = int(self.duplicate_distance * self.hash_size * self.hash_size)
+        for page_num in range(len(doc)) if page_nums is None else page_nums:
+            gray = self.probe(doc.load_page(page_num))
+            if self.blank_threshold > 0 and self.ink_coverage(gray) <= self.blank_threshold:
+                skipped[page_num] = "blank"
+                continue
+            if self.duplicates == "off":
+                continue
+            digest = self.dhash(gray)
+            # collapse只和上一个保留的页面比较，drop和之前所有保留的页面比较
+            candidates = kept if self.duplicates == "drop" else kept[-1:]
+            match = next((kept_num for kept_num, kept_digest in candidates
+                          if (kept_digest ^ digest).bit_count() <= max_distance), None)
+            if match is not None:
+                skipped[page_num] = f"duplicate:{match + 1}"
+                continue
+            kept.append((page_num, digest))
+        return skipped
+
+    def probe(self, page):
+        """以probe_dpi渲染页面，返回灰度数组"""
+        zoom = self.probe_dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        return _luminance(_samples(pix)).copy()
+
+    def ink_coverage(self, gray):
+        """去掉页边后墨迹像素的占比"""
+        height, width = gray.shape
+        dy, dx = int(height * self.margin), int(width * self.margin)
+        body = gray[dy:height - dy or None, dx:width - dx or None]
+        if body.size == 0:
+            body = gray
+        return float((body < self.ink_level).mean())
+
+    def dhash(self, gray):
+        """差值哈希：裁到墨迹包围盒后缩小为(hash_size+1)×hash_size，比较水平相邻像素，返回hash_size²位整数
+
+        先裁掉空白区域，内容稀疏的页面（只有一行标题）也能区分。
+        """
+        rows = np.flatnonzero((gray < self.ink_level).any(axis=1))
+        cols = np.flatnonzero((gray < self.ink_level).any(axis=0))
+        if rows.size and cols.size:
+            gray = gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        small = np.asarray(Image.fromarray(gray).resize((self.hash_size + 1, self.hash_size), Image.Resampling.BOX),
+                           dtype=np.int16)
+        bits = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def describe_skipped(skipped):
+    """把跳过的页面格式化为"第3页空白，第5页与第4页重复\""""
+    parts = []
+    for page_num, reason in sorted(skipped.items()):
+        if reason == "blank":
+            parts.append(f"第{page_num + 1}页空白")
+        else:
+            parts.append(f"第{page_num + 1}页与第{reason.split(':', 1)[1]}页重复")
+    return "，".join(parts)
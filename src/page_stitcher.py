@@ -0,0 +1,105 @@
+import logging
+import os
+from io import BytesIO
+from PIL import Image
+from image_encoder import ImageEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class StitchedStrip:
+    """若干连续页面竖向拼接后的长图"""
+
+    def __init__(self, page_nums, encoded):
+        self.page_nums = tuple(page_nums)
+        self.encoded = encoded
+
+    @property
+    def data(self):
+        return self.encoded.data
+
+    @property
+    def extension(self):
+        return self.encoded.extension
+
+
+class PageStitcher:
+    """把连续页面竖向拼接成长图，减少每篇文章的上传次数
+
+    按页面顺序做Next-Fit装箱：拼接后的高度不超过max_height像素、
+    各页编码体积之和不超过max_bytes时继续装入下一页，否则封箱开始新长图。
+    页码不连续时也封箱，保证文章中的页面顺序不变。
+    体积只是估算，长图编码后仍需缩小尺寸才能满足预算时对半拆开重新编码，
+    单页长图交给编码器自身的预算搜索。
+    """
+
+    def __init__(self, encoder=None, max_height=8000, max_bytes=None):
+        self.encoder = encoder or ImageEncoder()
+        self.max_height = max_height
+        self.max_bytes = max_bytes if max_bytes is not None else self.encoder.max_bytes
+
+    def stitch(self, pages):
+        """输入按页码排列的(page_num, 图片路径或编码字节)，逐个产出StitchedStrip"""
+        group = []
+        width = height = size = 0
+        for page_num, image in pages:
+            page_width, page_height = _image_size(image)
+            page_size = _image_bytes(image)
+            if group:
+                # 统一缩放到长图第一页的宽度
+                scaled_height = round(page_height * width / page_width)
+                if (page_num != group[-1][0] + 1 or height + scaled_height > self.max_height
+                        or (self.max_bytes is not None and size + page_size > self.max_bytes)):
+                    yield from self._encode_group(group, width)
+                    group = []
+            if not group:
+                width, height, size = page_width, 0, 0
+                scaled_height = page_height
+            group.append((page_num, image))
+            height += scaled_height
+            size += page_size
+        if group:
+            yield from self._encode_group(group, width)
+
+    def _encode_group(self, group, width):
+        """拼接并编码一组页面，编码器需要缩小尺寸时对半拆开"""
+        encoded = self.encoder.encode(_stack([image for _, image in group], width))
+        if encoded.scale < 1.0 and len(group) > 1:
+            middle = len(group) // 2
+            logger.debug(f"长图超出{self.max_bytes}字节预算，拆分：{len(group)}页")
+            yield from self._encode_group(group[:middle], width)
+            yield from self._encode_group(group[middle:], width)
+            return
+        yield StitchedStrip([page_num for page_num, _ in group], encoded)
+
+
+def _open(image):
+    return Image.open(image if isinstance(image, str) else BytesIO(image))
+
+
+def _image_size(image):
+    """只读取图片头获取尺寸"""
+    with _open(image) as img:
+        return img.size
+
+
+def _image_bytes(image):
+    return os.path.getsize(image) if isinstance(image, str) else len(image)
+
+
+def _stack(images, width):
+    """把图片按宽度width等比缩放后竖向拼接，全部为灰度/1位图时输出灰度图"""
+    pages = []
+    for image in images:
+        with _open(image) as img:
+            img.load()
+            if img.width != width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            pages.append(img)
+    mode = "L" if all(page.mode in ("1", "L") for page in pages) else "RGB"
+    canvas = Image.new(mode, (width, sum(page.height for page in pages)), "white")
+    top = 0
+    for page in pages:
+        canvas.paste(page.convert(mode), (0, top))
+        top += page.height
+    return canvas
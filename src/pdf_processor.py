@@ -1,51 +1,185 @@
+import hashlib
+import logging
+import multiprocessing
 import os
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.lib.pagesizes import A3, A4
-from reportlab.pdfgen import canvas
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 import fitz
 from io import BytesIO
 from PIL import Image
+from image_encoder import IMAGE_FORMATS, EncodedImage, ImageEncoder
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# 页面渲染分辨率
+RENDER_DPI = 300
+# A4页面宽度，单位pt（与reportlab的A4[0]一致）
+A4_WIDTH = 595.2755905511812
+
+# 水印模板缓存：(页面宽, 页面高, 透明度, 水印文件哈希) -> 单页水印PdfReader
+# 同一进程内每种页面尺寸只生成一次，所有页面引用同一个图片XObject
+_watermark_template_cache = {}
+_watermark_template_lock = threading.Lock()
+
+
+def clear_watermark_template_cache():
+    """清空水印模板缓存"""
+    with _watermark_template_lock:
+        _watermark_template_cache.clear()
+
+
+def split_page_ranges(page_count, workers, chunks_per_worker=4):
+    """把页码切分为连续区间[(start, stop), ...]，每个进程分到若干块以平衡负载"""
+    if page_count <= 0:
+        return []
+    chunk_count = max(1, min(page_count, workers * chunks_per_worker))
+    base, extra = divmod(page_count, chunk_count)
+    ranges = []
+    start = 0
+    for i in range(chunk_count):
+        stop = start + base + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _replace_file(path, data):
+    """写临时文件后原子替换path
+
+    输出文件夹中的页面可能是渲染缓存的硬链接，原地截断会改写缓存中的图片，因此总是替换为新文件。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 
 class PDFProcessor:
-    def __init__(self, file_manager, watermark_image="resources/watermark.png", watermark_alpha=0.5):
+    def __init__(self, file_manager, watermark_image="resources/watermark.png", watermark_alpha=0.5,
+                 render_workers=1, encoder=None, color_reducer=None, page_filter=None, cropper=None,
+                 render_cache=None, metrics=None):
         self.file_manager = file_manager
         # 使用绝对路径
         self.watermark_image = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", watermark_image))
         if not os.path.exists(self.watermark_image):
             raise FileNotFoundError(f"水印图片未找到：{self.watermark_image}")
         self.watermark_alpha = max(0.0, min(1.0, watermark_alpha))  # 限制透明度在0.0到1.0之间
+        self._watermark_digest = None
+        self._watermark_size = None
+        # 渲染进程数，大于1时按页码区间并行渲染，每个进程独立打开fitz文档
+        self.render_workers = max(1, int(render_workers))
+        self._render_pool = None
+        # 页面编码器，决定输出格式和单页字节预算
+        self.encoder = encoder or ImageEncoder()
+        # 可选的色彩缩减（ColorReducer），黑白页面以灰度渲染并输出灰度/1位图
+        self.color_reducer = color_reducer
+        # 可选的空白页/重复页过滤（PageFilter），被过滤的页面不渲染
+        self.page_filter = page_filter
+        # 可选的页边裁剪（MarginCropper），按内容范围只渲染裁剪区域
+        self.cropper = cropper
+        # 可选的渲染缓存（RenderCache），源文件和渲染设置都未变化的页面直接复用
+        self.render_cache = render_cache
+        # 每个PDF跳过的页面：{输出文件夹名: {page_num: 原因}}，子目录中的同名PDF互不覆盖
+        self.filter_report = {}
+        # 每个PDF每页的编码统计：{输出文件夹名: {page_num: {...}}}
+        self.encoding_report = {}
+        # 各阶段计时与字节统计
+        self.metrics = metrics or Metrics()
+
+    def __getstate__(self):
+        # 进程池、统计对象和缓存连接不可序列化，传给子进程时去掉；子进程的计时随页面统计带回，缓存由主进程写入
+        state = self.__dict__.copy()
+        state["_render_pool"] = None
+        state["metrics"] = None
+        state["render_cache"] = None
+        return state
+
+    def close(self):
+        """关闭渲染进程池和渲染缓存"""
+        if self._render_pool is not None:
+            self._render_pool.shutdown()
+            self._render_pool = None
+        if self.render_cache is not None:
+            self.render_cache.close()
+
+    @property
+    def watermark_digest(self):
+        """水印图片内容的SHA-256，用作模板缓存键"""
+        if self._watermark_digest is None:
+            with open(self.watermark_image, "rb") as f:
+                self._watermark_digest = hashlib.sha256(f.read()).hexdigest()
+        return self._watermark_digest
 
     def add_watermark(self, input_pdf, output_pdf):
         """为PDF文件添加居中图片水印"""
-        reader = PdfReader(input_pdf)
-        writer = PdfWriter()
-        watermark_pdf = self._create_image_watermark_pdf()
-        for page in reader.pages:
-            page.merge_page(watermark_pdf.pages[0])
-            writer.add_page(page)
-        with open(output_pdf, "wb") as output_file:
-            writer.write(output_file)
-
-    def _create_image_watermark_pdf(self):
-        """创建包含居中图片水印的PDF"""
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
-        page_width, page_height = A4  # 612x792 pt
+        # PyPDF2只在生成水印PDF时才用到，延迟导入以加快启动
+        from PyPDF2 import PdfReader, PdfWriter, Transformation
+        with self.metrics.span("watermark", document=self.file_manager.output_name(input_pdf)):
+            reader = PdfReader(input_pdf)
+            writer = PdfWriter()
+            for page in reader.pages:
+                box = page.mediabox
+                left, bottom = float(box.left), float(box.bottom)
+                template = self._get_watermark_template(float(box.width), float(box.height))
+                if left or bottom:
+                    # 页面原点不在(0, 0)时平移水印
+                    page.merge_transformed_page(template.pages[0], Transformation().translate(left, bottom))
+                else:
+                    page.merge_page(template.pages[0])
+                writer.add_page(page)
+            with open(output_pdf, "wb") as output_file:
+                writer.write(output_file)
+        self.metrics.count("bytes_written", os.path.getsize(output_pdf), kind="pdf")
+
+    def _get_watermark_template(self, page_width, page_height):
+        """按页面尺寸获取缓存的水印模板，未命中时生成"""
+        key = (round(page_width, 2), round(page_height, 2), self.watermark_alpha, self.watermark_digest)
+        with _watermark_template_lock:
+            template = _watermark_template_cache.get(key)
+            if template is None:
+                template = self._create_image_watermark_pdf((page_width, page_height))
+                _watermark_template_cache[key] = template
+        return template
 
+    def _watermark_geometry(self, page_width, page_height):
+        """计算水印在页面上的位置和尺寸，返回(x, y, width, height)，单位pt"""
         # 动态获取水印图片尺寸
-        with Image.open(self.watermark_image) as img:
-            watermark_width, watermark_height = img.size
-            # 按比例缩放，限制最大宽度为200 pt
-            max_width = 450
-            if watermark_width > max_width:
-                scale = max_width / watermark_width
-                watermark_width = max_width
-                watermark_height = watermark_height * scale
+        if self._watermark_size is None:
+            with Image.open(self.watermark_image) as img:
+                self._watermark_size = img.size
+        watermark_width, watermark_height = self._watermark_size
+        # 按比例缩放，A4页面最大宽度为450 pt，其他尺寸按页面宽度等比换算
+        max_width = 450 * page_width / A4_WIDTH
+        if watermark_width > max_width:
+            scale = max_width / watermark_width
+            watermark_width = max_width
+            watermark_height = watermark_height * scale
 
         # 计算居中位置
         x_position = (page_width - watermark_width) / 2
         y_position = 0
+        return x_position, y_position, watermark_width, watermark_height
+
+    def _create_image_watermark_pdf(self, pagesize=None):
+        """创建包含居中图片水印的PDF，默认A4"""
+        # reportlab和PyPDF2只在首次生成水印模板时导入
+        from PyPDF2 import PdfReader
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        pagesize = pagesize or A4
+        buffer = BytesIO()
+        c = canvas.Canvas(buffer, pagesize=pagesize)
+        page_width, page_height = pagesize
+        x_position, y_position, watermark_width, watermark_height = self._watermark_geometry(page_width, page_height)
 
         # 设置透明度并绘制水印图片
         c.setFillAlpha(self.watermark_alpha)  # 设置透明度
@@ -58,15 +192,421 @@ class PDFProcessor:
 
     def convert_pdf_to_images(self, pdf_path):
         """将PDF转换为PNG图片并保存到输出文件夹"""
-        output_folder = self.file_manager.create_output_folder(pdf_path)
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        for _ in self._iter_document_pages(pdf_path, watermark=False):
+            pass
+        return self.file_manager.get_output_folder(pdf_path)
+
+    def watermark_and_convert(self, input_pdf, watermarked_pdf=None):
+        """在内存中为源PDF叠加水印并直接渲染为PNG，不生成中间水印PDF
+
+        仅当指定watermarked_pdf时才把带水印的PDF写入磁盘。
+        输出文件夹以源PDF命名。
+        """
+        for _ in self.iter_watermarked_pages(input_pdf, watermarked_pdf=watermarked_pdf):
+            pass
+        return self.file_manager.get_output_folder(input_pdf)
+
+    def iter_watermarked_pages(self, input_pdf, watermarked_pdf=None, skip_pages=None):
+        """逐页叠加水印并渲染，每完成一页产出(page_num, image_path)，page_num从0开始
+
+        并行渲染时按完成顺序产出，调用方需按page_num排序。
+        skip_pages中的页码（如断点续传时已渲染的页面）不再渲染。
+        被page_filter过滤的页面先于其他页面产出(page_num, None)，随后是render_cache命中的页面。
+        """
+        return self._iter_document_pages(input_pdf, watermark=True, watermarked_pdf=watermarked_pdf,
+                                         skip_pages=skip_pages)
+
+    def iter_encoded_pages(self, input_pdf, watermarked_pdf=None, skip_pages=None):
+        """逐页叠加水印、渲染并编码，产出(page_num, EncodedImage)，不创建任何临时图片文件
+
+        并行渲染时按完成顺序产出，调用方需按page_num排序。
+        """
+        return self._iter_document_pages(input_pdf, watermark=True, watermarked_pdf=watermarked_pdf,
+                                         skip_pages=skip_pages, in_memory=True)
+
+    def iter_documents(self, documents, scheduler, in_memory=False):
+        """同时渲染多个PDF，documents为[(key, pdf_path, watermarked_pdf, skip_pages)]
+
+        按scheduler（DocumentScheduler）的内存预算准入，小文档优先；所有PDF的页面区间交给同一个渲染进程池，
+        render_workers为1时不创建进程池，在调用线程中逐个渲染。主进程中的PyMuPDF只由调用线程使用。
+        每个PDF全部完成后产出(key, 按页码排序的[(page_num, None或图片)], None)，
+        失败时产出(key, None, 错误)，不影响其他PDF。
+        """
+        from doc_scheduler import estimate_document
+        pool = self._get_render_pool() if self.render_workers > 1 else None
+        waiting = []
+        for job in documents:
+            try:
+                estimate = estimate_document(job[1], dpi=RENDER_DPI)
+            except Exception as e:
+                yield job[0], None, e
+                continue
+            # 内存模式下整份PDF的编码结果在上传前都留在内存中
+            result_bytes = (self.encoder.max_bytes or estimate.page_bytes // 4) if in_memory else 0
+            waiting.append((estimate, scheduler.cost(estimate, result_bytes), job))
+        waiting = scheduler.order(waiting)
+        # 所有PDF共用同一组渲染进程，进程的工作内存只预留一次
+        scheduler.reserve(scheduler.working_set([item[0] for item in waiting], self.render_workers))
+
+        running = {}
+        owners = {}
+        try:
+            while waiting or running:
+                while waiting and scheduler.try_admit(waiting[0][1]):
+                    estimate, cost, (key, pdf_path, watermarked_pdf, skip_pages) = waiting.pop(0)
+                    try:
+                        state = self._start_document(pool, pdf_path, watermarked_pdf, skip_pages, in_memory)
+                    except Exception as e:
+                        scheduler.release(cost)
+                        yield key, None, e
+                        continue
+                    state["cost"] = cost
+                    logger.info(f"开始渲染{state['pdf_name']}（{estimate.pages}页，预计占用{cost / 1024 ** 2:.0f} MB，"
+                                f"已占用{scheduler.in_use / 1024 ** 2:.0f}/{scheduler.memory_budget / 1024 ** 2:.0f} MB）")
+                    if not state["futures"]:
+                        scheduler.release(cost)
+                        self._log_encoding_report(state["pdf_name"])
+                        yield key, sorted(state["pages"], key=lambda item: item[0]), None
+                        continue
+                    running[key] = state
+                    owners.update(dict.fromkeys(state["futures"], key))
+                if not running:
+                    continue
+                done, _ = wait(list(owners), return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = owners.pop(future)
+                    state = running[key]
+                    state["futures"].discard(future)
+                    try:
+                        for page_num, image, stats in future.result():
+                            self._finish_page(state["pdf_name"], page_num, image, stats, state["cache_keys"],
+                                              state["output_folder"])
+                            state["pages"].append((page_num, image))
+                    except Exception as e:
+                        state.setdefault("error", e)
+                        # 同一PDF尚未开始的区间不再渲染
+                        for pending in state["futures"]:
+                            pending.cancel()
+                    if state["futures"]:
+                        continue
+                    del running[key]
+                    scheduler.release(state["cost"])
+                    if "error" in state:
+                        yield key, None, state["error"]
+                        continue
+                    self._log_encoding_report(state["pdf_name"])
+                    yield key, sorted(state["pages"], key=lambda item: item[0]), None
+        finally:
+            for future in owners:
+                future.cancel()
+            for state in running.values():
+                scheduler.release(state["cost"])
+            scheduler.reserve(0)
+
+    def _start_document(self, pool, pdf_path, watermarked_pdf, skip_pages, in_memory):
+        """在主进程完成渲染前的准备，把需要渲染的页面区间提交到进程池；pool为None时直接在本进程渲染"""
+        output_folder = None if in_memory else self.file_manager.create_output_folder(pdf_path)
+        pdf_name = self.file_manager.output_name(pdf_path)
+        doc = fitz.open(pdf_path)
+        templates = {}
+        try:
+            page_nums, ready, cache_keys = self._prepare_document(doc, pdf_path, pdf_name, True, watermarked_pdf,
+                                                                  skip_pages, output_folder, templates)
+            pages = list(ready)
+            if pool is None:
+                for page_num, image, stats in self._iter_render_pages(doc, page_nums, output_folder, pdf_name,
+                                                                      watermark=not watermarked_pdf):
+                    self._finish_page(pdf_name, page_num, image, stats, cache_keys, output_folder)
+                    pages.append((page_num, image))
+                page_nums = []
+        finally:
+            for template_doc in templates.values():
+                template_doc.close()
+            doc.close()
+        # 子进程各自打开源PDF并叠加水印
+        futures = {pool.submit(self._render_range, pdf_path, page_nums[start:stop], output_folder, pdf_name, True)
+                   for start, stop in split_page_ranges(len(page_nums), self.render_workers)}
+        return {"pdf_name": pdf_name, "output_folder": output_folder, "cache_keys": cache_keys,
+                "pages": pages, "futures": futures}
+
+    def page_image_name(self, pdf_path, page_num, extension=None):
+        """页面图片的文件名<pdf_name>_page_N.<扩展名>，page_num从0开始"""
+        pdf_name = self.file_manager.output_name(pdf_path)
+        return f"{pdf_name}_page_{page_num+1}.{extension or self.encoder.extension}"
+
+    def page_count(self, pdf_path):
+        """读取PDF页数，不渲染页面"""
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+
+    def _iter_document_pages(self, pdf_path, watermark, watermarked_pdf=None, skip_pages=None, in_memory=False):
+        """打开PDF并逐页渲染到以其命名的输出文件夹，in_memory时直接产出编码后的图片"""
+        output_folder = None if in_memory else self.file_manager.create_output_folder(pdf_path)
+        pdf_name = self.file_manager.output_name(pdf_path)
 
         # 使用PyMuPDF打开PDF
         doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))  # 300 DPI
-            image_path = os.path.join(output_folder, f"{pdf_name}_page_{page_num+1}.png")
-            pix.save(image_path, "png")
-        doc.close()
-        return output_folder
+        templates = {}
+        try:
+            page_nums, ready, cache_keys = self._prepare_document(doc, pdf_path, pdf_name, watermark, watermarked_pdf,
+                                                                  skip_pages, output_folder, templates)
+            yield from ready
+            if self._use_render_pool(page_nums):
+                # 子进程各自打开源PDF并叠加水印
+                rendered = self._iter_render_parallel(pdf_path, page_nums, output_folder, pdf_name, watermark)
+            else:
+                rendered = self._iter_render_pages(doc, page_nums, output_folder, pdf_name,
+                                                   watermark=watermark and not watermarked_pdf)
+            for page_num, image, stats in rendered:
+                self._finish_page(pdf_name, page_num, image, stats, cache_keys, output_folder)
+                yield page_num, image
+            self._log_encoding_report(pdf_name)
+        finally:
+            for template_doc in templates.values():
+                template_doc.close()
+            doc.close()
+
+    def _prepare_document(self, doc, pdf_path, pdf_name, watermark, watermarked_pdf, skip_pages, output_folder,
+                          templates):
+        """渲染前在主进程完成的工作：过滤页面、生成水印PDF、查询渲染缓存
+
+        返回(仍需渲染的页码, 无需渲染即可产出(page_num, None或图片)的迭代器, {未命中缓存的page_num: 缓存键})。
+        缓存命中的页面在迭代时才读取，内存模式下不会在第一页产出前读入整份文档。
+        """
+        page_nums = [page_num for page_num in range(len(doc)) if page_num not in (skip_pages or ())]
+        filtered = {}
+        if self.page_filter is not None and self.page_filter.enabled:
+            # 在叠加水印之前分析整份文档，续传时的判断与首次一致
+            filtered = self._filter_pages(doc, pdf_name, page_nums)
+            page_nums = [page_num for page_num in page_nums if page_num not in filtered]
+        if watermark and watermarked_pdf:
+            with self.metrics.span("watermark", document=pdf_name):
+                for page in doc:
+                    self._overlay_watermark(page, templates)
+                doc.save(watermarked_pdf, garbage=3, deflate=True)
+            self.metrics.count("bytes_written", os.path.getsize(watermarked_pdf), kind="pdf")
+        cached = []
+        cache_keys = {}
+        if self.render_cache is not None:
+            cached, cache_keys = self._lookup_render_cache(pdf_path, page_nums, watermark)
+            page_nums = [page_num for page_num in page_nums if page_num in cache_keys]
+        return page_nums, self._iter_ready_pages(pdf_name, filtered, cached, output_folder), cache_keys
+
+    def _iter_ready_pages(self, pdf_name, filtered, cached, output_folder):
+        """先产出被过滤的页面(page_num, None)，再逐页读取渲染缓存命中的页面"""
+        for page_num in sorted(filtered):
+            yield page_num, None
+        report = self.encoding_report.setdefault(pdf_name, {})
+        for page_num, path, stats in cached:
+            # 命中的页面不渲染也不写入新数据，只记录编码统计
+            stats["timings"] = {}
+            report[page_num] = stats
+            self._record_page_metrics(pdf_name, page_num, stats, written=False)
+            yield page_num, self._load_cached_page(path, stats, output_folder, pdf_name, page_num)
+
+    def _finish_page(self, pdf_name, page_num, image, stats, cache_keys, output_folder):
+        """记录渲染完成的页面：编码统计、阶段计时，并写入渲染缓存"""
+        self.encoding_report.setdefault(pdf_name, {})[page_num] = stats
+        self._record_page_metrics(pdf_name, page_num, stats, written=output_folder is not None)
+        if page_num in cache_keys:
+            self.render_cache.put(cache_keys[page_num], image if output_folder is not None else image.data,
+                                  IMAGE_FORMATS[stats["image_format"]],
+                                  {key: value for key, value in stats.items() if key != "timings"})
+
+    def _filter_pages(self, doc, pdf_name, page_nums):
+        """找出需要跳过的空白页和重复页，返回{page_num: 原因}，只包含page_nums中的页面"""
+        from page_filter import describe_skipped
+        with self.metrics.span("filter", document=pdf_name):
+            skipped = self.page_filter.analyze(doc)
+        self.filter_report[pdf_name] = skipped
+        if skipped:
+            logger.info(f"{pdf_name} 跳过{len(skipped)}/{len(doc)}页：{describe_skipped(skipped)}")
+        for reason in skipped.values():
+            self.metrics.count("pages_skipped", reason=reason.split(":", 1)[0])
+        wanted = set(page_nums)
+        return {page_num: reason for page_num, reason in skipped.items() if page_num in wanted}
+
+    def render_settings(self, watermark=True):
+        """影响页面像素的全部设置，作为渲染缓存键的一部分"""
+        return {
+            "fitz": fitz.VersionBind,
+            "dpi": RENDER_DPI,
+            "watermark": [self.watermark_digest, self.watermark_alpha] if watermark else None,
+            "encoder": vars(self.encoder),
+            "color_reducer": vars(self.color_reducer) if self.color_reducer is not None else None,
+            "cropper": vars(self.cropper) if self.cropper is not None else None,
+        }
+
+    def _lookup_render_cache(self, pdf_path, page_nums, watermark):
+        """查询渲染缓存，返回(命中的[(page_num, 图片路径, 编码统计)], {未命中的page_num: 缓存键})"""
+        start = time.perf_counter()
+        source_digest = self.render_cache.source_digest(pdf_path)
+        settings = self.render_settings(watermark)
+        hits = []
+        misses = {}
+        for page_num in page_nums:
+            key = self.render_cache.page_key(source_digest, page_num, settings)
+            entry = self.render_cache.get(key)
+            if entry is None:
+                misses[page_num] = key
+            else:
+                hits.append((page_num, *entry))
+        self.metrics.count("render_cache", len(hits), result="hit")
+        self.metrics.count("render_cache", len(misses), result="miss")
+        if hits:
+            logger.info(f"{self.file_manager.output_name(pdf_path)} 渲染缓存命中{len(hits)}/{len(page_nums)}页，"
+                        f"耗时{time.perf_counter() - start:.3f}秒")
+        return hits, misses
+
+    def _load_cached_page(self, path, stats, output_folder, pdf_name, page_num):
+        """把缓存的页面放到输出文件夹（优先硬链接），内存模式下读取为EncodedImage"""
+        if output_folder is None:
+            with open(path, "rb") as f:
+                data = f.read()
+            return EncodedImage(data, stats["image_format"], quality=stats["quality"], scale=stats["scale"],
+                                baseline_bytes=stats["bytes"] + stats["bytes_saved"])
+        image_path = os.path.join(output_folder, f"{pdf_name}_page_{page_num+1}.{IMAGE_FORMATS[stats['image_format']]}")
+        if os.path.exists(image_path):
+            os.remove(image_path)
+        try:
+            os.link(path, image_path)
+        except OSError:
+            shutil.copyfile(path, image_path)
+        return image_path
+
+    def _record_page_metrics(self, pdf_name, page_num, stats, written):
+        """把单页统计中的阶段耗时和字节数计入metrics"""
+        for stage, seconds in stats["timings"].items():
+            self.metrics.record(stage, seconds, document=pdf_name, page=page_num)
+        if written:
+            self.metrics.count("bytes_written", stats["bytes"], kind="image")
+        if stats.get("crop"):
+            self.metrics.count("pages_cropped")
+
+    def _overlay_watermark(self, page, templates):
+        """用缓存的水印模板覆盖PyMuPDF页面，templates为本文档内按尺寸复用的模板文档"""
+        rect = page.rect
+        key = (round(rect.width, 2), round(rect.height, 2))
+        template_doc = templates.get(key)
+        if template_doc is None:
+            template = self._get_watermark_template(rect.width, rect.height)
+            template_doc = fitz.open(stream=template.stream.getvalue(), filetype="pdf")
+            templates[key] = template_doc
+        page.show_pdf_page(rect, template_doc, 0, overlay=True)
+
+    def _watermark_box(self, page):
+        """水印在页面上的区域，按页面宽高的比例返回(x0, y0, x1, y1)，原点在左上角"""
+        rect = page.rect
+        x, y, width, height = self._watermark_geometry(rect.width, rect.height)
+        return (x / rect.width, (rect.height - y - height) / rect.height,
+                (x + width) / rect.width, (rect.height - y) / rect.height)
+
+    def _use_render_pool(self, page_nums):
+        """是否使用进程池渲染这些页面"""
+        return self.render_workers > 1 and len(page_nums) > 1
+
+    def _get_render_pool(self):
+        """懒加载渲染进程池，多个文档之间复用
+
+        进程池在上传线程启动之后才创建，在多线程进程中fork子进程可能死锁，
+        因此用forkserver（平台不支持时用spawn）启动渲染进程。
+        """
+        if self._render_pool is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._render_pool = ProcessPoolExecutor(max_workers=self.render_workers,
+                                                    mp_context=multiprocessing.get_context(start_method))
+        return self._render_pool
+
+    def _iter_render_parallel(self, pdf_path, page_nums, output_folder, pdf_name, watermark):
+        """把页码区间分发到进程池并行渲染，按区间完成顺序产出页面"""
+        pool = self._get_render_pool()
+        ranges = split_page_ranges(len(page_nums), self.render_workers)
+        # 限制同时在途的区间数，内存模式下已编码但未被消费的页面不会无限堆积
+        max_in_flight = self.render_workers + 1
+        pending = set()
+        try:
+            while ranges or pending:
+                while ranges and len(pending) < max_in_flight:
+                    start, stop = ranges.pop(0)
+                    pending.add(pool.submit(self._render_range, pdf_path, page_nums[start:stop], output_folder,
+                                            pdf_name, watermark))
+                done = next(as_completed(pending))
+                pending.remove(done)
+                yield from done.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _render_range(self, pdf_path, page_nums, output_folder, pdf_name, watermark):
+        """在子进程中打开PDF并渲染指定页面，返回[(page_num, image_path或EncodedImage, stats), ...]"""
+        doc = fitz.open(pdf_path)
+        try:
+            return list(self._iter_render_pages(doc, page_nums, output_folder, pdf_name, watermark))
+        finally:
+            doc.close()
+
+    def _iter_render_pages(self, doc, page_nums, output_folder, pdf_name, watermark):
+        """将文档的指定页面渲染为300 DPI并编码，写入<pdf_name>_page_N.<扩展名>
+
+        output_folder为None时不写文件，直接产出EncodedImage。
+        """
+        templates = {}
+        try:
+            for page_num in page_nums:
+                # 各阶段计时随stats返回，子进程渲染时也能带回主进程
+                timings = {}
+                start = time.perf_counter()
+                page = doc.load_page(page_num)
+                color_mode = "rgb"
+                watermark_box = self._watermark_box(page)
+                if self.color_reducer is not None:
+                    # 叠加水印前探测页面本身是否为黑白
+                    color_mode = self.color_reducer.choose_mode(page, exclude=watermark_box)
+                clip = crop = None
+                if self.cropper is not None:
+                    # 叠加水印前按内容范围计算裁剪区域，水印区域始终保留（水印PDF已含水印时同样适用）
+                    crop = self.cropper.crop_box(page, protect=watermark_box)
+                    if crop is not None:
+                        clip = self.cropper.clip_rect(page, crop)
+                        watermark_box = self.cropper.relative_box(watermark_box, crop)
+                if watermark:
+                    watermark_start = time.perf_counter()
+                    self._overlay_watermark(page, templates)
+                    timings["watermark"] = time.perf_counter() - watermark_start
+                if self.color_reducer is not None:
+                    pix = page.get_pixmap(matrix=fitz.Matrix(RENDER_DPI/72, RENDER_DPI/72),
+                                          colorspace=self.color_reducer.colorspace(color_mode), clip=clip)
+                    image = self.color_reducer.apply(pix, color_mode, protect=watermark_box)
+                else:
+                    pix = page.get_pixmap(matrix=fitz.Matrix(RENDER_DPI/72, RENDER_DPI/72), clip=clip)
+                    image = pix
+                encode_start = time.perf_counter()
+                # 渲染包含打开页面和色彩探测，不含水印叠加
+                timings["render"] = encode_start - start - timings.get("watermark", 0.0)
+                encoded = self.encoder.encode(image)
+                timings["encode"] = time.perf_counter() - encode_start
+                stats = {"bytes": encoded.size, "bytes_saved": encoded.bytes_saved,
+                         "quality": encoded.quality, "scale": encoded.scale, "color_mode": color_mode,
+                         "crop": crop, "image_format": encoded.image_format, "timings": timings}
+                if output_folder is None:
+                    yield page_num, encoded, stats
+                    continue
+                write_start = time.perf_counter()
+                image_path = os.path.join(output_folder, f"{pdf_name}_page_{page_num+1}.{encoded.extension}")
+                _replace_file(image_path, encoded.data)
+                timings["write"] = time.perf_counter() - write_start
+                yield page_num, image_path, stats
+        finally:
+            for template_doc in templates.values():
+                template_doc.close()
+
+    def _log_encoding_report(self, pdf_name):
+        """输出单个PDF的编码统计"""
+        report = self.encoding_report.get(pdf_name)
+        if not report:
+            return
+        total = sum(stats["bytes"] for stats in report.values())
+        saved = sum(stats["bytes_saved"] for stats in report.values())
+        logger.info(f"{pdf_name} 编码{len(report)}页，共{total}字节，"
+                    f"比{'无损PNG' if self.encoder.image_format == 'png' else '未压缩像素'}节省{saved}字节"
+                    f"（{self.encoder.image_format}）")
@@ -0,0 +1,304 @@
+import itertools
+import logging
+import queue
+import threading
+from draft_sharding import DRAFT_ORDERS, MAX_ARTICLES_PER_DRAFT, order_documents, shard_articles, submit_shards
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_STOP = object()
+
+
+class UploadPipeline:
+    """渲染→上传流水线：渲染好的页面进入有界队列，上传线程边渲染边消费
+
+    传入manifest（JobManifest）时记录每页的渲染和上传进度，
+    已渲染、已上传的页面和已进入草稿的PDF在续传时直接跳过。
+    in_memory为True时页面编码后直接以字节上传，不创建临时图片文件夹，
+    内存占用由队列深度决定。
+    传入stitcher（PageStitcher）时连续页面先拼接成长图再上传，文章按长图组装。
+    被PDFProcessor的page_filter过滤的页面不上传，也不出现在文章中。
+    每页的上传耗时按PDF记录到metrics。
+    文章数超过max_articles时按draft_order排序后分成多个草稿并发提交，单个草稿失败不影响其他草稿。
+    多公众号模式下草稿只在部分账号提交成功时，清单记录已成功的账号，续传只向其余账号提交。
+    传入scheduler（DocumentScheduler）时多个PDF按内存预算同时渲染，小文档优先，
+    每个PDF渲染完成后整体进入上传队列；不传时逐个PDF边渲染边上传。
+    """
+
+    def __init__(self, pdf_processor, wechat_uploader, upload_workers=4, queue_size=16, manifest=None,
+                 in_memory=False, stitcher=None, metrics=None, max_articles=MAX_ARTICLES_PER_DRAFT,
+                 draft_order="input", scheduler=None):
+        self.pdf_processor = pdf_processor
+        self.wechat_uploader = wechat_uploader
+        self.upload_workers = max(1, int(upload_workers))
+        # 队列深度决定渲染最多领先上传多少页
+        self.queue_size = max(1, int(queue_size))
+        self.manifest = manifest
+        self.in_memory = in_memory
+        self.stitcher = stitcher
+        self.metrics = metrics or Metrics()
+        self.scheduler = scheduler
+        # 在渲染和上传之前校验草稿分片参数，避免全部上传完才报错
+        if draft_order not in DRAFT_ORDERS:
+            raise ValueError(f"不支持的草稿排序方式：{draft_order}，可选：{', '.join(DRAFT_ORDERS)}")
+        if max_articles < 1:
+            raise ValueError("单个草稿的文章数上限必须大于0")
+        self.max_articles = max_articles
+        self.draft_order = draft_order
+        self.output_folders = []
+        self.failed = {}
+        self.shards = []
+
+    def run(self, pdf_paths, titles, cover_image_path, watermarked_pdfs=None):
+        """处理所有PDF并创建草稿，返回提交成功的草稿media_id列表；单个PDF或草稿分片失败时跳过"""
+        if not pdf_paths or len(pdf_paths) != len(titles):
+            raise ValueError("PDF路劲和标题数量必须匹配")
+        watermarked_pdfs = watermarked_pdfs or [None] * len(pdf_paths)
+
+        self.output_folders = []
+        self.failed = {}
+        self.shards = []
+        page_urls = {index: {} for index in range(len(pdf_paths))}
+        page_counts = {}
+        drafted = set()
+        drafted_accounts = {}
+        lock = threading.Lock()
+        pages = queue.Queue(maxsize=self.queue_size)
+
+        def upload_worker():
+            while True:
+                item = pages.get()
+                try:
+                    if item is _STOP:
+                        return
+                    doc_index, page_nums, image, filename = item
+                    if doc_index in self.failed:
+                        continue
+                    pdf_name = self.pdf_processor.file_manager.output_name(pdf_paths[doc_index])
+                    with self.metrics.span("upload", document=pdf_name, page=page_nums[0]):
+                        url = self.wechat_uploader.upload_page(image, filename=filename)
+                    # 长图的url记在首页，其余页面记为None
+                    with lock:
+                        page_urls[doc_index][page_nums[0]] = url
+                        page_urls[doc_index].update(dict.fromkeys(page_nums[1:]))
+                    if self.manifest is not None:
+                        self.manifest.mark_uploaded(pdf_paths[doc_index], page_nums[0], url, covered=page_nums[1:])
+                except Exception as e:
+                    logger.error(f"上传图片失败：{item[3] or item[2]}, 错误：{e}")
+                    with lock:
+                        self.failed.setdefault(item[0], e)
+                finally:
+                    pages.task_done()
+
+        def enqueue(doc_index, pdf_path, rendered, watermarked_pdf):
+            """把一个PDF的渲染结果按上传单元放入队列，队列满时阻塞渲染"""
+            for page_nums, image, filename in self._upload_units(pdf_path, rendered):
+                if doc_index in self.failed:
+                    break
+                if image is None:
+                    # 被过滤的空白页和重复页不上传，与长图覆盖的页面一样记为None
+                    with lock:
+                        page_urls[doc_index].update(dict.fromkeys(page_nums))
+                    if self.manifest is not None:
+                        self.manifest.mark_uploaded(pdf_path, page_nums[0], None, covered=page_nums[1:])
+                    continue
+                pages.put((doc_index, page_nums, image, filename))
+            if watermarked_pdf and self.manifest is not None:
+                self.manifest.mark_watermarked(pdf_path, watermarked_pdf)
+
+        workers = [threading.Thread(target=upload_worker, daemon=True) for _ in range(self.upload_workers)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            # 上传统一封面图片
+            cover_media_id = self.wechat_uploader.upload_image(cover_image_path)
+
+            # 生产者：渲染页面并放入队列
+            jobs = []
+            for doc_index, (pdf_path, watermarked_pdf) in enumerate(zip(pdf_paths, watermarked_pdfs)):
+                try:
+                    logger.info(f"处理PDF文件：{pdf_path}")
+                    skip_pages = set()
+                    pending = []
+                    if self.manifest is not None:
+                        skip_pages, pending, watermarked_pdf = self._resume_document(
+                            doc_index, pdf_path, watermarked_pdf, page_urls, page_counts, drafted, drafted_accounts)
+                        if doc_index in drafted:
+                            continue
+                    if self.scheduler is not None:
+                        jobs.append((doc_index, pdf_path, watermarked_pdf, skip_pages, pending))
+                        continue
+                    rendered = itertools.chain(pending, self._render_pages(pdf_path, watermarked_pdf, skip_pages))
+                    enqueue(doc_index, pdf_path, rendered, watermarked_pdf)
+                except Exception as e:
+                    logger.error(f"处理PDF文件失败：{pdf_path}, 错误：{e}")
+                    with lock:
+                        self.failed.setdefault(doc_index, e)
+
+            if jobs:
+                # 多个PDF同时渲染，按完成顺序整体进入上传队列
+                resumed = {doc_index: (watermarked_pdf, pending)
+                           for doc_index, _, watermarked_pdf, _, pending in jobs}
+                documents = self.pdf_processor.iter_documents(
+                    [job[:4] for job in jobs], self.scheduler, in_memory=self.in_memory)
+                for doc_index, rendered, error in documents:
+                    pdf_path = pdf_paths[doc_index]
+                    try:
+                        if error is not None:
+                            raise error
+                        watermarked_pdf, pending = resumed[doc_index]
+                        rendered = sorted(itertools.chain(pending, self._rendered_pages(pdf_path, rendered)),
+                                          key=lambda item: item[0])
+                        enqueue(doc_index, pdf_path, rendered, watermarked_pdf)
+                    except Exception as e:
+                        logger.error(f"处理PDF文件失败：{pdf_path}, 错误：{e}")
+                        with lock:
+                            self.failed.setdefault(doc_index, e)
+        finally:
+            for _ in workers:
+                pages.put(_STOP)
+            for worker in workers:
+                worker.join()
+
+        # 按页码顺序组装图文消息，再按草稿排序方式分片
+        articles = {}
+        for doc_index in order_documents(pdf_paths, self.draft_order):
+            if doc_index in self.failed or doc_index in drafted or not page_urls[doc_index]:
+                continue
+            if doc_index in page_counts and len(page_urls[doc_index]) < page_counts[doc_index]:
+                logger.error(f"PDF页面未全部上传，跳过：{pdf_paths[doc_index]}")
+                continue
+            urls = [page_urls[doc_index][page_num] for page_num in sorted(page_urls[doc_index])
+                    if page_urls[doc_index][page_num] is not None]
+            if not urls:
+                logger.warning(f"PDF的所有页面都被过滤，跳过：{pdf_paths[doc_index]}")
+                continue
+            article = self.wechat_uploader.build_article(titles[doc_index], cover_media_id, urls)
+            if doc_index in drafted_accounts:
+                # 上次已在这些公众号创建了草稿，只向其余账号提交
+                article = {name: value for name, value in article.items() if name not in drafted_accounts[doc_index]}
+            articles[doc_index] = article
+
+        if not articles:
+            if drafted and len(drafted) == len(pdf_paths):
+                logger.info("所有PDF均已创建过草稿，无需续传")
+                return None
+            raise ValueError("没有成功处理PDF文件, 无法创建图文消息")
+        # 同一草稿中的文章提交到相同的公众号，按已提交的账号分组后再分片
+        groups = {}
+        for doc_index, article in articles.items():
+            groups.setdefault(frozenset(drafted_accounts.get(doc_index, ())), []).append((doc_index, article))
+        self.shards = []
+        for entries in groups.values():
+            for shard in shard_articles(entries, self.max_articles):
+                shard.index = len(self.shards)
+                self.shards.append(shard)
+        if len(self.shards) > 1:
+            logger.info(f"{len(articles)}篇文章超过单个草稿上限{self.max_articles}篇，分为{len(self.shards)}个草稿提交")
+        submit_shards(self.wechat_uploader, self.shards, workers=self.upload_workers)
+
+        for shard in self.shards:
+            if shard.ok:
+                if self.manifest is not None:
+                    self.manifest.mark_drafted([pdf_paths[doc_index] for doc_index in shard.doc_indexes],
+                                               shard.media_id)
+                continue
+            # FanoutDraftError：草稿已在部分公众号创建，记入清单以免续传时重复提交
+            partial = getattr(shard.error, "media_ids", None)
+            if self.manifest is not None and partial:
+                self.manifest.mark_accounts_drafted([pdf_paths[doc_index] for doc_index in shard.doc_indexes], partial)
+            for doc_index in shard.doc_indexes:
+                self.failed.setdefault(doc_index, shard.error)
+        media_ids = [shard.media_id for shard in self.shards if shard.ok]
+        if not media_ids:
+            raise self.shards[0].error
+        return media_ids
+
+    def _render_pages(self, pdf_path, watermarked_pdf, skip_pages):
+        """逐页渲染，产出(page_num, 图片路径或编码字节)"""
+        if self.in_memory:
+            for page_num, encoded in self.pdf_processor.iter_encoded_pages(
+                    pdf_path, watermarked_pdf=watermarked_pdf, skip_pages=skip_pages):
+                yield page_num, encoded.data if encoded is not None else None
+            return
+        self.output_folders.append(self.pdf_processor.file_manager.create_output_folder(pdf_path))
+        for page_num, image_path in self.pdf_processor.iter_watermarked_pages(
+                pdf_path, watermarked_pdf=watermarked_pdf, skip_pages=skip_pages):
+            if self.manifest is not None and image_path is not None:
+                self.manifest.mark_rendered(pdf_path, page_num, image_path)
+            yield page_num, image_path
+
+    def _rendered_pages(self, pdf_path, rendered):
+        """整理iter_documents产出的一个PDF的页面，与_render_pages的产出一致"""
+        if not self.in_memory:
+            self.output_folders.append(self.pdf_processor.file_manager.get_output_folder(pdf_path))
+        for page_num, image in rendered:
+            if self.in_memory:
+                yield page_num, image.data if image is not None else None
+                continue
+            if self.manifest is not None and image is not None:
+                self.manifest.mark_rendered(pdf_path, page_num, image)
+            yield page_num, image
+
+    def _upload_units(self, pdf_path, rendered):
+        """把渲染结果组织成上传单元(页码元组, 图片, 文件名)，设置了stitcher时按长图拼接
+
+        被过滤的页面产出(页码元组, None, None)。
+        """
+        if self.stitcher is None:
+            for page_num, image in rendered:
+                filename = None
+                if isinstance(image, bytes):
+                    filename = self.pdf_processor.page_image_name(pdf_path, page_num)
+                yield (page_num,), image, filename
+            return
+        skipped = []
+
+        def kept_pages():
+            for page_num, image in rendered:
+                if image is None:
+                    skipped.append(page_num)
+                else:
+                    yield page_num, image
+
+        for strip in self.stitcher.stitch(kept_pages()):
+            while skipped:
+                yield (skipped.pop(0),), None, None
+            filename = self.pdf_processor.page_image_name(pdf_path, strip.page_nums[0], strip.extension)
+            yield strip.page_nums, strip.data, filename
+        while skipped:
+            yield (skipped.pop(0),), None, None
+
+    def _resume_document(self, doc_index, pdf_path, watermarked_pdf, page_urls, page_counts, drafted,
+                         drafted_accounts):
+        """按清单恢复单个PDF的进度，多公众号模式下已提交过草稿的账号记入drafted_accounts
+
+        返回(无需再渲染的页码, 已渲染但未上传的[(page_num, 图片路径)], 仍需生成的水印PDF路径)
+        """
+        entry = self.manifest.document(pdf_path)
+        if entry["drafted"]:
+            logger.info(f"已在草稿{entry['drafted']}中，跳过：{pdf_path}")
+            drafted.add(doc_index)
+            return set(), [], watermarked_pdf
+        if entry["page_count"] is None:
+            entry["page_count"] = self.pdf_processor.page_count(pdf_path)
+            self.manifest.set_page_count(pdf_path, entry["page_count"])
+        page_counts[doc_index] = entry["page_count"]
+        if entry.get("draft_accounts"):
+            logger.info(f"已在公众号{', '.join(entry['draft_accounts'])}的草稿中，只向其余账号提交：{pdf_path}")
+            drafted_accounts[doc_index] = set(entry["draft_accounts"])
+
+        uploaded = self.manifest.uploaded_pages(pdf_path)
+        rendered = self.manifest.rendered_pages(pdf_path)
+        page_urls[doc_index].update(uploaded)
+        # 已渲染但未上传的页面先于新渲染的页面进入上传队列
+        pending = [(page_num, rendered[page_num]) for page_num in sorted(set(rendered) - set(uploaded))]
+        skip_pages = set(uploaded) | set(rendered)
+        if skip_pages:
+            logger.info(f"续传：{pdf_path} 已渲染{len(rendered)}页，已上传{len(uploaded)}页")
+        if watermarked_pdf and entry["watermarked_pdf"] == watermarked_pdf:
+            watermarked_pdf = None
+        return skip_pages, pending, watermarked_pdf
@@ -0,0 +1,83 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 300 DPI文字页面编码后每像素的大致字节数，用于不渲染时估算上传量
+ESTIMATED_BYTES_PER_PIXEL = {
+    "png": 0.10,
+    "png-optimized": 0.09,
+    "jpeg": 0.22,
+    "webp": 0.12,
+}
+
+
+def plan_documents(pdf_paths, image_format="png", max_bytes=None, stitch_max_height=0):
+    """只读取页面尺寸、不渲染，估算每个PDF的页数、上传次数和上传字节数
+
+    返回[{"path", "pages", "uploads", "estimated_bytes", "error"}]，无法打开的PDF记录error。
+    """
+    import fitz
+    from pdf_processor import RENDER_DPI
+    zoom = RENDER_DPI / 72
+    bytes_per_pixel = ESTIMATED_BYTES_PER_PIXEL[image_format]
+    plans = []
+    for pdf_path in pdf_paths:
+        plan = {"path": pdf_path, "pages": 0, "uploads": 0, "estimated_bytes": 0, "error": None}
+        try:
+            with fitz.open(pdf_path) as doc:
+                pages = []
+                for page in doc:
+                    width, height = page.rect.width * zoom, page.rect.height * zoom
+                    size = width * height * bytes_per_pixel
+                    pages.append((width, height, min(size, max_bytes) if max_bytes else size))
+        except Exception as e:
+            logger.error(f"无法读取PDF：{pdf_path}, 错误：{e}")
+            plan["error"] = str(e)
+            plans.append(plan)
+            continue
+        plan["pages"] = len(pages)
+        plan["estimated_bytes"] = int(sum(size for _, _, size in pages))
+        plan["uploads"] = _count_strips(pages, stitch_max_height, max_bytes) if stitch_max_height else len(pages)
+        plans.append(plan)
+    return plans
+
+
+def _count_strips(pages, max_height, max_bytes):
+    """按PageStitcher的Next-Fit规则估算拼接后的长图数量"""
+    strips = 0
+    width = height = size = 0
+    for page_width, page_height, page_size in pages:
+        if strips:
+            scaled_height = page_height * width / page_width
+            if height + scaled_height <= max_height and (not max_bytes or size + page_size <= max_bytes):
+                height += scaled_height
+                size += page_size
+                continue
+        strips += 1
+        width, height, size = page_width, page_height, page_size
+    return strips
+
+
+def format_plan(plans):
+    """把计划格式化为表格文本"""
+    lines = [f"{'PDF':<40} {'页数':>6} {'上传次数':>8} {'预计上传量':>12}"]
+    for plan in plans:
+        name = os.path.basename(plan["path"])
+        if plan["error"]:
+            lines.append(f"{name:<40} 无法读取：{plan['error']}")
+            continue
+        lines.append(f"{name:<40} {plan['pages']:>6} {plan['uploads']:>8} {_format_bytes(plan['estimated_bytes']):>12}")
+    total_pages = sum(plan["pages"] for plan in plans)
+    total_uploads = sum(plan["uploads"] for plan in plans)
+    total_bytes = sum(plan["estimated_bytes"] for plan in plans)
+    lines.append(f"{'合计':<40} {total_pages:>6} {total_uploads:>8} {_format_bytes(total_bytes):>12}")
+    return "\n".join(lines)
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本，键的组成或文件布局变化时递增，旧记录自然失效
+CACHE_VERSION = 1
+
+
+class RenderCache:
+    """按源文件内容和渲染设置缓存编码后的页面图片，只改标题、封面或公众号时重复运行不必重新渲染
+
+    图片保存在cache_dir/<键前两位>/<键>.<扩展名>，索引（大小、编码统计、最近使用时间）保存在
+    cache_dir/index.sqlite3中。键由源PDF内容SHA-256、页码和渲染设置（分辨率、水印、编码、
+    色彩缩减、裁剪等）共同决定，任一项变化都会重新渲染。
+    总大小超过max_bytes时按最近使用时间淘汰（LRU）。
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "key TEXT PRIMARY KEY, extension TEXT NOT NULL, size INTEGER NOT NULL, stats TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+            self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    @staticmethod
+    def source_digest(pdf_path):
+        """源PDF文件内容的SHA-256"""
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def page_key(source_digest, page_num, settings):
+        """由源文件哈希、页码和渲染设置（可JSON序列化的字典）计算缓存键"""
+        payload = json.dumps([CACHE_VERSION, source_digest, page_num, settings], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key, extension):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{extension}")
+
+    def get(self, key):
+        """查询缓存，命中时更新最近使用时间并返回(图片路径, 编码统计)，未命中返回None"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT extension, stats FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = self.path(key, row[0])
+            if not os.path.exists(path):
+                # 图片被手动删除，索引同步失效
+                self._forget(key)
+                return None
+            self._conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        return path, json.loads(row[1])
+
+    def put(self, key, image, extension, stats):
+        """写入一页图片，image为编码后的字节或已写好的图片路径；超出容量时淘汰最久未使用的页面"""
+        path = self.path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 写临时文件后原子替换，读到的图片总是完整的
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(image, bytes):
+                    f.write(image)
+                else:
+                    with open(image, "rb") as source:
+                        shutil.copyfileobj(source, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock, self._conn:
+            self._forget(key)
+            self._conn.execute("INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, extension, size, json.dumps(stats), now, now))
+            self._total += size
+        if self.max_bytes and self._total > self.max_bytes:
+            self.prune()
+
+    def _forget(self, key):
+        """删除一条索引及其图片，调用方需持有_lock"""
+        row = self._conn.execute("SELECT extension, size FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return 0
+        self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+        self._total -= row[1]
+        try:
+            os.remove(self.path(key, row[0]))
+        except FileNotFoundError:
+            pass
+        return row[1]
+
+    def prune(self, max_bytes=None):
+        """按最近使用时间淘汰页面直到总大小不超过max_bytes（默认为容量上限），返回(删除页数, 释放字节数)"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = freed = 0
+        with self._lock, self._conn:
+            # 其他进程也可能写入同一缓存，以索引中的实际总量为准
+            self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if max_bytes is None or self._total <= max_bytes:
+                return removed, freed
+            for key, in self._conn.execute("SELECT key FROM pages ORDER BY last_used").fetchall():
+                if self._total <= max_bytes:
+                    break
+                freed += self._forget(key)
+                removed += 1
+        if removed:
+            logger.info(f"渲染缓存淘汰{removed}页，释放{freed}字节")
+        return removed, freed
+
+    def stats(self):
+        """返回缓存页数、总字节数、容量上限和缓存目录"""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes, "cache_dir": self.cache_dir}
+
+    def close(self):
+        """关闭索引数据库连接"""
+        with self._lock:
+            self._conn.close()
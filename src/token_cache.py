@@ -0,0 +1,126 @@
+import json
+import os
+from contextlib import nullcontext
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """基于文件的跨进程排他锁，POSIX使用fcntl，Windows使用msvcrt"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class AccessTokenCache:
+    """按AppID持久化Access Token的磁盘缓存，多个进程通过文件锁共享同一个token
+
+    缓存记录token和过期时间，距过期不足refresh_margin秒时视为需要刷新，
+    刷新在文件锁内完成，避免并发运行互相使对方的token失效。
+    cache_dir为None时只缓存在进程内存中，不创建任何文件（只读环境）。
+    """
+
+    def __init__(self, cache_dir, appid, refresh_margin=300):
+        self.path = None
+        self.lock_path = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.path = os.path.join(cache_dir, f"access_token_{appid}.json")
+            self.lock_path = self.path + ".lock"
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def get(self, fetch, force_refresh=False, stale_token=None):
+        """返回(access_token, expires_at)
+
+        fetch()返回(access_token, expires_in)，仅在缓存缺失、即将过期或强制刷新时调用。
+        强制刷新时若缓存中的token已不是stale_token，说明其他进程已刷新，直接复用。
+        """
+        entry = self._read()
+        if not force_refresh and self._is_fresh(entry):
+            return entry["access_token"], entry["expires_at"]
+
+        with self._lock, self._file_lock():
+            entry = self._read()
+            if self._is_fresh(entry) and (not force_refresh or entry["access_token"] != stale_token):
+                return entry["access_token"], entry["expires_at"]
+            access_token, expires_in = fetch()
+            entry = {"access_token": access_token, "expires_at": time.time() + int(expires_in)}
+            self._write(entry)
+            return entry["access_token"], entry["expires_at"]
+
+    def clear(self):
+        """删除缓存文件"""
+        with self._lock, self._file_lock():
+            self._entry = None
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _file_lock(self):
+        return FileLock(self.lock_path) if self.lock_path is not None else nullcontext()
+
+    def _is_fresh(self, entry):
+        return bool(entry) and entry["expires_at"] - self.refresh_margin > time.time()
+
+    def _read(self):
+        if self.path is None:
+            return self._entry
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if "access_token" in entry and "expires_at" in entry:
+                return entry
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _write(self, entry):
+        if self.path is None:
+            self._entry = entry
+            return
+        # 写临时文件后原子替换，读取方不会看到写了一半的内容
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            if fcntl is not None:
+                os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
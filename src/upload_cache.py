@@ -0,0 +1,110 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class UploadCache:
+    """以图片内容SHA-256为键的上传结果缓存，保存在SQLite文件中
+
+    按(namespace, kind, digest)记录微信返回的media_id或url，namespace一般为AppID。
+    超过ttl未使用的记录被淘汰，记录数超过max_entries时按最近使用时间淘汰；
+    上次校验距今超过verify_after的记录在复用前需要重新校验是否仍然有效。
+    db_path为":memory:"时只缓存在进程内存中，不创建任何文件（只读环境）。
+    """
+
+    def __init__(self, db_path, ttl=30 * 86400, max_entries=100000, verify_after=7 * 86400):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.verify_after = verify_after
+        self._lock = threading.Lock()
+        # 多个上传线程共用一个连接，由_lock串行化；多进程之间依赖SQLite自身的文件锁
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "namespace TEXT NOT NULL, kind TEXT NOT NULL, digest TEXT NOT NULL, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL, "
+                "verified_at REAL NOT NULL, PRIMARY KEY (namespace, kind, digest))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_last_used ON uploads (last_used)")
+        self.prune()
+
+    @staticmethod
+    def digest(data):
+        """计算图片内容的SHA-256"""
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, namespace, kind, digest):
+        """查询缓存，命中时更新最近使用时间并返回记录字典，过期或未命中返回None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, size, created_at, verified_at, last_used FROM uploads "
+                "WHERE namespace = ? AND kind = ? AND digest = ?",
+                (namespace, kind, digest)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[4] > self.ttl:
+                self._conn.execute("DELETE FROM uploads WHERE namespace = ? AND kind = ? AND digest = ?",
+                                   (namespace, kind, digest))
+                return None
+            self._conn.execute("UPDATE uploads SET last_used = ? WHERE namespace = ? AND kind = ? AND digest = ?",
+                               (now, namespace, kind, digest))
+        return {"value": row[0], "size": row[1], "created_at": row[2], "verified_at": row[3]}
+
+    def put(self, namespace, kind, digest, value, size):
+        """记录上传结果"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, kind, digest, value, size, now, now, now)
+            )
+
+    def delete(self, namespace, kind, digest):
+        """删除失效记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM uploads WHERE namespace = ? AND kind = ? AND digest = ?",
+                               (namespace, kind, digest))
+
+    def needs_verification(self, entry):
+        """记录上次校验距今是否超过verify_after"""
+        return self.verify_after is not None and time.time() - entry["verified_at"] > self.verify_after
+
+    def mark_verified(self, namespace, kind, digest):
+        """记录校验通过的时间"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE uploads SET verified_at = ? WHERE namespace = ? AND kind = ? AND digest = ?",
+                               (time.time(), namespace, kind, digest))
+
+    def prune(self):
+        """按TTL和最大记录数淘汰缓存，返回删除的记录数"""
+        with self._lock, self._conn:
+            removed = 0
+            if self.ttl:
+                removed += self._conn.execute("DELETE FROM uploads WHERE last_used < ?",
+                                              (time.time() - self.ttl,)).rowcount
+            if self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM uploads WHERE rowid IN ("
+                    "SELECT rowid FROM uploads ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        return removed
+
+    def stats(self):
+        """返回缓存记录数和记录的图片总字节数"""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads").fetchone()
+        return {"entries": count, "bytes": total}
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
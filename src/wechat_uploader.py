@@ -1,69 +1,383 @@
 import os
 import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 from dotenv import load_dotenv
 import json
+from draft_sharding import MAX_ARTICLES_PER_DRAFT, PartialDraftError, shard_articles, submit_shards
+from token_cache import AccessTokenCache
+from upload_cache import UploadCache
+from metrics import Metrics, endpoint_name
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', encoding='utf-8')
 logger = logging.getLogger(__name__)
 
 
+# 微信接口地址，可通过WECHAT_API_BASE指向本地模拟服务
+DEFAULT_API_BASE = "https://api.weixin.qq.com"
+
+# 请求超时（连接超时, 读取超时），单位秒
+DEFAULT_TIMEOUT = (5, 60)
+# 可重试的服务端状态码
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+# Access Token失效错误码：40001 token无效，40014 token不合法，42001 token过期
+TOKEN_EXPIRED_ERRCODES = {40001, 40014, 42001}
+
+# 渲染输出的页面图片扩展名
+PAGE_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# 上传缓存中的记录类型：永久素材media_id / 图文内图片url
+UPLOAD_KIND_MATERIAL = "material"
+UPLOAD_KIND_TEMP = "uploadimg"
+
+# 素材不存在错误码：40007 不合法的media_id
+MEDIA_NOT_FOUND_ERRCODES = {40007}
+
+# 接口频率/配额限制错误码：45009 日调用量超限，45011 分钟调用量超限，-1 系统繁忙
+RATE_LIMIT_ERRCODES = {45009, 45011, -1}
+
+
+class WeChatAPIError(ValueError):
+    """微信接口返回errcode时抛出，保留errcode便于区分限流等错误"""
+
+    def __init__(self, message, errcode=None):
+        super().__init__(message)
+        self.errcode = errcode
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器，多个上传线程共享
+
+    rate为每秒补充的令牌数，capacity为允许的突发请求数。
+    遇到限流错误时throttle()按比例降低速率，成功后recover()逐步恢复到初始速率。
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.1):
+        if rate <= 0:
+            raise ValueError("令牌桶速率必须大于0")
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, factor=0.5):
+        """收到限流错误码时降低速率并清空令牌"""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * factor)
+            self._tokens = 0
+
+    def recover(self, step=None):
+        """请求成功后线性恢复速率，不超过初始速率"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + (step or self.max_rate / 10))
+
+
+def _read_image(image, filename=None):
+    """读取图片，image可以是文件路径或内存中的图片字节，返回(filename, data)"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        data = bytes(image)
+        if filename is None:
+            # 按文件头推断扩展名，微信据此识别图片类型
+            extension = "jpg" if data[:3] == b"\xff\xd8\xff" else "webp" if data[8:12] == b"WEBP" else "png"
+            filename = f"image.{extension}"
+        return filename, data
+    with open(image, "rb") as image_file:
+        return filename or os.path.basename(image), image_file.read()
+
+
+def _page_number(image_file):
+    """从<name>_page_N.png中取出页码N，用于按页面顺序排序"""
+    stem = os.path.splitext(image_file)[0]
+    number = stem.rsplit("_page_", 1)[-1]
+    return (0, int(number), image_file) if number.isdigit() else (1, 0, image_file)
+
+
 class WeChatUploader:
-    def __init__(self, file_manager):
+    def __init__(self, file_manager, upload_concurrency=4, upload_rate=2.0, upload_burst=None,
+                 rate_limit_retries=5, backoff_base=1.0, backoff_max=60.0,
+                 request_timeout=DEFAULT_TIMEOUT, http_retries=3, http_backoff=0.5,
+                 token_cache_dir=None, token_refresh_margin=300,
+                 upload_cache_path=None, upload_cache_ttl=30 * 86400, upload_cache_verify_after=7 * 86400,
+                 metrics=None, api_base=None, appid=None, appsecret=None, in_memory=False):
         self.file_manager = file_manager
+        # 接口延迟、重试、错误和上传字节统计
+        self.metrics = metrics or Metrics()
+        # 并发上传线程数，以及所有线程共享的令牌桶限流器
+        self.upload_concurrency = max(1, int(upload_concurrency))
+        self.rate_limiter = TokenBucket(upload_rate, capacity=upload_burst)
+        self.rate_limit_retries = rate_limit_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 共享的HTTP会话：连接池大小覆盖所有上传线程，保持长连接复用TCP+TLS
+        self.request_timeout = request_timeout
+        self.http_retries = http_retries
+        self.http_backoff = http_backoff
+        self.session = self._create_session(self.upload_concurrency + 2)
+        self._http_stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._http_stats_lock = threading.Lock()
         load_dotenv()
-        self.appid = os.getenv("WECHAT_APPID")
-        self.appsecret = os.getenv("WECHAT_APPSECRET")
+        # 未显式传入时使用.env中的单个公众号凭据
+        self.appid = appid or os.getenv("WECHAT_APPID")
+        self.appsecret = appsecret or os.getenv("WECHAT_APPSECRET")
         if not self.appid or not self.appsecret:
             raise ValueError("微信公众号的AppID或AppSecret未在.env文件中配置")
-        self.access_token = self._get_access_token()
+        self.api_base = (api_base or os.getenv("WECHAT_API_BASE") or DEFAULT_API_BASE).rstrip("/")
+        # Access Token磁盘缓存，多进程共享，过期前token_refresh_margin秒主动刷新；
+        # in_memory时未显式指定目录的token缓存和上传缓存只保存在进程内存中，不写任何文件
+        cache_dir = token_cache_dir or (None if in_memory else self.file_manager.output_base_path)
+        self.token_cache = AccessTokenCache(cache_dir, self.appid, refresh_margin=token_refresh_margin)
+        self._access_token = None
+        self._token_refresh_at = 0
+        self._token_lock = threading.Lock()
+        # 不在构造时登录，首次调用接口时才获取token
+        # 按图片内容SHA-256缓存上传结果，相同内容的封面和页面不再重复上传
+        self.upload_cache = UploadCache(
+            upload_cache_path or (os.path.join(cache_dir, "upload_cache.sqlite3") if cache_dir else ":memory:"),
+            ttl=upload_cache_ttl, verify_after=upload_cache_verify_after
+        )
+
+    @property
+    def access_token(self):
+        """当前有效的Access Token，临近过期时主动刷新"""
+        if self._access_token is None or time.time() >= self._token_refresh_at:
+            return self._get_access_token()
+        return self._access_token
+
+    def _create_session(self, pool_size):
+        """创建带连接池的HTTP会话，重试由_request统一处理"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _count(self, key):
+        with self._http_stats_lock:
+            self._http_stats[key] += 1
+
+    def _request(self, method, url, idempotent=True, **kwargs):
+        """通过共享会话发送请求，强制超时，失败时按指数退避加抖动重试
+
+        幂等请求在连接错误、超时和5xx时重试；非幂等请求（新增素材、草稿）
+        只在连接建立超时时重试，避免重复创建。
+        """
+        kwargs.setdefault("timeout", self.request_timeout)
+        endpoint = endpoint_name(url)
+        for attempt in range(self.http_retries + 1):
+            self._count("requests")
+            last_attempt = attempt == self.http_retries
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                if last_attempt:
+                    self._count("failures")
+                    self.metrics.count("http_errors", endpoint=endpoint)
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not idempotent or last_attempt:
+                    self._count("failures")
+                    self.metrics.count("http_errors", endpoint=endpoint)
+                    raise
+            else:
+                self.metrics.observe_api(url, time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUS_CODES or not idempotent or last_attempt:
+                    if response.status_code >= 400:
+                        self.metrics.count("http_errors", endpoint=endpoint)
+                    return response
+            self._count("retries")
+            self.metrics.count("http_retries", endpoint=endpoint)
+            delay = self.http_backoff * 2 ** attempt + random.uniform(0, self.http_backoff)
+            logger.warning(f"请求失败，{delay:.1f}秒后第{attempt + 1}次重试：{url.split('?')[0]}")
+            time.sleep(delay)
+
+    def http_stats(self):
+        """返回HTTP请求、重试与连接复用统计"""
+        with self._http_stats_lock:
+            stats = dict(self._http_stats)
+        connections = 0
+        pooled_requests = 0
+        for adapter in set(self.session.adapters.values()):
+            for pool_key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(pool_key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    pooled_requests += pool.num_requests
+        stats["connections_opened"] = connections
+        stats["connection_reuse_rate"] = 1 - connections / pooled_requests if pooled_requests else 0.0
+        return stats
 
-    def _get_access_token(self):
-        """获取微信公众号的Access Token"""
-        url = "https://api.weixin.qq.com/cgi-bin/token"
+    def close(self):
+        """关闭HTTP会话及上传缓存"""
+        self.session.close()
+        self.upload_cache.close()
+
+    def _fetch_access_token(self):
+        """从微信接口获取新的Access Token，返回(access_token, expires_in)"""
+        url = f"{self.api_base}/cgi-bin/token"
         params = {
             "grant_type": "client_credential",
             "appid": self.appid,
             "secret": self.appsecret
         }
-        response = requests.get(url, params=params)
+        response = self._request("GET", url, params=params)
         response.raise_for_status()
         data = response.json()
         if "access_token" in data:
-            return data["access_token"]
-        raise ValueError(f"获取Access Token失败：{data.get('errmsg', '未知错误')}")
-
-    def upload_image(self, image_path):
-        """上传图片到永久-微信素材管理，返回media_id"""
-        url = f"https://api.weixin.qq.com/cgi-bin/material/add_material?access_token={self.access_token}&type=image"
-        with open(image_path, "rb") as image_file:
-            files = {"media": image_file}
-            response = requests.post(url, files=files)
+            return data["access_token"], data.get("expires_in", 7200)
+        raise WeChatAPIError(f"获取Access Token失败：{data.get('errmsg', '未知错误')}", data.get("errcode"))
+
+    def _get_access_token(self, force_refresh=False, stale_token=None):
+        """获取微信公众号的Access Token，优先使用磁盘缓存"""
+        with self._token_lock:
+            if force_refresh and stale_token is not None and self._access_token != stale_token:
+                # 其他线程已经刷新过
+                return self._access_token
+            access_token, expires_at = self.token_cache.get(self._fetch_access_token, force_refresh=force_refresh,
+                                                            stale_token=stale_token)
+            self._access_token = access_token
+            self._token_refresh_at = expires_at - self.token_cache.refresh_margin
+            return access_token
+
+    def _call_api(self, method, url, idempotent=True, params=None, **kwargs):
+        """调用需要access_token的接口并返回JSON，token失效时刷新后重放一次请求"""
+        for attempt in range(2):
+            access_token = self.access_token
+            response = self._request(method, url, idempotent=idempotent,
+                                     params={**(params or {}), "access_token": access_token}, **kwargs)
             response.raise_for_status()
             data = response.json()
-            if "media_id" in data:
-                return data["media_id"]
-            raise ValueError(f"图片上传失败：{data.get('errmsg', '未知错误')}")
-
-    def upload_temp_image(self, image_path):
-        """上传图片到临时-微信素材管理，返回url"""
-        url = f"https://api.weixin.qq.com/cgi-bin/media/uploadimg?access_token={self.access_token}"
-        with open(image_path, "rb") as image_file:
-            files = {"media": image_file}
-            response = requests.post(url, files=files)
+            if data.get("errcode"):
+                self.metrics.count("api_errors", endpoint=endpoint_name(url), errcode=data["errcode"])
+            if data.get("errcode") in TOKEN_EXPIRED_ERRCODES and attempt == 0:
+                logger.warning(f"Access Token失效(errcode={data['errcode']})，刷新后重试")
+                self._get_access_token(force_refresh=True, stale_token=access_token)
+                continue
+            return data
+
+    def _cached_upload(self, kind, digest):
+        """查询上传缓存，需要时校验记录是否仍有效，返回media_id/url或None"""
+        entry = self.upload_cache.get(self.appid, kind, digest)
+        if entry is None:
+            return None
+        if self.upload_cache.needs_verification(entry):
+            if not self._verify_upload(kind, entry["value"]):
+                logger.info(f"缓存的上传结果已失效，重新上传：{entry['value']}")
+                self.upload_cache.delete(self.appid, kind, digest)
+                return None
+            self.upload_cache.mark_verified(self.appid, kind, digest)
+        self.metrics.count("upload_cache_hits", kind=kind)
+        return entry["value"]
+
+    def _verify_upload(self, kind, value):
+        """校验缓存的media_id/url是否仍然可用
+
+        与其他请求一样经令牌桶限流、按_request的策略重试并计入metrics。
+        只有接口明确返回素材不存在或404时才判定失效，网络异常、5xx等无法确认的情况继续使用缓存。
+        """
+        self.rate_limiter.acquire()
+        try:
+            if kind == UPLOAD_KIND_MATERIAL:
+                data = self._call_api("POST", f"{self.api_base}/cgi-bin/material/get_material",
+                                      json={"media_id": value})
+                return data.get("errcode") not in MEDIA_NOT_FOUND_ERRCODES
+            response = self._request("HEAD", value, allow_redirects=True)
             response.raise_for_status()
-            data = response.json()
-            if "url" in data:
-                print(data)
-                return data["url"]
-            raise ValueError(f"图片上传失败：{data.get('errmsg', '未知错误')}")
+            return True
+        except requests.exceptions.JSONDecodeError:
+            # 图片素材直接返回文件内容，说明素材存在
+            return True
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return False
+            logger.warning(f"校验缓存的上传结果失败：{value}, 错误：{e}")
+            return True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # 网络异常时不能确认失效，继续使用缓存
+            logger.warning(f"校验缓存的上传结果失败：{value}, 错误：{e}")
+            return True
+
+    def upload_image(self, image, filename=None):
+        """上传图片到永久-微信素材管理，返回media_id；相同内容的图片直接返回缓存的media_id
+
+        image可以是图片路径或内存中的图片字节。
+        """
+        filename, image_data = _read_image(image, filename)
+        digest = UploadCache.digest(image_data)
+        media_id = self._cached_upload(UPLOAD_KIND_MATERIAL, digest)
+        if media_id is not None:
+            return media_id
+
+        url = f"{self.api_base}/cgi-bin/material/add_material"
+        files = {"media": (filename, image_data)}
+        data = self._call_api("POST", url, idempotent=False, params={"type": "image"}, files=files)
+        self.metrics.count("bytes_uploaded", len(image_data), kind=UPLOAD_KIND_MATERIAL)
+        if "media_id" in data:
+            self.upload_cache.put(self.appid, UPLOAD_KIND_MATERIAL, digest, data["media_id"], len(image_data))
+            return data["media_id"]
+        raise WeChatAPIError(f"图片上传失败：{data.get('errmsg', '未知错误')}", data.get("errcode"))
+
+    def upload_temp_image(self, image, filename=None):
+        """上传图片到临时-微信素材管理，返回url；相同内容的图片直接返回缓存的url
+
+        image可以是图片路径或内存中的图片字节。
+        """
+        filename, image_data = _read_image(image, filename)
+        digest = UploadCache.digest(image_data)
+        pic_url = self._cached_upload(UPLOAD_KIND_TEMP, digest)
+        if pic_url is not None:
+            return pic_url
+        return self._post_temp_image(filename, image_data, digest)
 
-    def create_article(self, pdf_paths, titles, cover_image_path="../resources/cover_image.jpg"):
-        """创建并发布图文消息"""
+    def _post_temp_image(self, filename, image_data, digest):
+        """调用uploadimg接口上传图片并写入上传缓存"""
+        url = f"{self.api_base}/cgi-bin/media/uploadimg"
+        files = {"media": (filename, image_data)}
+        # 临时图片上传重复提交只会多生成一个url，可以安全重试
+        data = self._call_api("POST", url, files=files)
+        self.metrics.count("bytes_uploaded", len(image_data), kind=UPLOAD_KIND_TEMP)
+        if "url" in data:
+            self.upload_cache.put(self.appid, UPLOAD_KIND_TEMP, digest, data["url"], len(image_data))
+            return data["url"]
+        raise WeChatAPIError(f"图片上传失败：{data.get('errmsg', '未知错误')}", data.get("errcode"))
+
+    def create_article(self, pdf_paths, titles, cover_image_path="../resources/cover_image.jpg", stitcher=None,
+                       max_articles=MAX_ARTICLES_PER_DRAFT):
+        """创建并发布图文消息，返回草稿media_id列表
+
+        传入stitcher（PageStitcher）时连续页面拼接成长图后上传；
+        文章数超过max_articles时分成多个草稿并发提交，全部失败时抛出首个分片的错误，
+        部分失败时抛出PartialDraftError，其中的shards记录了成功分片的media_id和失败分片包含的文章。
+        """
 
         if not pdf_paths or len(pdf_paths) != len(titles):
             raise ValueError("PDF路劲和标题数量必须匹配")
@@ -79,52 +393,98 @@ class WeChatUploader:
                 logger.error(f"输出文件夹未找到：{output_folder}")
                 raise FileNotFoundError(f"输出文件夹未找到：{output_folder}")
 
-            # 收集所有PNG图片
-            image_files = [f for f in os.listdir(output_folder) if f.endswith(".png")]
-            image_files.sort()  # 按页面顺序排序
+            # 收集所有页面图片
+            image_files = [f for f in os.listdir(output_folder) if f.lower().endswith(PAGE_IMAGE_EXTENSIONS)]
+            image_files.sort(key=_page_number)  # 按页面顺序排序
 
             if not image_files:
                 logger.error(f"未找到PNG图片文件夹：{output_folder}")
                 raise ValueError("输出文件夹中没有PNG图片, 无法创建草稿")
 
-            # 上传所有PNG图片并收集url
-            image_media_urls = []
-            for image_file in image_files:
-                image_path = os.path.join(output_folder, image_file)
-                pic_url = self.upload_temp_image(image_path)
-                time.sleep(random.randint(1, 3))
-                image_media_urls.append(pic_url)
-
-            # 构建单个图文消息内容
-            article = {
-                "title": title,
-                "thumb_media_id": cover_media_id,
-                "author": "羊驼叨叨叨",
-                "digest": "自动生成的PDF分享文章",
-                "content": "".join(
-                    [f'<img src="{media_url}" />' for media_url in
-                     image_media_urls]),
-                "content_source_url": "",
-                "need_open_comment": 1,
-                "only_fans_can_comment": 0
-            }
+            # 并发上传所有PNG图片并按页面顺序收集url
+            images = [os.path.join(output_folder, f) for f in image_files]
+            if stitcher is not None:
+                images = [strip.data for strip in stitcher.stitch(enumerate(images))]
+            image_media_urls = self.upload_pages(images)
+
+            article = self.build_article(title, cover_media_id, image_media_urls)
             articles.append(article)
-            print(article)
+            logger.debug(f"图文消息：{article}")
+
+        # 按单个草稿的文章数上限分片后发布图文消息
+        shards = submit_shards(self, shard_articles(list(enumerate(articles)), max_articles),
+                               workers=self.upload_concurrency)
+        media_ids = [shard.media_id for shard in shards if shard.ok]
+        if not media_ids:
+            raise shards[0].error
+        if len(media_ids) < len(shards):
+            raise PartialDraftError(shards)
+        return media_ids
+
+    def upload_page(self, image, filename=None):
+        """经令牌桶限流上传单页图片（路径或内存字节），返回url
+
+        遇到限流错误码时降低令牌桶速率并按指数退避（带抖动）重试。
+        命中上传缓存时直接返回，不占用令牌。
+        """
+        filename, image_data = _read_image(image, filename)
+        digest = UploadCache.digest(image_data)
+        pic_url = self._cached_upload(UPLOAD_KIND_TEMP, digest)
+        if pic_url is not None:
+            return pic_url
 
-        # 发布图文消息
-        url = f"https://api.weixin.qq.com/cgi-bin/draft/add?access_token={self.access_token}"
+        for attempt in range(self.rate_limit_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                pic_url = self._post_temp_image(filename, image_data, digest)
+            except WeChatAPIError as e:
+                if e.errcode not in RATE_LIMIT_ERRCODES or attempt == self.rate_limit_retries:
+                    raise
+                self.rate_limiter.throttle()
+                self.metrics.count("rate_limited", errcode=e.errcode)
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"触发接口频率限制(errcode={e.errcode})，{delay:.1f}秒后重试：{filename}")
+                time.sleep(delay)
+                continue
+            self.rate_limiter.recover()
+            return pic_url
+
+    def upload_pages(self, images):
+        """按并发上限同时上传多张图片（路径或内存字节），返回与输入顺序一致的url列表"""
+        if len(images) <= 1 or self.upload_concurrency == 1:
+            return [self.upload_page(image) for image in images]
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            return list(executor.map(self.upload_page, images))
+
+    def build_article(self, title, cover_media_id, image_media_urls):
+        """按页面顺序构建单个图文消息内容"""
+        return {
+            "title": title,
+            "thumb_media_id": cover_media_id,
+            "author": "羊驼叨叨叨",
+            "digest": "自动生成的PDF分享文章",
+            "content": "".join(
+                [f'<img src="{media_url}" />' for media_url in
+                 image_media_urls]),
+            "content_source_url": "",
+            "need_open_comment": 1,
+            "only_fans_can_comment": 0
+        }
+
+    def add_draft(self, articles):
+        """提交图文消息草稿，返回media_id"""
+        url = f"{self.api_base}/cgi-bin/draft/add"
         try:
             payload = {"articles": articles}
             headers = {
                 'Content-Type': 'application/json; charset=utf-8'
             }
-            response = requests.post(url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers)
-
-            response.raise_for_status()
-            data = response.json()
+            with self.metrics.span("draft"):
+                data = self._call_api("POST", url, idempotent=False,
+                                      data=json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers)
             if "media_id" in data:
                 return data["media_id"]
-            raise ValueError(f"图文消息创建失败：{data.get('errmsg', '未知错误')}")
+            raise WeChatAPIError(f"图文消息创建失败：{data.get('errmsg', '未知错误')}", data.get("errcode"))
         except requests.exceptions.RequestException as e:
-            print(e)
+            logger.error(f"草稿提交失败：{e}")
             raise
@@ -0,0 +1,28 @@
+import fitz
+from benchmarks.bench_pdf_processor import compare, make_corpus, run_case
+
+
+def test_make_corpus_generates_page_mix(tmp_path):
+    """测试合成PDF的页数和A3/A4混排，重复生成时复用已有文件"""
+    path = make_corpus("mixed", 3, str(tmp_path))
+    with fitz.open(path) as doc:
+        assert len(doc) == 3
+        assert doc[2].rect.width > doc[0].rect.width
+    assert make_corpus("mixed", 3, str(tmp_path)) == path
+
+
+def test_run_case_reports_metrics(tmp_path):
+    """测试单个用例返回耗时、每秒页数、峰值RSS和每页字节数"""
+    metrics = run_case("text", 2, "convert_pdf_to_images", corpus_dir=str(tmp_path))
+    assert metrics["pages_per_sec"] > 0
+    assert metrics["peak_rss_mb"] > 0
+    assert metrics["bytes_per_page"] > 0
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """测试超出容差的变慢、内存或体积增长被判定为回退"""
+    baseline = {"a": {"pages_per_sec": 10, "peak_rss_mb": 100, "bytes_per_page": 1000}}
+    assert compare({"a": {"pages_per_sec": 9, "peak_rss_mb": 110, "bytes_per_page": 1100}}, baseline) == []
+    regressions = compare({"a": {"pages_per_sec": 7, "peak_rss_mb": 130, "bytes_per_page": 1000},
+                           "new": {"pages_per_sec": 1, "peak_rss_mb": 1, "bytes_per_page": 1}}, baseline)
+    assert [(key, metric) for key, metric, _, _ in regressions] == [("a", "pages_per_sec"), ("a", "peak_rss_mb")]
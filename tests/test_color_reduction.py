@@ -0,0 +1,83 @@
+import io
+import os
+import pytest
+import fitz
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from src.color_reduction import ColorReducer
+from src.file_manager import FileManager
+from src.pdf_processor import PDFProcessor
+
+
+def _pixmap(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return fitz.Pixmap(buffer.getvalue())
+
+
+def test_classify_text_page_as_bilevel():
+    """测试黑字白底页面判定为1位图"""
+    image = Image.new("RGB", (200, 200), "white")
+    image.paste((0, 0, 0), (20, 20, 180, 30))
+    assert ColorReducer().classify(_pixmap(image)) == "bilevel"
+
+
+def test_classify_gray_and_color_pages():
+    """测试灰度层次页面判定为灰度，彩色页面保持RGB"""
+    gray = Image.linear_gradient("L").convert("RGB")
+    assert ColorReducer().classify(_pixmap(gray)) == "gray"
+    color = Image.new("RGB", (100, 100), "white")
+    color.paste((255, 0, 0), (0, 0, 50, 50))
+    assert ColorReducer().classify(_pixmap(color)) == "rgb"
+
+
+def test_classify_ignores_excluded_watermark_region():
+    """测试统计时排除水印区域"""
+    image = Image.new("RGB", (100, 100), "white")
+    image.paste((255, 0, 0), (25, 80, 75, 100))
+    assert ColorReducer().classify(_pixmap(image)) == "rgb"
+    assert ColorReducer().classify(_pixmap(image), exclude=(0.2, 0.75, 0.8, 1.0)) == "bilevel"
+
+
+def test_apply_bilevel_and_palette():
+    """测试二值化输出1位图，调色板模式输出P模式图片"""
+    image = Image.linear_gradient("L").convert("RGB")
+    reducer = ColorReducer()
+    assert reducer.apply(_pixmap(image), "bilevel").mode == "1"
+    assert reducer.apply(_pixmap(image), "palette").mode == "P"
+    assert reducer.apply(_pixmap(image), "gray").mode == "L"
+
+
+def test_unknown_mode():
+    """测试不支持的色彩模式"""
+    with pytest.raises(ValueError):
+        ColorReducer("cmyk")
+
+
+def test_processor_renders_monochrome_pages_reduced(tmp_path):
+    """测试PDFProcessor把黑白页面输出为1位图，彩色页面保持RGB且体积更小"""
+    pdf_path = str(tmp_path / "test.pdf")
+    c = canvas.Canvas(pdf_path, pagesize=A4)
+    c.drawString(100, 700, "Black text only")
+    c.showPage()
+    c.setFillColorRGB(0, 0, 1)
+    c.rect(100, 400, 300, 300, fill=1)
+    c.showPage()
+    c.save()
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path / "output"))
+
+    reduced = PDFProcessor(file_manager, watermark_image=str(watermark_path), color_reducer=ColorReducer())
+    folder = reduced.watermark_and_convert(pdf_path)
+    with Image.open(os.path.join(folder, "test_page_1.png")) as page:
+        assert page.mode == "1"
+    with Image.open(os.path.join(folder, "test_page_2.png")) as page:
+        assert page.mode == "RGB"
+    reduced_size = os.path.getsize(os.path.join(folder, "test_page_1.png"))
+    assert reduced.encoding_report["test"][0]["color_mode"] == "bilevel"
+
+    file_manager.delete_folder(folder)
+    folder = PDFProcessor(file_manager, watermark_image=str(watermark_path)).watermark_and_convert(pdf_path)
+    assert reduced_size < os.path.getsize(os.path.join(folder, "test_page_1.png"))
@@ -0,0 +1,118 @@
+import pytest
+from PIL import Image
+from reportlab.lib.pagesizes import A3, A4
+from reportlab.pdfgen import canvas
+from src.doc_scheduler import WORKING_COPIES, DocumentEstimate, DocumentScheduler, estimate_document
+from src.file_manager import FileManager
+from src.pdf_processor import PDFProcessor
+
+
+def _make_pdf(path, pagesizes):
+    c = canvas.Canvas(str(path))
+    for index, pagesize in enumerate(pagesizes):
+        c.setPageSize(pagesize)
+        c.drawString(20, 20, f"Page {index + 1}")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+class RecordingScheduler(DocumentScheduler):
+    """记录同时准入的最大PDF数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.peak = 0
+
+    def try_admit(self, cost):
+        admitted = super().try_admit(cost)
+        self.peak = max(self.peak, self._running)
+        return admitted
+
+
+def test_estimate_reads_page_sizes_without_rendering(tmp_path):
+    """测试按页面尺寸估算300 DPI像素字节数"""
+    estimate = estimate_document(_make_pdf(tmp_path / "a.pdf", [A4, A3, A4]))
+    assert estimate.pages == 3
+    assert estimate.page_bytes == pytest.approx(3508 * 4961 * 3, rel=0.01)
+    assert estimate.total_bytes == pytest.approx((2 * 2480 * 3508 + 3508 * 4961) * 3, rel=0.01)
+
+
+def test_admission_respects_budget_and_document_limit():
+    """测试按预算和文档数准入，空闲时总是准入超出预算的单个PDF"""
+    scheduler = DocumentScheduler(memory_budget=100, max_documents=2)
+    assert scheduler.try_admit(60)
+    assert not scheduler.try_admit(50)
+    assert scheduler.try_admit(40)
+    assert not scheduler.try_admit(0)
+    scheduler.release(60)
+    scheduler.release(40)
+    assert scheduler.try_admit(500)
+    assert scheduler.in_use == 500
+    with pytest.raises(ValueError):
+        DocumentScheduler(memory_budget=0)
+
+
+def test_cost_and_small_first_order():
+    """测试进程池工作内存只计一次、每个PDF只按缓冲的结果计费，以及小文档优先的顺序"""
+    small = DocumentEstimate("small.pdf", pages=2, page_bytes=10, total_bytes=20)
+    large = DocumentEstimate("large.pdf", pages=8, page_bytes=30, total_bytes=80)
+    assert DocumentScheduler.working_set([small, large], workers=4) == 30 * WORKING_COPIES * 4
+    assert DocumentScheduler.cost(large) == 0
+    assert DocumentScheduler.cost(small, result_bytes=5) == 10
+    assert [item[1] for item in DocumentScheduler.order([(large, "large"), (small, "small")])] == ["small", "large"]
+
+
+def test_reserved_working_set_counts_against_budget():
+    """测试预留的进程池工作内存计入预算，归还后恢复"""
+    scheduler = DocumentScheduler(memory_budget=100)
+    scheduler.reserve(70)
+    assert scheduler.try_admit(20)
+    assert not scheduler.try_admit(20)
+    assert scheduler.in_use == 90
+    scheduler.release(20)
+    scheduler.reserve(0)
+    assert scheduler.in_use == 0
+
+
+def test_processor_renders_documents_within_budget(tmp_path):
+    """测试多个PDF按预算同时渲染，损坏的PDF单独失败，其他PDF完整产出"""
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path / "output"))
+    processor = PDFProcessor(file_manager, watermark_image=str(watermark_path), render_workers=2)
+    paths = [_make_pdf(tmp_path / f"doc{index}.pdf", [(200, 200)] * pages) for index, pages in enumerate((3, 1, 2))]
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4 broken")
+    estimates = [estimate_document(path) for path in paths]
+    result_bytes = estimates[0].page_bytes // 4
+    # 进程池工作内存加上最大两个PDF的编码结果
+    scheduler = RecordingScheduler(memory_budget=DocumentScheduler.working_set(estimates, workers=2) +
+                                   DocumentScheduler.cost(estimates[0], result_bytes) +
+                                   DocumentScheduler.cost(estimates[2], result_bytes))
+
+    jobs = [(index, path, None, set()) for index, path in enumerate(paths + [str(broken)])]
+    results = {key: (pages, error) for key, pages, error in processor.iter_documents(jobs, scheduler, in_memory=True)}
+    processor.close()
+
+    assert isinstance(results[3][1], Exception)
+    assert [[page_num for page_num, _ in results[key][0]] for key in range(3)] == [[0, 1, 2], [0], [0, 1]]
+    assert 1 < scheduler.peak <= 2
+    assert scheduler.in_use == 0
+
+
+def test_single_worker_renders_in_process(tmp_path):
+    """测试render_workers为1时在调用线程中渲染，不创建进程池"""
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path / "output"))
+    processor = PDFProcessor(file_manager, watermark_image=str(watermark_path), render_workers=1)
+    paths = [_make_pdf(tmp_path / f"doc{index}.pdf", [(200, 200)] * pages) for index, pages in enumerate((2, 1))]
+
+    jobs = [(index, path, None, set()) for index, path in enumerate(paths)]
+    results = {key: pages for key, pages, error in
+               processor.iter_documents(jobs, DocumentScheduler(memory_budget=1024 ** 3), in_memory=True)}
+
+    assert processor._render_pool is None
+    assert [[page_num for page_num, _ in results[key]] for key in range(2)] == [[0, 1], [0]]
+    assert processor.encoding_report["doc0"].keys() == {0, 1}
@@ -0,0 +1,49 @@
+import os
+import threading
+import pytest
+from src.draft_sharding import order_documents, shard_articles, submit_shards
+
+
+def _touch(path, size, mtime):
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_order_documents(tmp_path):
+    """测试按输入顺序、文件名、修改时间和文件大小排序"""
+    paths = [_touch(tmp_path / "b.pdf", 30, 100), _touch(tmp_path / "A.pdf", 10, 300),
+             _touch(tmp_path / "c.pdf", 20, 200)]
+    assert order_documents(paths) == [0, 1, 2]
+    assert order_documents(paths, "filename") == [1, 0, 2]
+    assert order_documents(paths, "date") == [0, 2, 1]
+    assert order_documents(paths, "size") == [1, 2, 0]
+    with pytest.raises(ValueError):
+        order_documents(paths, "random")
+
+
+def test_shard_articles_respects_limit():
+    """测试按顺序切分为不超过上限的分片"""
+    shards = shard_articles([(index, f"article{index}") for index in range(17)])
+    assert [len(shard.articles) for shard in shards] == [8, 8, 1]
+    assert shards[2].doc_indexes == [16]
+    assert shard_articles([]) == []
+    with pytest.raises(ValueError):
+        shard_articles([(0, "article")], max_articles=0)
+
+
+def test_submit_shards_concurrently_with_partial_failure():
+    """测试分片并发提交，单个分片失败时记录错误，其他分片正常提交"""
+    barrier = threading.Barrier(3, timeout=5)
+
+    class Uploader:
+        def add_draft(self, articles):
+            # 三个分片同时进行时才会越过屏障
+            barrier.wait()
+            if "bad" in articles:
+                raise ValueError("图文消息创建失败")
+            return f"draft_{articles[0]}"
+
+    shards = submit_shards(Uploader(), shard_articles(list(enumerate(["a", "b", "bad", "c", "d"])), 2), workers=3)
+    assert [shard.media_id for shard in shards] == ["draft_a", None, "draft_d"]
+    assert isinstance(shards[1].error, ValueError)
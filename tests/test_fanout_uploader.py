@@ -0,0 +1,100 @@
+import io
+import pytest
+from PIL import Image
+from benchmarks.wechat_standin import StandinConfig, WeChatStandinServer
+from src.fanout_uploader import FanoutDraftError, FanoutUploader, load_accounts
+from src.file_manager import FileManager
+from src.wechat_uploader import WeChatAPIError
+
+
+@pytest.fixture
+def server():
+    """在后台线程中运行的模拟微信接口"""
+    with WeChatStandinServer(StandinConfig(seed=1)) as server:
+        yield server
+
+
+@pytest.fixture
+def fanout(tmp_path, server):
+    """两个公众号的FanoutUploader，均指向模拟接口"""
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path))
+    uploader = FanoutUploader.from_accounts([("main", "appid_main", "secret_main"), ("backup", "appid_b", "secret_b")],
+                                            file_manager, upload_rate=100, backoff_base=0.01, rate_limit_retries=0,
+                                            api_base=server.base_url)
+    yield uploader
+    uploader.close()
+
+
+def _png(seed):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (seed, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_load_accounts(monkeypatch):
+    """测试按WECHAT_ACCOUNTS读取各账号凭据，缺少凭据时报错"""
+    monkeypatch.setenv("WECHAT_ACCOUNTS", "main, backup")
+    monkeypatch.setenv("WECHAT_APPID_MAIN", "appid_main")
+    monkeypatch.setenv("WECHAT_APPSECRET_MAIN", "secret_main")
+    with pytest.raises(ValueError):
+        load_accounts()
+    monkeypatch.setenv("WECHAT_APPID_BACKUP", "appid_backup")
+    monkeypatch.setenv("WECHAT_APPSECRET_BACKUP", "secret_backup")
+    assert load_accounts() == [("main", "appid_main", "secret_main"), ("backup", "appid_backup", "secret_backup")]
+    assert load_accounts("") == []
+
+
+def test_fanout_publishes_to_every_account(server, fanout):
+    """测试同一页面上传到每个公众号，各账号独立获取token并分别提交草稿"""
+    cover = fanout.upload_image(_png(1), "cover.png")
+    page = fanout.upload_page(_png(2), "page_1.png")
+    assert set(cover) == set(page) == {"main", "backup"}
+    assert page["main"] != page["backup"]
+
+    article = fanout.build_article("标题", cover, [page])
+    assert article["backup"]["thumb_media_id"] == cover["backup"]
+    drafts = fanout.add_draft([article])
+
+    assert set(drafts) == {"main", "backup"}
+    stats = server.stats()
+    assert stats["requests:token"] == 2
+    assert stats["requests:media/uploadimg"] == 2
+    assert stats["drafts"] == 2
+    assert fanout.uploaders["main"].rate_limiter is not fanout.uploaders["backup"].rate_limiter
+
+
+def test_fanout_failure_retries_only_missing_accounts(server, fanout):
+    """测试某个账号失败时整页失败，重试时已成功的账号命中上传缓存"""
+    backup = fanout.uploaders["backup"]
+    original = backup.upload_page
+
+    def failing_upload(image, filename=None):
+        raise WeChatAPIError("图片上传失败", 45009)
+
+    backup.upload_page = failing_upload
+    with pytest.raises(WeChatAPIError):
+        fanout.upload_page(_png(3), "page_1.png")
+    backup.upload_page = original
+
+    fanout.upload_page(_png(3), "page_1.png")
+    assert server.stats()["requests:media/uploadimg"] == 2
+
+
+def test_fanout_draft_partial_failure_reports_succeeded_accounts(server, fanout):
+    """测试草稿只在部分账号成功时报告已成功账号的media_id，续传时只向其余账号提交"""
+    cover = fanout.upload_image(_png(4), "cover.png")
+    article = fanout.build_article("标题", cover, [fanout.upload_page(_png(5), "page_1.png")])
+    backup = fanout.uploaders["backup"]
+    original = backup.add_draft
+
+    def failing_draft(articles):
+        raise WeChatAPIError("图文消息创建失败", -1)
+
+    backup.add_draft = failing_draft
+    with pytest.raises(FanoutDraftError) as excinfo:
+        fanout.add_draft([article])
+    assert set(excinfo.value.media_ids) == {"main"} and set(excinfo.value.errors) == {"backup"}
+    backup.add_draft = original
+
+    assert set(fanout.add_draft([{"backup": article["backup"]}])) == {"backup"}
+    assert server.stats()["drafts"] == 2
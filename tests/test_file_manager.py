@@ -57,3 +57,11 @@ def test_delete_nonexistent_folder(temp_dir, file_manager):
     folder_path = str(temp_dir / "nonexistent")
     result = file_manager.delete_folder(folder_path)
     assert result is False
+
+
+def test_output_folder_includes_subfolder(temp_dir, file_manager):
+    """测试子目录中的PDF输出文件夹带上相对路径，避免不同子目录的同名PDF冲突"""
+    first = file_manager.create_output_folder(str(temp_dir / "2024-05-01" / "exam.pdf"))
+    second = file_manager.create_output_folder(str(temp_dir / "2024-05-02" / "exam.pdf"))
+    assert first != second
+    assert os.path.basename(first) == "2024-05-01_exam"
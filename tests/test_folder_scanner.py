@@ -0,0 +1,76 @@
+import os
+import time
+import pytest
+from src.folder_scanner import FolderScanner
+
+
+def _write(path, size=10, age=60):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def _age_dirs(*paths, age=60):
+    """把目录修改时间调早，使其早于扫描时的时间保护窗口"""
+    mtime = time.time() - age
+    for path in paths:
+        os.utime(path, (mtime, mtime))
+
+
+def test_scan_recurses_filters_and_orders(tmp_path):
+    """测试递归扫描、include/exclude过滤和按大小排序"""
+    big = _write(tmp_path / "2024-05-01" / "big.PDF", size=30)
+    small = _write(tmp_path / "2024-05-02" / "small.pdf", size=10)
+    _write(tmp_path / "2024-05-02" / "notes.txt")
+    _write(tmp_path / "archive" / "old.pdf")
+    top = _write(tmp_path / "top.pdf", size=20)
+
+    assert FolderScanner(str(tmp_path)).scan() == [top]
+    scanner = FolderScanner(str(tmp_path), recursive=True, exclude=["archive"], order="size")
+    assert scanner.scan() == [small, top, big]
+    with pytest.raises(ValueError):
+        FolderScanner(str(tmp_path), order="random")
+
+
+def test_scan_skips_files_still_being_written(tmp_path):
+    """测试刚修改的文件等到大小和修改时间稳定后才返回"""
+    path = _write(tmp_path / "copying.pdf", age=0)
+    scanner = FolderScanner(str(tmp_path), settle_seconds=30)
+    assert scanner.scan() == []
+    # 下一次扫描时签名未变，视为写入完成
+    assert scanner.scan() == [path]
+
+
+def test_snapshot_yields_only_new_or_changed(tmp_path, monkeypatch):
+    """测试快照：已处理的PDF不再返回，新增和修改过的PDF返回，未变化的目录不再列出"""
+    inbox = tmp_path / "inbox"
+    snapshot = str(tmp_path / "snapshot.json")
+    first = _write(inbox / "day1" / "a.pdf")
+    _age_dirs(inbox, inbox / "day1", age=120)
+
+    scanner = FolderScanner(str(inbox), recursive=True, snapshot_path=snapshot)
+    assert scanner.scan() == [first]
+    # 处理失败未调用mark_done时下次仍返回
+    assert FolderScanner(str(inbox), recursive=True, snapshot_path=snapshot).scan() == [first]
+    scanner.mark_done([first])
+
+    second = _write(inbox / "day2" / "b.pdf")
+    _age_dirs(inbox, inbox / "day2")
+    scanner = FolderScanner(str(inbox), recursive=True, snapshot_path=snapshot)
+    listed = []
+    original = os.scandir
+
+    def tracking_scandir(path):
+        listed.append(os.path.relpath(path, inbox))
+        return original(path)
+
+    monkeypatch.setattr(os, "scandir", tracking_scandir)
+    assert scanner.scan() == [second]
+    monkeypatch.undo()
+    assert "day1" not in listed
+
+    scanner.mark_done([second])
+    _write(inbox / "day1" / "a.pdf", size=20)
+    assert FolderScanner(str(inbox), recursive=True, snapshot_path=snapshot).scan(full=True) == [first]
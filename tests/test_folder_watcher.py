@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+from src.folder_watcher import FolderWatcher
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def watcher(request, tmp_path):
+    watcher = FolderWatcher(str(tmp_path), settle_seconds=0.2, poll_interval=0.05, use_inotify=request.param)
+    yield watcher
+    watcher.close()
+
+
+def test_poll_waits_until_file_settles(tmp_path, watcher):
+    """测试文件大小稳定settle_seconds后才交付，且只交付一次"""
+    pdf_path = tmp_path / "a.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 partial")
+    (tmp_path / "notes.txt").write_text("ignored")
+    assert watcher.poll() == []
+
+    # 仍在写入：大小变化后重新计时
+    time.sleep(0.15)
+    with open(pdf_path, "ab") as f:
+        f.write(b" more")
+    assert watcher.poll() == []
+    time.sleep(0.1)
+    assert watcher.poll() == []
+    time.sleep(0.15)
+    assert watcher.poll() == [str(pdf_path)]
+    assert watcher.poll() == []
+
+
+def test_modified_file_is_delivered_again(tmp_path, watcher):
+    """测试已交付的文件再次被修改后重新交付"""
+    pdf_path = tmp_path / "a.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 v1")
+    watcher.poll()
+    time.sleep(0.25)
+    assert watcher.poll() == [str(pdf_path)]
+
+    pdf_path.write_bytes(b"%PDF-1.4 version 2")
+    watcher.poll()
+    time.sleep(0.25)
+    assert watcher.poll() == [str(pdf_path)]
+
+
+def test_batches_delivers_new_arrivals(tmp_path, watcher):
+    """测试batches持续监听并交付新到达的文件，stop_event设置后退出"""
+    stop_event = threading.Event()
+    delivered = []
+
+    def consume():
+        for batch in watcher.batches(stop_event):
+            delivered.extend(batch)
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    time.sleep(0.1)
+    (tmp_path / "new.pdf").write_bytes(b"%PDF-1.4")
+    deadline = time.monotonic() + 5
+    while not delivered and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop_event.set()
+    thread.join(timeout=5)
+
+    assert delivered == [str(tmp_path / "new.pdf")]
+    assert not thread.is_alive()
+
+
+@pytest.mark.parametrize("use_inotify", [True, False], ids=["inotify", "polling"])
+def test_watch_honors_scan_settings(tmp_path, use_inotify):
+    """测试recursive/include/exclude与FolderScanner一致：进入子目录，跳过被排除的文件和子目录"""
+    watcher = FolderWatcher(str(tmp_path), settle_seconds=0.1, poll_interval=0.05, use_inotify=use_inotify,
+                            recursive=True, include=["*.PDF"], exclude=["drafts", "*_old.pdf"])
+    try:
+        (tmp_path / "a.pdf").write_bytes(b"%PDF-1.4")
+        (tmp_path / "a_old.pdf").write_bytes(b"%PDF-1.4")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "b.pdf").write_bytes(b"%PDF-1.4")
+        (tmp_path / "drafts").mkdir()
+        (tmp_path / "drafts" / "c.pdf").write_bytes(b"%PDF-1.4")
+        assert watcher.poll() == []
+        time.sleep(0.15)
+        assert watcher.poll() == [str(tmp_path / "a.pdf"), str(tmp_path / "sub" / "b.pdf")]
+
+        # 子目录中新到达的文件同样被发现
+        (tmp_path / "sub" / "d.pdf").write_bytes(b"%PDF-1.4")
+        stop_event = threading.Event()
+        batches = watcher.batches(stop_event)
+        assert next(batches) == [str(tmp_path / "sub" / "d.pdf")]
+        stop_event.set()
+    finally:
+        watcher.close()
@@ -0,0 +1,67 @@
+import pytest
+import fitz
+from io import BytesIO
+from PIL import Image
+from src.image_encoder import ImageEncoder
+
+
+@pytest.fixture
+def pixmap():
+    """生成带噪点的页面Pixmap，保证无损PNG体积较大"""
+    import random
+    random.seed(0)
+    image = Image.new("RGB", (400, 300), "white")
+    image.putdata([(random.randint(0, 255),) * 3 if i % 7 == 0 else (255, 255, 255)
+                   for i in range(400 * 300)])
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return fitz.Pixmap(buffer.getvalue())
+
+
+def test_png_default_is_lossless(pixmap):
+    """测试默认PNG编码与PyMuPDF输出一致，不节省字节"""
+    encoded = ImageEncoder().encode(pixmap)
+    assert encoded.data == pixmap.tobytes("png")
+    assert encoded.extension == "png"
+    assert encoded.bytes_saved == 0
+
+
+def test_jpeg_fits_budget_with_highest_quality(pixmap):
+    """测试JPEG在预算内选择最高质量"""
+    budget = len(pixmap.tobytes("png")) // 3
+    encoder = ImageEncoder("jpeg", max_bytes=budget)
+    encoded = encoder.encode(pixmap)
+    assert encoded.size <= budget
+    assert encoded.extension == "jpg"
+    # 非PNG格式不额外编码无损PNG，对照未压缩像素大小
+    assert encoded.baseline_bytes == pixmap.width * pixmap.height * 3
+    assert encoded.bytes_saved > 0
+    # 再提高一档质量就会超出预算
+    if encoded.quality < encoder.max_quality:
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=encoded.quality + 1, optimize=True)
+        assert len(buffer.getvalue()) > budget
+
+
+def test_png_over_budget_is_downscaled(pixmap):
+    """测试无损PNG超出预算时缩小尺寸"""
+    budget = len(pixmap.tobytes("png")) // 2
+    encoded = ImageEncoder("png", max_bytes=budget, min_scale=0.1).encode(pixmap)
+    assert encoded.size <= budget
+    assert encoded.scale < 1.0
+    assert Image.open(BytesIO(encoded.data)).width < pixmap.width
+
+
+def test_optimized_png_and_webp(pixmap):
+    """测试优化PNG与WebP编码"""
+    optimized = ImageEncoder("png-optimized", max_bytes=10 ** 9).encode(pixmap)
+    assert optimized.size <= len(pixmap.tobytes("png"))
+    webp = ImageEncoder("webp", max_bytes=50000).encode(pixmap)
+    assert Image.open(BytesIO(webp.data)).format == "WEBP"
+
+
+def test_unknown_format():
+    """测试不支持的格式"""
+    with pytest.raises(ValueError):
+        ImageEncoder("gif")
@@ -0,0 +1,73 @@
+import os
+from src.job_manifest import JobManifest
+
+
+def test_progress_persisted(tmp_path):
+    """测试进度写入磁盘后新实例可以读取"""
+    pdf_path = tmp_path / "test.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 test")
+    image_path = tmp_path / "test_page_1.png"
+    image_path.write_bytes(b"png")
+    manifest_path = str(tmp_path / "job_manifest.json")
+
+    manifest = JobManifest(manifest_path)
+    manifest.document(str(pdf_path))
+    manifest.mark_rendered(str(pdf_path), 0, str(image_path))
+    manifest.mark_rendered(str(pdf_path), 1, str(tmp_path / "missing.png"))
+    manifest.mark_uploaded(str(pdf_path), 0, "mock_url")
+
+    resumed = JobManifest(manifest_path)
+    assert resumed.document(str(pdf_path))["uploaded"] == {"0": "mock_url"}
+    assert resumed.rendered_pages(str(pdf_path)) == {0: str(image_path)}
+    assert resumed.uploaded_pages(str(pdf_path)) == {0: "mock_url"}
+
+
+def test_changed_source_resets_progress(tmp_path):
+    """测试源PDF内容变化后进度作废，仅修改时间变化时保留"""
+    pdf_path = tmp_path / "test.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 v1")
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+    manifest.document(str(pdf_path))
+    manifest.mark_uploaded(str(pdf_path), 0, "mock_url")
+
+    os.utime(pdf_path, (1, 1))
+    assert manifest.uploaded_pages(str(pdf_path)) == {0: "mock_url"}
+    assert manifest.document(str(pdf_path))["uploaded"] == {"0": "mock_url"}
+
+    pdf_path.write_bytes(b"%PDF-1.4 v2")
+    assert manifest.document(str(pdf_path))["uploaded"] == {}
+
+
+def test_reset(tmp_path):
+    """测试清空清单"""
+    pdf_path = tmp_path / "test.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+    manifest.document(str(pdf_path))
+    manifest.mark_drafted([str(pdf_path)], "mock_article_id")
+    manifest.reset()
+    assert JobManifest(manifest.path).document(str(pdf_path))["drafted"] is None
+
+
+def test_progress_appended_and_compacted(tmp_path):
+    """测试进度变化只追加一行，加载和记录草稿时压缩为每个PDF一行，已入草稿的PDF只保留media_id"""
+    pdf_path = tmp_path / "test.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    manifest_path = tmp_path / "job_manifest.jsonl"
+    manifest = JobManifest(str(manifest_path))
+    manifest.document(str(pdf_path))
+    for page_num in range(5):
+        manifest.mark_uploaded(str(pdf_path), page_num, f"url_{page_num}")
+    assert len(manifest_path.read_text(encoding="utf-8").splitlines()) == 6
+
+    # 写到一半的最后一行被忽略
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write('{"path": "trunc')
+    resumed = JobManifest(str(manifest_path))
+    assert len(manifest_path.read_text(encoding="utf-8").splitlines()) == 1
+    assert resumed.uploaded_pages(str(pdf_path)) == {page_num: f"url_{page_num}" for page_num in range(5)}
+
+    resumed.mark_drafted([str(pdf_path)], "mock_article_id")
+    entry = JobManifest(str(manifest_path)).document(str(pdf_path))
+    assert entry["drafted"] == "mock_article_id"
+    assert entry["uploaded"] == {} and entry["rendered"] == {}
@@ -0,0 +1,67 @@
+import os
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from src.file_manager import FileManager
+from src.margin_crop import MarginCropper
+from src.pdf_processor import PDFProcessor
+
+
+def _make_pdf(path):
+    """第1页内容集中在页面上半部分中间，第2页内容铺满页面"""
+    c = canvas.Canvas(str(path), pagesize=A4)
+    c.rect(200, 600, 200, 100, fill=1)
+    c.showPage()
+    c.rect(10, 10, A4[0] - 20, A4[1] - 20, fill=1)
+    c.showPage()
+    c.save()
+    return str(path)
+
+
+def test_content_box_ignores_noise():
+    """测试按行列统计墨迹得到内容包围盒，孤立噪点不影响结果"""
+    gray = np.full((400, 400), 255, dtype=np.uint8)
+    gray[80:160, 100:300] = 0
+    gray[390, 5] = 0
+    assert MarginCropper().content_box(gray) == (0.25, 0.2, 0.75, 0.4)
+    assert MarginCropper().content_box(np.full((10, 10), 255, dtype=np.uint8)) is None
+
+
+def test_crop_box_keeps_protected_region_and_padding(tmp_path):
+    """测试裁剪区域包含保护区域并留出padding，内容铺满时不裁剪"""
+    with fitz.open(_make_pdf(tmp_path / "a.pdf")) as doc:
+        cropper = MarginCropper(padding=10)
+        x0, y0, x1, y1 = cropper.crop_box(doc[0])
+        rect = doc[0].rect
+        assert x0 * rect.width == pytest.approx(190, abs=3)
+        assert x1 * rect.width == pytest.approx(410, abs=3)
+        assert y0 * rect.height == pytest.approx(rect.height - 710, abs=3)
+        assert y1 * rect.height == pytest.approx(rect.height - 590, abs=3)
+        protected = cropper.crop_box(doc[0], protect=(0.4, 0.9, 0.6, 1.0))
+        assert protected[3] == 1.0 and protected[1] == y0
+        assert cropper.crop_box(doc[1]) is None
+
+
+def test_processor_renders_only_cropped_region(tmp_path):
+    """测试PDFProcessor只渲染裁剪区域，底部居中的水印仍完整保留"""
+    pdf_path = _make_pdf(tmp_path / "test.pdf")
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 255)).save(watermark_path)
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path / "output"))
+    processor = PDFProcessor(file_manager, watermark_image=str(watermark_path), watermark_alpha=1.0,
+                             cropper=MarginCropper(padding=0))
+
+    folder = processor.watermark_and_convert(pdf_path)
+
+    with Image.open(os.path.join(folder, "test_page_1.png")) as page:
+        # 宽度为内容与水印的并集（200pt），高度从内容顶部到页面底部
+        assert page.width == pytest.approx(200 * 300 / 72, abs=20)
+        assert page.height == pytest.approx(700 * 300 / 72, abs=20)
+        bottom = np.asarray(page.convert("RGB"))[-10:]
+        assert ((bottom[..., 0] > 200) & (bottom[..., 1] < 80)).mean() > 0.5
+    with Image.open(os.path.join(folder, "test_page_2.png")) as page:
+        assert page.width >= 2480 and page.height >= 3508
+    assert processor.encoding_report["test"][1]["crop"] is None
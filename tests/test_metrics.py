@@ -0,0 +1,60 @@
+import json
+import pytest
+from src.metrics import Metrics, endpoint_name
+
+
+def test_spans_aggregate_by_stage_and_document():
+    """测试阶段耗时按阶段和PDF汇总，异常时记录错误次数"""
+    metrics = Metrics()
+    metrics.record("render", 0.5, document="a", page=0)
+    metrics.record("render", 1.5, document="a", page=1)
+    metrics.record("encode", 0.2, document="b", page=0)
+    with pytest.raises(ValueError):
+        with metrics.span("draft"):
+            raise ValueError("草稿失败")
+
+    report = metrics.report()
+    assert report["stages"]["render"] == {"count": 2, "seconds": 2.0, "max_seconds": 1.5}
+    assert report["stages"]["draft"]["count"] == 1
+    assert report["documents"]["a"] == {"pages": 2, "stages": {"render": 2.0}}
+    assert {"name": "errors", "labels": {"stage": "draft"}, "value": 1} in report["counters"]
+
+    metrics.reset_documents()
+    report = metrics.report()
+    assert report["documents"] == {}
+    assert report["stages"]["render"]["count"] == 2
+
+
+def test_api_latency_histogram_by_endpoint():
+    """测试接口延迟按接口路径分组并落入对应的桶"""
+    metrics = Metrics()
+    metrics.observe_api("https://api.weixin.qq.com/cgi-bin/media/uploadimg?access_token=x", 0.3)
+    metrics.observe_api("https://api.weixin.qq.com/cgi-bin/media/uploadimg", 3.0)
+    histogram = metrics.report()["api_latency"]["media/uploadimg"]
+    assert histogram["count"] == 2
+    assert histogram["sum"] == pytest.approx(3.3)
+    assert histogram["buckets"][histogram["le"].index(0.5)] == 1
+    assert histogram["buckets"][histogram["le"].index(5.0)] == 2
+    assert endpoint_name("https://mmbiz.qpic.cn/abc") == "mmbiz.qpic.cn"
+
+
+def test_export_json_and_prometheus(tmp_path):
+    """测试导出JSON运行报告和Prometheus textfile"""
+    metrics = Metrics()
+    metrics.record("upload", 0.25, document="a", page=0)
+    metrics.count("bytes_uploaded", 1000, kind="uploadimg")
+    metrics.count("http_retries", endpoint="draft/add")
+    metrics.observe_api("https://api.weixin.qq.com/cgi-bin/draft/add", 0.2)
+
+    metrics.write_json(str(tmp_path / "report.json"))
+    metrics.write_prometheus(str(tmp_path / "metrics.prom"))
+
+    report = json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))
+    assert report["documents"] == {"a": {"pages": 1, "stages": {"upload": 0.25}}}
+    assert "spans" not in report
+    text = (tmp_path / "metrics.prom").read_text(encoding="utf-8")
+    assert 'wechat_publisher_stage_seconds{stage="upload"} 0.250000' in text
+    assert 'wechat_publisher_bytes_uploaded{kind="uploadimg"} 1000' in text
+    assert 'wechat_publisher_http_retries{endpoint="draft/add"} 1' in text
+    assert 'wechat_publisher_api_latency_seconds_bucket{endpoint="draft/add",le="+Inf"} 1' in text
+    assert "# TYPE wechat_publisher_api_latency_seconds histogram" in text
@@ -0,0 +1,47 @@
+import fitz
+import pytest
+from reportlab.pdfgen import canvas
+from src.page_filter import PageFilter, describe_skipped
+
+
+def _make_pdf(path, layouts):
+    """按布局生成页面：None为空白页，(x, y)为在该位置画一块深色矩形和几行文字"""
+    c = canvas.Canvas(str(path), pagesize=(300, 400))
+    for layout in layouts:
+        if layout == "speck":
+            c.circle(150, 200, 0.5, fill=1)
+        elif layout is not None:
+            x, y = layout
+            c.rect(x, y, 120, 80, fill=1)
+            for line in range(5):
+                c.drawString(30, 350 - line * 14, f"Question {x} {y} {line}")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def test_detects_blank_pages(tmp_path):
+    """测试按墨迹覆盖率识别空白页，带少量噪点的页面同样视为空白"""
+    pdf = _make_pdf(tmp_path / "a.pdf", [(30, 30), None, "speck", (150, 200)])
+    with fitz.open(pdf) as doc:
+        assert PageFilter(blank_threshold=0.002).analyze(doc) == {1: "blank", 2: "blank"}
+        assert PageFilter().analyze(doc) == {}
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("drop", {2: "duplicate:1", 3: "duplicate:1"}),
+    ("collapse", {3: "duplicate:3"}),
+    ("off", {}),
+])
+def test_detects_near_duplicate_pages(tmp_path, mode, expected):
+    """测试drop去掉与之前任一页重复的页面，collapse只合并连续重复的页面"""
+    pdf = _make_pdf(tmp_path / "a.pdf", [(30, 30), (150, 200), (30, 30), (30, 30)])
+    with fitz.open(pdf) as doc:
+        assert PageFilter(duplicates=mode).analyze(doc) == expected
+
+
+def test_describe_skipped():
+    """测试跳过页面的报告文字"""
+    assert describe_skipped({3: "duplicate:1", 1: "blank"}) == "第2页空白，第4页与第1页重复"
+    with pytest.raises(ValueError):
+        PageFilter(duplicates="merge")
@@ -0,0 +1,57 @@
+import random
+from io import BytesIO
+from PIL import Image
+from src.image_encoder import ImageEncoder
+from src.page_stitcher import PageStitcher
+
+
+def _page(width=100, height=150, noise=False, color="white"):
+    image = Image.new("RGB", (width, height), color)
+    if noise:
+        random.seed(height)
+        image.putdata([(random.randint(0, 255),) * 3 for _ in range(width * height)])
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_stitch_packs_consecutive_pages_by_height():
+    """测试按最大高度装箱，长图按页面顺序竖向拼接"""
+    colors = ["red", "green", "blue", "black", "white"]
+    pages = [(i, _page(color=color)) for i, color in enumerate(colors)]
+
+    strips = list(PageStitcher(max_height=300).stitch(pages))
+
+    assert [strip.page_nums for strip in strips] == [(0, 1), (2, 3), (4,)]
+    with Image.open(BytesIO(strips[0].data)) as image:
+        assert image.size == (100, 300)
+        assert image.getpixel((50, 10))[:3] == (255, 0, 0)
+        assert image.getpixel((50, 290))[:3] == (0, 128, 0)
+
+
+def test_stitch_breaks_on_gap_and_scales_to_first_width():
+    """测试页码不连续时封箱，宽度不同的页面缩放到首页宽度"""
+    pages = [(0, _page()), (1, _page(width=200, height=300)), (3, _page())]
+
+    strips = list(PageStitcher(max_height=1000).stitch(pages))
+
+    assert [strip.page_nums for strip in strips] == [(0, 1), (3,)]
+    with Image.open(BytesIO(strips[0].data)) as image:
+        assert image.size == (100, 300)
+
+
+def test_stitch_respects_byte_budget(tmp_path):
+    """测试长图体积超出预算时拆分，每张长图都在预算内且不缩小尺寸"""
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"doc_page_{i + 1}.png"
+        path.write_bytes(_page(height=100 + i, noise=True))
+        paths.append(str(path))
+    budget = 3 * max(len(_page(height=100 + i, noise=True)) for i in range(6))
+    encoder = ImageEncoder(max_bytes=budget)
+
+    strips = list(PageStitcher(encoder, max_height=10000).stitch(enumerate(paths)))
+
+    assert [page for strip in strips for page in strip.page_nums] == list(range(6))
+    assert len(strips) < 6
+    assert all(len(strip.data) <= budget and strip.encoded.scale == 1.0 for strip in strips)
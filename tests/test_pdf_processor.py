@@ -79,4 +79,133 @@ def test_watermark_transparency(temp_dir, file_manager, watermark_image):
 
     assert os.path.exists(output_pdf)
     reader = PdfReader(output_pdf)
-    assert len(reader.pages) == 1
\ No newline at end of file
+    assert len(reader.pages) == 1
+
+def _make_pdf(path, pagesizes):
+    """按给定页面尺寸列表生成测试PDF"""
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(str(path))
+    for size in pagesizes:
+        c.setPageSize(size)
+        c.drawString(100, 100, "Test PDF")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def test_watermark_template_cached_per_page_size(temp_dir, pdf_processor, monkeypatch):
+    """测试水印模板按页面尺寸缓存，多文件只生成一次"""
+    from reportlab.lib.pagesizes import A3, A4
+    from src import pdf_processor as module
+    module.clear_watermark_template_cache()
+    calls = []
+    original = PDFProcessor._create_image_watermark_pdf
+
+    def counting(self, pagesize=A4):
+        calls.append(pagesize)
+        return original(self, pagesize)
+
+    monkeypatch.setattr(PDFProcessor, "_create_image_watermark_pdf", counting)
+    for i in range(3):
+        test_pdf = _make_pdf(temp_dir / f"test{i}.pdf", [A4, A3, A4])
+        pdf_processor.add_watermark(test_pdf, str(temp_dir / f"output{i}.pdf"))
+
+    assert len(calls) == 2
+
+
+def test_watermark_placed_for_real_page_size(pdf_processor):
+    """测试A3页面的水印按A3居中放置"""
+    from reportlab.lib.pagesizes import A3
+    x, y, width, _ = pdf_processor._watermark_geometry(*A3)
+    assert y == 0
+    assert abs(x + width / 2 - A3[0] / 2) < 1e-6
+
+
+def test_watermark_xobject_shared_across_pages(temp_dir, pdf_processor):
+    """测试输出PDF中所有页面共享同一个水印图片XObject"""
+    from reportlab.lib.pagesizes import A4
+    test_pdf = _make_pdf(temp_dir / "test.pdf", [A4] * 5)
+    output_pdf = str(temp_dir / "output.pdf")
+    pdf_processor.add_watermark(test_pdf, output_pdf)
+
+    reader = PdfReader(output_pdf)
+    refs = set()
+    for page in reader.pages:
+        xobjects = page["/Resources"]["/XObject"]
+        for name in xobjects:
+            refs.add(xobjects.raw_get(name).idnum)
+    assert len(reader.pages) == 5
+    assert len(refs) == 1
+
+
+def test_watermark_and_convert_skips_intermediate_pdf(temp_dir, file_manager, pdf_processor):
+    """测试融合模式直接渲染带水印的PNG，不写中间PDF"""
+    from reportlab.lib.pagesizes import A3, A4
+    test_pdf = _make_pdf(temp_dir / "test.pdf", [A4, A3])
+
+    output_folder = pdf_processor.watermark_and_convert(test_pdf)
+
+    assert sorted(os.listdir(output_folder)) == ["test_page_1.png", "test_page_2.png"]
+    assert not any(f.endswith(".pdf") for f in os.listdir(file_manager.output_base_path))
+    # 水印位于页面底部居中，应为红色
+    with Image.open(os.path.join(output_folder, "test_page_2.png")) as img:
+        r, g, b = img.convert("RGB").getpixel((img.width // 2, img.height - 5))
+    assert r > 200 and g < 200 and b < 200
+
+
+def test_watermark_and_convert_writes_pdf_when_requested(temp_dir, pdf_processor):
+    """测试显式指定时保存带水印的PDF"""
+    test_pdf = _make_pdf(temp_dir / "test.pdf", [(595, 842)] * 2)
+    watermarked_pdf = str(temp_dir / "test_watermarked.pdf")
+
+    pdf_processor.watermark_and_convert(test_pdf, watermarked_pdf=watermarked_pdf)
+
+    assert len(PdfReader(watermarked_pdf).pages) == 2
+
+
+def test_split_page_ranges():
+    """测试页码区间切分连续且覆盖所有页面"""
+    from src.pdf_processor import split_page_ranges
+    ranges = split_page_ranges(10, 2, chunks_per_worker=2)
+    assert ranges == [(0, 3), (3, 6), (6, 8), (8, 10)]
+    assert split_page_ranges(2, 4) == [(0, 1), (1, 2)]
+    assert split_page_ranges(0, 4) == []
+
+
+def test_parallel_render_matches_serial(temp_dir, file_manager, watermark_image):
+    """测试多进程渲染的输出命名和内容与单进程一致"""
+    from reportlab.lib.pagesizes import A4
+    test_pdf = _make_pdf(temp_dir / "test.pdf", [A4] * 5)
+    serial = PDFProcessor(file_manager, watermark_image=watermark_image)
+    parallel = PDFProcessor(file_manager, watermark_image=watermark_image, render_workers=2)
+
+    serial_folder = serial.watermark_and_convert(test_pdf)
+    serial_bytes = {f: Path(serial_folder, f).read_bytes() for f in os.listdir(serial_folder)}
+    file_manager.delete_folder(serial_folder)
+    try:
+        parallel_folder = parallel.watermark_and_convert(test_pdf)
+    finally:
+        parallel.close()
+    parallel_bytes = {f: Path(parallel_folder, f).read_bytes() for f in os.listdir(parallel_folder)}
+
+    assert sorted(parallel_bytes) == [f"test_page_{i}.png" for i in range(1, 6)]
+    assert parallel_bytes == serial_bytes
+
+
+def test_reports_keyed_by_output_name(temp_dir, pdf_processor):
+    """测试不同子目录中的同名PDF按输出文件夹名分别记录编码统计和计时，互不覆盖"""
+    from reportlab.lib.pagesizes import A4
+    os.makedirs(temp_dir / "a")
+    os.makedirs(temp_dir / "b")
+    first = _make_pdf(temp_dir / "a" / "report.pdf", [A4])
+    second = _make_pdf(temp_dir / "b" / "report.pdf", [A4] * 2)
+
+    first_folder = pdf_processor.watermark_and_convert(first)
+    second_folder = pdf_processor.watermark_and_convert(second)
+
+    assert first_folder != second_folder
+    assert pdf_processor.encoding_report["a_report"].keys() == {0}
+    assert pdf_processor.encoding_report["b_report"].keys() == {0, 1}
+    assert sorted(os.listdir(second_folder)) == ["b_report_page_1.png", "b_report_page_2.png"]
+    documents = pdf_processor.metrics.report()["documents"]
+    assert documents["a_report"]["pages"] == 1 and documents["b_report"]["pages"] == 2
@@ -0,0 +1,351 @@
+import os
+import random
+import threading
+import time
+import pytest
+from src.file_manager import FileManager
+from src.pdf_processor import PDFProcessor
+from src.pipeline import UploadPipeline
+from PIL import Image
+from reportlab.pdfgen import canvas
+
+
+class FakeUploader:
+    """记录上传顺序的假上传器，随机延迟模拟网络乱序完成"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.uploaded = []
+        self.drafts = []
+        self.lock = threading.Lock()
+
+    def upload_image(self, image_path):
+        return "cover_media_id"
+
+    def upload_page(self, image, filename=None):
+        time.sleep(random.uniform(0, 0.02))
+        name = filename or os.path.basename(image)
+        if self.fail_on and self.fail_on in name:
+            raise ValueError("图片上传失败")
+        with self.lock:
+            self.uploaded.append(name)
+        return f"url/{name}"
+
+    def build_article(self, title, cover_media_id, image_media_urls):
+        return {"title": title, "urls": image_media_urls}
+
+    def add_draft(self, articles):
+        self.drafts.append(articles)
+        return "mock_article_id"
+
+
+@pytest.fixture
+def file_manager(tmp_path):
+    """初始化FileManager实例"""
+    return FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path / "output"))
+
+
+@pytest.fixture
+def pdf_processor(tmp_path, file_manager):
+    """初始化PDFProcessor实例"""
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    return PDFProcessor(file_manager, watermark_image=str(watermark_path))
+
+
+def _progress_before_draft(manifest, pdf_path):
+    """记录PDF进入草稿前清单中的上传进度，进入草稿后页面进度会被清理"""
+    progress = {}
+    mark_drafted = manifest.mark_drafted
+
+    def recording(pdf_paths, media_id):
+        progress.update(manifest.uploaded_pages(pdf_path))
+        mark_drafted(pdf_paths, media_id)
+
+    manifest.mark_drafted = recording
+    return progress
+
+
+def _make_pdf(path, pages):
+    c = canvas.Canvas(str(path), pagesize=(200, 200))
+    for i in range(pages):
+        c.drawString(20, 20, f"Page {i + 1}")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def test_pipeline_preserves_page_order(tmp_path, pdf_processor):
+    """测试上传乱序完成时图文内容仍按页面顺序组装"""
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 12), _make_pdf(tmp_path / "b.pdf", 3)]
+    uploader = FakeUploader()
+    pipeline = UploadPipeline(pdf_processor, uploader, upload_workers=4, queue_size=2)
+
+    media_ids = pipeline.run(pdfs, ["A", "B"], "cover.jpg")
+
+    assert media_ids == ["mock_article_id"]
+    articles = uploader.drafts[0]
+    assert [a["title"] for a in articles] == ["A", "B"]
+    assert articles[0]["urls"] == [f"url/a_page_{i}.png" for i in range(1, 13)]
+    assert articles[1]["urls"] == [f"url/b_page_{i}.png" for i in range(1, 4)]
+    assert len(pipeline.output_folders) == 2
+
+
+def test_pipeline_skips_failed_pdf(tmp_path, pdf_processor):
+    """测试单个PDF上传失败时跳过该PDF，其余正常发布"""
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 2), _make_pdf(tmp_path / "b.pdf", 2)]
+    uploader = FakeUploader(fail_on="a_page_2")
+    pipeline = UploadPipeline(pdf_processor, uploader, upload_workers=2)
+
+    pipeline.run(pdfs, ["A", "B"], "cover.jpg")
+
+    assert [a["title"] for a in uploader.drafts[0]] == ["B"]
+    assert 0 in pipeline.failed
+
+
+def test_pipeline_bounds_rendering_ahead_of_uploads(tmp_path, pdf_processor):
+    """测试渲染领先上传的页数不超过队列深度加上传线程数"""
+    pdf = _make_pdf(tmp_path / "a.pdf", 10)
+    rendered = []
+    original = pdf_processor.iter_watermarked_pages
+
+    def tracking(*args, **kwargs):
+        for item in original(*args, **kwargs):
+            rendered.append(item)
+            yield item
+
+    pdf_processor.iter_watermarked_pages = tracking
+    uploader = FakeUploader()
+    lead = []
+    original_upload = uploader.upload_page
+
+    def slow_upload(image, filename=None):
+        lead.append(len(rendered) - len(uploader.uploaded))
+        time.sleep(0.02)
+        return original_upload(image, filename)
+
+    uploader.upload_page = slow_upload
+    UploadPipeline(pdf_processor, uploader, upload_workers=1, queue_size=2).run([pdf], ["A"], "cover.jpg")
+
+    assert max(lead) <= 2 + 1 + 1
+
+
+def test_pipeline_resumes_from_manifest(tmp_path, pdf_processor):
+    """测试中断后按清单续传：已上传页面不再上传，已渲染页面不再渲染，已入草稿的PDF跳过"""
+    from src.job_manifest import JobManifest
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 4)]
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+
+    # 第一次运行：第3页上传失败
+    failing = FakeUploader(fail_on="a_page_3")
+    with pytest.raises(ValueError):
+        UploadPipeline(pdf_processor, failing, upload_workers=1, queue_size=1, manifest=manifest).run(
+            pdfs, ["A"], "cover.jpg")
+    uploaded_before = set(failing.uploaded)
+    assert "a_page_3.png" not in uploaded_before
+
+    # 续传：只上传剩余页面，且不重新渲染已渲染的页面
+    rendered = []
+    original = pdf_processor.iter_watermarked_pages
+
+    def tracking(*args, **kwargs):
+        for item in original(*args, **kwargs):
+            rendered.append(item[0])
+            yield item
+
+    pdf_processor.iter_watermarked_pages = tracking
+    uploader = FakeUploader()
+    pipeline = UploadPipeline(pdf_processor, uploader, upload_workers=2, manifest=JobManifest(manifest.path))
+    assert pipeline.run(pdfs, ["A"], "cover.jpg") == ["mock_article_id"]
+
+    assert set(uploader.uploaded).isdisjoint(uploaded_before)
+    assert "a_page_3.png" in uploader.uploaded
+    assert set(rendered).isdisjoint({0, 1, 2})
+    assert uploader.drafts[0][0]["urls"] == [f"url/a_page_{i}.png" for i in range(1, 5)]
+
+    # 再次续传：已进入草稿，不再提交
+    again = FakeUploader()
+    assert UploadPipeline(pdf_processor, again, manifest=JobManifest(manifest.path)).run(
+        pdfs, ["A"], "cover.jpg") is None
+    assert again.drafts == []
+
+
+def test_pipeline_in_memory_creates_no_temp_files(tmp_path, file_manager, pdf_processor):
+    """测试内存模式直接上传编码后的字节，不创建临时图片文件夹"""
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 3)]
+    uploader = FakeUploader()
+    received = []
+    original_upload = uploader.upload_page
+
+    def recording_upload(image, filename=None):
+        received.append(image)
+        return original_upload(image, filename)
+
+    uploader.upload_page = recording_upload
+    pipeline = UploadPipeline(pdf_processor, uploader, upload_workers=2, in_memory=True)
+    pipeline.run(pdfs, ["A"], "cover.jpg")
+
+    assert os.listdir(file_manager.output_base_path) == []
+    assert pipeline.output_folders == []
+    assert all(isinstance(image, bytes) and image.startswith(b"\x89PNG") for image in received)
+    assert uploader.drafts[0][0]["urls"] == [f"url/a_page_{i}.png" for i in range(1, 4)]
+
+
+def test_pipeline_stitches_pages_into_strips(tmp_path, pdf_processor):
+    """测试设置stitcher时连续页面拼接成长图上传，续传清单记录被覆盖的页面"""
+    from src.job_manifest import JobManifest
+    from src.page_stitcher import PageStitcher
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 7)]
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+    uploader = FakeUploader()
+    # 每页渲染为833像素高（200pt@300DPI），3页一张长图
+    pipeline = UploadPipeline(pdf_processor, uploader, upload_workers=2, manifest=manifest,
+                              stitcher=PageStitcher(max_height=2600))
+    progress = _progress_before_draft(manifest, pdfs[0])
+
+    assert pipeline.run(pdfs, ["A"], "cover.jpg") == ["mock_article_id"]
+
+    assert uploader.drafts[0][0]["urls"] == ["url/a_page_1.png", "url/a_page_4.png", "url/a_page_7.png"]
+    assert progress == {0: "url/a_page_1.png", 1: None, 2: None,
+                        3: "url/a_page_4.png", 4: None, 5: None, 6: "url/a_page_7.png"}
+    assert manifest.uploaded_pages(pdfs[0]) == {}
+
+
+def test_pipeline_records_stage_metrics(tmp_path, pdf_processor):
+    """测试渲染、编码、写入和上传按页计时，写入字节数计入统计"""
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 3)]
+    pipeline = UploadPipeline(pdf_processor, FakeUploader(), upload_workers=2, metrics=pdf_processor.metrics)
+    pipeline.run(pdfs, ["A"], "cover.jpg")
+
+    report = pdf_processor.metrics.report()
+    for stage in ("watermark", "render", "encode", "write", "upload"):
+        assert report["stages"][stage]["count"] == 3
+    assert report["documents"]["a"]["pages"] == 3
+    written = [c["value"] for c in report["counters"] if c["name"] == "bytes_written"]
+    assert written and written[0] > 0
+
+
+def test_pipeline_shards_drafts_and_reports_partial_success(tmp_path, pdf_processor):
+    """测试文章数超过上限时按文件名分成多个草稿，失败的分片不影响其他分片，也不记为已入草稿"""
+    from src.job_manifest import JobManifest
+
+    class ShardUploader(FakeUploader):
+        def add_draft(self, articles):
+            if any(article["title"] == "c" for article in articles):
+                raise ValueError("图文消息创建失败")
+            with self.lock:
+                self.drafts.append(articles)
+            return f"draft_{articles[0]['title']}"
+
+    names = ["e", "b", "d", "a", "c"]
+    pdfs = [_make_pdf(tmp_path / f"{name}.pdf", 1) for name in names]
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+    uploader = ShardUploader()
+    pipeline = UploadPipeline(pdf_processor, uploader, upload_workers=2, manifest=manifest,
+                              max_articles=2, draft_order="filename")
+
+    assert sorted(pipeline.run(pdfs, names, "cover.jpg")) == ["draft_a", "draft_e"]
+
+    assert [[a["title"] for a in shard.articles] for shard in pipeline.shards] == [["a", "b"], ["c", "d"], ["e"]]
+    assert [shard.ok for shard in pipeline.shards] == [True, False, True]
+    assert set(pipeline.failed) == {names.index("c"), names.index("d")}
+    assert manifest.document(pdfs[names.index("a")])["drafted"] == "draft_a"
+    assert manifest.document(pdfs[names.index("c")])["drafted"] is None
+
+
+def test_pipeline_rejects_unknown_draft_order(pdf_processor):
+    """测试不支持的草稿排序方式在构造时报错"""
+    with pytest.raises(ValueError):
+        UploadPipeline(pdf_processor, FakeUploader(), draft_order="random")
+
+
+def test_pipeline_skips_filtered_pages(tmp_path, file_manager):
+    """测试被过滤的空白页和重复页不渲染、不上传，续传清单仍记录为已完成"""
+    from src.job_manifest import JobManifest
+    from src.page_filter import PageFilter
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    processor = PDFProcessor(file_manager, watermark_image=str(watermark_path),
+                             page_filter=PageFilter(blank_threshold=0.002, duplicates="drop"))
+    path = tmp_path / "a.pdf"
+    c = canvas.Canvas(str(path), pagesize=(200, 200))
+    for content in ("Page one", None, "Page one", "Page four"):
+        if content:
+            c.setFont("Helvetica", 24)
+            c.drawString(20, 100, content)
+        c.showPage()
+    c.save()
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+    uploader = FakeUploader()
+    progress = _progress_before_draft(manifest, str(path))
+
+    UploadPipeline(processor, uploader, upload_workers=2, manifest=manifest).run([str(path)], ["A"], "cover.jpg")
+
+    assert sorted(uploader.uploaded) == ["a_page_1.png", "a_page_4.png"]
+    assert uploader.drafts[0][0]["urls"] == ["url/a_page_1.png", "url/a_page_4.png"]
+    assert processor.filter_report["a"] == {1: "blank", 2: "duplicate:1"}
+    assert set(progress) == {0, 1, 2, 3}
+
+
+def test_pipeline_schedules_documents_in_parallel(tmp_path, file_manager):
+    """测试文档级调度：多个PDF同时渲染，失败的PDF不影响其他PDF，文章仍按输入顺序组装"""
+    from src.doc_scheduler import DocumentScheduler
+    watermark_path = tmp_path / "watermark.png"
+    Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    processor = PDFProcessor(file_manager, watermark_image=str(watermark_path), render_workers=2)
+    paths = []
+    for name, pages in (("big", 4), ("small", 1), ("mid", 2)):
+        _make_pdf(tmp_path / f"{name}.pdf", pages)
+        paths.append(str(tmp_path / f"{name}.pdf"))
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    paths.insert(1, str(broken))
+    uploader = FakeUploader()
+
+    pipeline = UploadPipeline(processor, uploader, upload_workers=3,
+                              scheduler=DocumentScheduler(memory_budget=1024 ** 3))
+    result = pipeline.run(paths, ["Big", "Broken", "Small", "Mid"], "cover.jpg")
+    processor.close()
+
+    assert result == ["mock_article_id"]
+    assert set(pipeline.failed) == {1}
+    articles = uploader.drafts[0]
+    assert [article["title"] for article in articles] == ["Big", "Small", "Mid"]
+    assert articles[0]["urls"] == [f"url/big_page_{i}.png" for i in range(1, 5)]
+    assert articles[2]["urls"] == ["url/mid_page_1.png", "url/mid_page_2.png"]
+
+
+def test_pipeline_resubmits_draft_only_to_failed_accounts(tmp_path, pdf_processor):
+    """测试多公众号模式下草稿只在部分账号成功时，续传只向失败的账号提交"""
+    from src.draft_sharding import FanoutDraftError
+    from src.job_manifest import JobManifest
+
+    class FanoutFake(FakeUploader):
+        def __init__(self, failing=()):
+            super().__init__()
+            self.failing = set(failing)
+
+        def build_article(self, title, cover_media_id, image_media_urls):
+            return {name: {"title": title} for name in ("main", "backup")}
+
+        def add_draft(self, articles):
+            names = [name for name in ("main", "backup") if name in articles[0]]
+            self.drafts.append(names)
+            media_ids = {name: f"draft_{name}" for name in names if name not in self.failing}
+            if len(media_ids) < len(names):
+                raise FanoutDraftError(media_ids, {name: ValueError("失败") for name in self.failing})
+            return media_ids
+
+    pdfs = [_make_pdf(tmp_path / "a.pdf", 1)]
+    manifest = JobManifest(str(tmp_path / "job_manifest.json"))
+    first = FanoutFake(failing={"backup"})
+    with pytest.raises(FanoutDraftError):
+        UploadPipeline(pdf_processor, first, manifest=manifest).run(pdfs, ["A"], "cover.jpg")
+    assert manifest.document(pdfs[0])["draft_accounts"] == {"main": "draft_main"}
+
+    resumed = FanoutFake()
+    assert UploadPipeline(pdf_processor, resumed, manifest=JobManifest(manifest.path)).run(
+        pdfs, ["A"], "cover.jpg") == [{"backup": "draft_backup"}]
+    assert resumed.drafts == [["backup"]]
+    assert JobManifest(manifest.path).document(pdfs[0])["drafted"] == {"main": "draft_main",
+                                                                         "backup": "draft_backup"}
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from reportlab.lib.pagesizes import A3, A4
+from reportlab.pdfgen import canvas
+from src.planner import plan_documents, format_plan
+
+
+def _make_pdf(path, pagesizes):
+    c = canvas.Canvas(str(path))
+    for pagesize in pagesizes:
+        c.setPageSize(pagesize)
+        c.drawString(20, 20, "Page")
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def test_plan_counts_pages_and_caps_estimate(tmp_path):
+    """测试按页面尺寸估算上传量，单页估算不超过字节预算，无法打开的PDF单独报告"""
+    pdf = _make_pdf(tmp_path / "a.pdf", [A4, A4, A3])
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    plans = plan_documents([pdf, str(broken)], max_bytes=1000000)
+
+    assert plans[0]["pages"] == 3
+    assert plans[0]["uploads"] == 3
+    assert 0 < plans[0]["estimated_bytes"] <= 3 * 1000000
+    assert plans[1]["error"]
+    assert "合计" in format_plan(plans)
+
+
+def test_plan_estimates_stitched_uploads(tmp_path):
+    """测试设置长图高度时按拼接规则估算上传次数"""
+    pdf = _make_pdf(tmp_path / "a.pdf", [(200, 200)] * 7)
+
+    plan = plan_documents([pdf], stitch_max_height=2600)[0]
+
+    # 每页833像素高，3页一张长图
+    assert plan["uploads"] == 3
+
+
+def test_dry_run_skips_heavy_imports(tmp_path):
+    """测试--dry-run不加载水印、上传相关的重量级依赖"""
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    _make_pdf(pdf_dir / "a.pdf", [A4])
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+    script = ("import sys, main; sys.argv = ['main.py'] + sys.argv[1:]; main.main(); "
+              "print(sorted(m for m in ('PyPDF2', 'reportlab', 'requests', 'numpy') if m in sys.modules))")
+    env = dict(os.environ, OUTPUT_BASE_PATH=str(tmp_path / "output"), SCAN_SETTLE_SECONDS="0")
+    result = subprocess.run([sys.executable, "-c", script, "--folder", str(pdf_dir), "--dry-run"],
+                            cwd=src, env=env, capture_output=True, text=True, check=True)
+    assert "a.pdf" in result.stdout
+    assert result.stdout.strip().endswith("[]")
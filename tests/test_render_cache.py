@@ -0,0 +1,141 @@
+import hashlib
+import os
+import time
+import pytest
+from PIL import Image
+from reportlab.pdfgen import canvas
+from src.file_manager import FileManager
+from src.image_encoder import ImageEncoder
+from src.metrics import Metrics
+from src.pdf_processor import PDFProcessor
+from src.render_cache import RenderCache
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "test.pdf"
+    c = canvas.Canvas(str(path), pagesize=(200, 200))
+    for text in ("Page one", "Page two"):
+        c.drawString(20, 100, text)
+        c.showPage()
+    c.save()
+    return str(path)
+
+
+def _processor(tmp_path, cache, **kwargs):
+    watermark_path = tmp_path / "watermark.png"
+    if not watermark_path.exists():
+        Image.new("RGBA", (150, 100), (255, 0, 0, 128)).save(watermark_path)
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path / "output"))
+    return PDFProcessor(file_manager, watermark_image=str(watermark_path), render_cache=cache,
+                        metrics=Metrics(), **kwargs)
+
+
+def _cache_counts(processor):
+    counts = {"hit": 0, "miss": 0}
+    for counter in processor.metrics.report()["counters"]:
+        if counter["name"] == "render_cache":
+            counts[counter["labels"]["result"]] += counter["value"]
+    return counts
+
+
+def test_put_get_and_lru_eviction(tmp_path):
+    """测试写入、读取和按最近使用时间淘汰"""
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    cache.put("aa01", b"x" * 100, "png", {"bytes": 100})
+    time.sleep(0.01)
+    cache.put("bb02", b"y" * 100, "png", {"bytes": 100})
+    time.sleep(0.01)
+    path, stats = cache.get("aa01")
+    with open(path, "rb") as f:
+        assert f.read() == b"x" * 100
+    assert stats == {"bytes": 100}
+
+    cache.put("cc03", b"z" * 100, "png", {"bytes": 100})
+
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") is not None and cache.get("cc03") is not None
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 200
+    assert cache.prune(max_bytes=0) == (2, 200)
+    assert not os.path.exists(path)
+    cache.close()
+
+
+def test_processor_reuses_cached_pages(tmp_path, pdf_path):
+    """测试第二次处理同一PDF时直接复用缓存的页面，图片内容与首次渲染一致"""
+    cache_dir = str(tmp_path / "cache")
+    first = _processor(tmp_path, RenderCache(cache_dir))
+    rendered = {page_num: encoded.data for page_num, encoded in first.iter_encoded_pages(pdf_path)}
+    first.close()
+    assert _cache_counts(first) == {"hit": 0, "miss": 2}
+
+    second = _processor(tmp_path, RenderCache(cache_dir))
+    reused = {page_num: encoded.data for page_num, encoded in second.iter_encoded_pages(pdf_path)}
+    assert reused == rendered
+    assert _cache_counts(second) == {"hit": 2, "miss": 0}
+
+    folder = second.watermark_and_convert(pdf_path)
+    with open(os.path.join(folder, "test_page_2.png"), "rb") as f:
+        assert f.read() == rendered[1]
+    second.close()
+
+
+def test_settings_change_invalidates_cache(tmp_path, pdf_path):
+    """测试水印透明度、编码设置或源文件变化时重新渲染"""
+    cache_dir = str(tmp_path / "cache")
+    for processor in (_processor(tmp_path, RenderCache(cache_dir)),
+                      _processor(tmp_path, RenderCache(cache_dir), watermark_alpha=0.3),
+                      _processor(tmp_path, RenderCache(cache_dir), encoder=ImageEncoder("jpeg"))):
+        list(processor.iter_encoded_pages(pdf_path))
+        processor.close()
+        assert _cache_counts(processor) == {"hit": 0, "miss": 2}
+
+    c = canvas.Canvas(pdf_path, pagesize=(200, 200))
+    c.drawString(20, 100, "Changed")
+    c.showPage()
+    c.save()
+    processor = _processor(tmp_path, RenderCache(cache_dir))
+    list(processor.iter_encoded_pages(pdf_path))
+    processor.close()
+    assert _cache_counts(processor) == {"hit": 0, "miss": 1}
+
+
+def test_cached_pages_are_read_lazily(tmp_path, pdf_path):
+    """测试缓存命中的页面逐页读取，第一页产出时其余页面尚未读入内存"""
+    cache_dir = str(tmp_path / "cache")
+    first = _processor(tmp_path, RenderCache(cache_dir))
+    list(first.iter_encoded_pages(pdf_path))
+    first.close()
+
+    second = _processor(tmp_path, RenderCache(cache_dir))
+    pages = second.iter_encoded_pages(pdf_path)
+    next(pages)
+    assert len(second.encoding_report["test"]) == 1
+    assert len(list(pages)) == 1
+    pages.close()
+    second.close()
+
+
+def test_rerender_does_not_overwrite_linked_cache_entry(tmp_path, pdf_path):
+    """测试缓存命中时链接到输出文件夹的页面，以不同设置重新渲染后缓存中的图片不变"""
+    cache_dir = str(tmp_path / "cache")
+    first = _processor(tmp_path, RenderCache(cache_dir))
+    first.watermark_and_convert(pdf_path)
+    first.close()
+
+    second = _processor(tmp_path, RenderCache(cache_dir))
+    folder = second.watermark_and_convert(pdf_path)
+    key = second.render_cache.page_key(second.render_cache.source_digest(pdf_path), 0, second.render_settings())
+    cached_path = second.render_cache.get(key)[0]
+    second.close()
+    with open(cached_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    third = _processor(tmp_path, RenderCache(cache_dir), encoder=ImageEncoder(max_bytes=2000))
+    third.watermark_and_convert(pdf_path)
+    third.close()
+    assert _cache_counts(third) == {"hit": 0, "miss": 2}
+    with open(cached_path, "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest() == digest
+    assert not os.path.samefile(cached_path, os.path.join(folder, "test_page_1.png"))
+    assert not [name for name in os.listdir(folder) if name.endswith(".tmp")]
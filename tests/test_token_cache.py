@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import time
+from src.token_cache import AccessTokenCache
+
+
+def test_token_cached_on_disk(tmp_path):
+    """测试token写入磁盘后新实例直接复用"""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "token_1", 7200
+
+    token, expires_at = AccessTokenCache(str(tmp_path), "appid").get(fetch)
+    assert token == "token_1"
+    assert expires_at > time.time() + 7000
+    assert AccessTokenCache(str(tmp_path), "appid").get(fetch)[0] == "token_1"
+    assert len(calls) == 1
+
+
+def test_token_refreshed_within_margin(tmp_path):
+    """测试距离过期不足refresh_margin时重新获取"""
+    tokens = iter([("token_1", 100), ("token_2", 7200)])
+    cache = AccessTokenCache(str(tmp_path), "appid", refresh_margin=300)
+    assert cache.get(lambda: next(tokens))[0] == "token_1"
+    assert cache.get(lambda: next(tokens))[0] == "token_2"
+
+
+def test_force_refresh_reuses_token_refreshed_elsewhere(tmp_path):
+    """测试强制刷新时若其他进程已换新token则不再请求"""
+    cache = AccessTokenCache(str(tmp_path), "appid")
+    cache.get(lambda: ("token_2", 7200))
+    token, _ = cache.get(lambda: ("token_3", 7200), force_refresh=True, stale_token="token_1")
+    assert token == "token_2"
+    token, _ = cache.get(lambda: ("token_3", 7200), force_refresh=True, stale_token="token_2")
+    assert token == "token_3"
+
+
+def _fetch_in_process(cache_dir, counter_path, results):
+    def fetch():
+        with open(counter_path, "a") as f:
+            f.write("x")
+        time.sleep(0.2)
+        return f"token_{os.getpid()}", 7200
+
+    results.put(AccessTokenCache(cache_dir, "appid").get(fetch)[0])
+
+
+def test_token_fetched_once_across_processes(tmp_path):
+    """测试多个进程同时获取token时只请求一次接口"""
+    counter_path = str(tmp_path / "counter")
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_fetch_in_process, args=(str(tmp_path), counter_path, results))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    tokens = {results.get() for _ in processes}
+    assert len(tokens) == 1
+    with open(counter_path) as f:
+        assert f.read() == "x"
+
+
+def test_memory_only_cache_writes_no_files(tmp_path):
+    """测试cache_dir为None时token只缓存在进程内存中，不创建任何文件"""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "token_1", 7200
+
+    cache = AccessTokenCache(None, "appid")
+    assert cache.get(fetch)[0] == "token_1"
+    assert cache.get(fetch)[0] == "token_1"
+    assert len(calls) == 1
+    cache.clear()
+    assert cache.get(fetch)[0] == "token_1" and len(calls) == 2
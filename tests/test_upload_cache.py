@@ -0,0 +1,64 @@
+import time
+import pytest
+from src.upload_cache import UploadCache
+
+
+@pytest.fixture
+def open_cache(tmp_path):
+    """创建UploadCache的工厂，测试结束时关闭所有打开的缓存"""
+    caches = []
+
+    def _open(**kwargs):
+        cache = UploadCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield _open
+    for cache in caches:
+        cache.close()
+
+
+def test_put_and_get(open_cache):
+    """测试按内容哈希记录和查询上传结果"""
+    cache = open_cache()
+    digest = UploadCache.digest(b"image")
+    assert cache.get("appid", "uploadimg", digest) is None
+    cache.put("appid", "uploadimg", digest, "mock_url", 5)
+    assert cache.get("appid", "uploadimg", digest)["value"] == "mock_url"
+    assert cache.get("other_appid", "uploadimg", digest) is None
+    assert cache.stats() == {"entries": 1, "bytes": 5}
+
+
+def test_persisted_across_instances(open_cache):
+    """测试缓存写入磁盘后新实例可以读取"""
+    open_cache().put("appid", "material", "abc", "mock_media_id", 1)
+    assert open_cache().get("appid", "material", "abc")["value"] == "mock_media_id"
+
+
+def test_ttl_expiry(open_cache):
+    """测试超过TTL未使用的记录被淘汰"""
+    cache = open_cache(ttl=0.05)
+    cache.put("appid", "uploadimg", "abc", "mock_url", 1)
+    time.sleep(0.1)
+    assert cache.get("appid", "uploadimg", "abc") is None
+
+
+def test_lru_eviction(open_cache):
+    """测试超过最大记录数时淘汰最久未使用的记录"""
+    cache = open_cache(max_entries=2)
+    for digest in ("a", "b", "c"):
+        cache.put("appid", "uploadimg", digest, f"url_{digest}", 1)
+        time.sleep(0.01)
+    cache.get("appid", "uploadimg", "a")
+    assert cache.prune() == 1
+    assert cache.get("appid", "uploadimg", "b") is None
+    assert cache.get("appid", "uploadimg", "a") is not None
+
+
+def test_needs_verification(open_cache):
+    """测试超过verify_after的记录需要重新校验"""
+    cache = open_cache(verify_after=0)
+    cache.put("appid", "uploadimg", "abc", "mock_url", 1)
+    entry = cache.get("appid", "uploadimg", "abc")
+    time.sleep(0.01)
+    assert cache.needs_verification(entry)
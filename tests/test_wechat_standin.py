@@ -0,0 +1,81 @@
+import io
+import pytest
+from PIL import Image
+from benchmarks.load_harness import run_load
+from benchmarks.wechat_standin import StandinConfig, WeChatStandinServer
+from src.file_manager import FileManager
+from src.wechat_uploader import WeChatAPIError, WeChatUploader
+
+
+@pytest.fixture
+def server():
+    """在后台线程中运行的模拟微信接口"""
+    with WeChatStandinServer(StandinConfig(seed=1)) as server:
+        yield server
+
+
+@pytest.fixture
+def uploader(tmp_path, server, monkeypatch):
+    """指向模拟接口的WeChatUploader"""
+    monkeypatch.setenv("WECHAT_APPID", "standin_appid")
+    monkeypatch.setenv("WECHAT_APPSECRET", "standin_secret")
+    file_manager = FileManager(desktop_path=str(tmp_path), output_base_path=str(tmp_path))
+    uploader = WeChatUploader(file_manager, upload_rate=100, backoff_base=0.01, rate_limit_retries=2,
+                              api_base=server.base_url)
+    yield uploader
+    uploader.close()
+
+
+def _png(seed):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (seed, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_upload_and_draft(server, uploader):
+    """测试经模拟接口上传页面、封面并创建草稿"""
+    pic_url = uploader.upload_page(_png(1), "page_1.png")
+    assert pic_url.startswith(server.base_url)
+    media_id = uploader.upload_image(_png(2), "cover.png")
+    uploader.add_draft([uploader.build_article("标题", media_id, [pic_url])])
+    stats = server.stats()
+    assert stats["requests:token"] == 1
+    assert stats["drafts"] == 1 and stats["articles"] == 1
+
+
+def test_revoked_token_is_refreshed(server, uploader):
+    """测试token作废（40001）时刷新后重试成功"""
+    uploader.upload_page(_png(1), "page_1.png")
+    server._tokens.clear()
+    uploader.upload_page(_png(2), "page_2.png")
+    stats = server.stats()
+    assert stats["errcode:40001"] == 1
+    assert stats["requests:token"] == 2
+
+
+def test_quota_errcode_is_retried_then_raised(server, uploader):
+    """测试配额错误码（45009）按退避重试，重试用尽后抛出"""
+    server.config.quota_error_rate = 1.0
+    with pytest.raises(WeChatAPIError) as exc_info:
+        uploader.upload_page(_png(1), "page_1.png")
+    assert exc_info.value.errcode == 45009
+    assert server.stats()["errcode:45009"] == 3
+
+
+def test_size_and_article_limits(server, uploader):
+    """测试超出图片大小限制（40009）和单草稿文章数限制（45008）"""
+    server.config.uploadimg_max_bytes = 10
+    with pytest.raises(WeChatAPIError) as exc_info:
+        uploader.upload_page(_png(1), "page_1.png")
+    assert exc_info.value.errcode == 40009
+    with pytest.raises(WeChatAPIError) as exc_info:
+        uploader.add_draft([uploader.build_article(f"标题{i}", "media", []) for i in range(9)])
+    assert exc_info.value.errcode == 45008
+
+
+def test_load_harness_runs_main_end_to_end():
+    """测试压测脚本驱动main.main()发布草稿并报告每小时文章数"""
+    result = run_load(StandinConfig(seed=1), pdfs=2, pages=1)
+    assert result["articles"] == result["expected_articles"] == 2
+    assert result["articles_per_hour"] > 0
+    assert result["server"]["requests:media/uploadimg"] == 2
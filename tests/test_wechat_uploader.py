@@ -31,7 +31,9 @@ def env_file(temp_dir):
 @pytest.fixture
 def wechat_uploader(file_manager, env_file):
     """初始化WeChatUploader实例"""
-    return WeChatUploader(file_manager)
+    uploader = WeChatUploader(file_manager)
+    yield uploader
+    uploader.close()
 
 
 def test_get_access_token(wechat_uploader, requests_mock):
@@ -106,3 +108,267 @@ def test_create_article(temp_dir, file_manager, wechat_uploader, requests_mock):
     article_media_id = wechat_uploader.create_article(str(pdf_path), title="Test Article",
                                                       cover_image_path=str(cover_image_path))
     assert article_media_id == "mock_article_id"
+
+
+@pytest.fixture
+def mocked_uploader(file_manager, env_file, requests_mock):
+    """在模拟Access Token接口后初始化WeChatUploader实例"""
+    requests_mock.get(
+        "https://api.weixin.qq.com/cgi-bin/token",
+        json={"access_token": "mock_token", "expires_in": 7200}
+    )
+    uploader = WeChatUploader(file_manager, upload_rate=100, backoff_base=0.01)
+    yield uploader
+    uploader.close()
+
+
+def test_token_bucket_limits_rate():
+    """测试令牌桶在突发容量用完后按速率放行"""
+    import time
+    from src.wechat_uploader import TokenBucket
+    bucket = TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+def test_token_bucket_throttle_and_recover():
+    """测试限流时降速、成功后恢复且不超过初始速率"""
+    from src.wechat_uploader import TokenBucket
+    bucket = TokenBucket(rate=4)
+    bucket.throttle()
+    assert bucket.rate == 2
+    for _ in range(10):
+        bucket.recover()
+    assert bucket.rate == 4
+
+
+def test_upload_page_backs_off_on_rate_limit(temp_dir, mocked_uploader, requests_mock):
+    """测试遇到45009时退避重试并降低限流速率"""
+    image_path = temp_dir / "test.png"
+    with Image.open("resources/watermark.png") as img:
+        img.save(image_path)
+
+    requests_mock.post(
+        "https://api.weixin.qq.com/cgi-bin/media/uploadimg",
+        [{"json": {"errcode": 45009, "errmsg": "reach max api daily quota limit"}},
+         {"json": {"url": "mock_url"}}]
+    )
+    url = mocked_uploader.upload_page(str(image_path))
+    assert url == "mock_url"
+    assert requests_mock.call_count == 3  # token + 2次上传
+    assert mocked_uploader.rate_limiter.rate < mocked_uploader.rate_limiter.max_rate
+
+
+def test_upload_pages_keeps_order(temp_dir, mocked_uploader):
+    """测试并发上传返回的url顺序与输入一致"""
+    paths = [str(temp_dir / f"test_page_{i}.png") for i in range(6)]
+    mocked_uploader.upload_page = lambda path: f"url/{os.path.basename(path)}"
+    urls = mocked_uploader.upload_pages(paths)
+    assert urls == [f"url/test_page_{i}.png" for i in range(6)]
+
+
+def test_request_retries_idempotent_5xx(mocked_uploader, requests_mock):
+    """测试幂等请求遇到5xx时退避重试并记录重试次数"""
+    mocked_uploader.http_backoff = 0.01
+    requests_mock.get(
+        "https://api.weixin.qq.com/cgi-bin/token",
+        [{"status_code": 503}, {"json": {"access_token": "new_token", "expires_in": 7200}}]
+    )
+    assert mocked_uploader._fetch_access_token() == ("new_token", 7200)
+    stats = mocked_uploader.http_stats()
+    assert stats["retries"] == 1
+    assert stats["requests"] == 2  # 失败1次 + 成功1次，构造时不获取token
+
+
+def test_request_does_not_retry_draft_on_5xx(mocked_uploader, requests_mock):
+    """测试非幂等的草稿提交遇到5xx时不重试，避免重复草稿"""
+    import requests
+    mocked_uploader.http_backoff = 0.01
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/draft/add", status_code=502)
+    with pytest.raises(requests.exceptions.HTTPError):
+        mocked_uploader.add_draft([{"title": "Test"}])
+    assert mocked_uploader.http_stats()["retries"] == 0
+
+
+def test_access_token_shared_through_disk_cache(file_manager, env_file, requests_mock):
+    """测试多个实例共享磁盘缓存的token，不重复请求token接口"""
+    token_mock = requests_mock.get(
+        "https://api.weixin.qq.com/cgi-bin/token",
+        json={"access_token": "mock_token", "expires_in": 7200}
+    )
+    first = WeChatUploader(file_manager)
+    second = WeChatUploader(file_manager)
+    try:
+        assert first.access_token == second.access_token == "mock_token"
+        assert token_mock.call_count == 1
+    finally:
+        first.close()
+        second.close()
+
+
+def test_access_token_refreshed_before_expiry(file_manager, env_file, requests_mock):
+    """测试token临近过期时主动刷新"""
+    token_mock = requests_mock.get(
+        "https://api.weixin.qq.com/cgi-bin/token",
+        [{"json": {"access_token": "old_token", "expires_in": 200}},
+         {"json": {"access_token": "new_token", "expires_in": 7200}}]
+    )
+    uploader = WeChatUploader(file_manager, token_refresh_margin=300)
+    try:
+        assert token_mock.call_count == 0
+        assert uploader.access_token == "old_token"
+        assert uploader.access_token == "new_token"
+    finally:
+        uploader.close()
+
+
+def test_expired_token_refreshed_and_request_replayed(temp_dir, mocked_uploader, requests_mock):
+    """测试接口返回42001时刷新token并重放请求"""
+    image_path = temp_dir / "test.png"
+    Image.new("RGB", (10, 10)).save(image_path)
+    requests_mock.get(
+        "https://api.weixin.qq.com/cgi-bin/token",
+        json={"access_token": "fresh_token", "expires_in": 7200}
+    )
+    upload_mock = requests_mock.post(
+        "https://api.weixin.qq.com/cgi-bin/media/uploadimg",
+        [{"json": {"errcode": 42001, "errmsg": "access_token expired"}},
+         {"json": {"url": "mock_url"}}]
+    )
+    assert mocked_uploader.upload_temp_image(str(image_path)) == "mock_url"
+    assert upload_mock.last_request.qs["access_token"] == ["fresh_token"]
+
+
+def test_identical_images_uploaded_once(temp_dir, mocked_uploader, requests_mock):
+    """测试内容相同的图片只上传一次，之后直接使用缓存"""
+    first = temp_dir / "a.png"
+    second = temp_dir / "b.png"
+    Image.new("RGB", (10, 10), (1, 2, 3)).save(first)
+    Image.new("RGB", (10, 10), (1, 2, 3)).save(second)
+    temp_mock = requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg", json={"url": "mock_url"})
+    material_mock = requests_mock.post("https://api.weixin.qq.com/cgi-bin/material/add_material",
+                                       json={"media_id": "mock_media_id"})
+
+    assert mocked_uploader.upload_page(str(first)) == "mock_url"
+    assert mocked_uploader.upload_page(str(second)) == "mock_url"
+    assert mocked_uploader.upload_temp_image(str(first)) == "mock_url"
+    assert mocked_uploader.upload_image(str(first)) == "mock_media_id"
+    assert mocked_uploader.upload_image(str(second)) == "mock_media_id"
+    assert temp_mock.call_count == 1
+    assert material_mock.call_count == 1
+
+
+def test_stale_cached_upload_reuploaded(temp_dir, mocked_uploader, requests_mock):
+    """测试校验发现缓存的url失效后重新上传"""
+    image_path = temp_dir / "a.png"
+    Image.new("RGB", (10, 10)).save(image_path)
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg",
+                       [{"json": {"url": "https://mmbiz.qpic.cn/old"}}, {"json": {"url": "https://mmbiz.qpic.cn/new"}}])
+    requests_mock.head("https://mmbiz.qpic.cn/old", status_code=404)
+    mocked_uploader.upload_temp_image(str(image_path))
+
+    mocked_uploader.upload_cache.verify_after = 0
+    assert mocked_uploader.upload_temp_image(str(image_path)) == "https://mmbiz.qpic.cn/new"
+
+
+
+def test_cached_upload_kept_on_transient_verification_error(temp_dir, mocked_uploader, requests_mock):
+    """测试校验时遇到5xx按重试策略重试，仍无法确认时继续使用缓存，不重新上传"""
+    mocked_uploader.http_backoff = 0.01
+    image_path = temp_dir / "a.png"
+    Image.new("RGB", (10, 10)).save(image_path)
+    upload_mock = requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg",
+                                     json={"url": "https://mmbiz.qpic.cn/old"})
+    head_mock = requests_mock.head("https://mmbiz.qpic.cn/old", status_code=503)
+    mocked_uploader.upload_temp_image(str(image_path))
+
+    mocked_uploader.upload_cache.verify_after = 0
+    assert mocked_uploader.upload_temp_image(str(image_path)) == "https://mmbiz.qpic.cn/old"
+    assert head_mock.call_count == mocked_uploader.http_retries + 1
+    assert upload_mock.call_count == 1
+
+
+def test_cached_material_verified_through_api(temp_dir, mocked_uploader, requests_mock):
+    """测试永久素材经get_material接口校验：返回文件内容时保留缓存，返回40007时重新上传"""
+    image_path = temp_dir / "a.png"
+    Image.new("RGB", (10, 10)).save(image_path)
+    material_mock = requests_mock.post("https://api.weixin.qq.com/cgi-bin/material/add_material",
+                                       [{"json": {"media_id": "old_id"}}, {"json": {"media_id": "new_id"}}])
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/material/get_material",
+                       [{"content": b"\x89PNG image", "headers": {"Content-Type": "image/png"}},
+                        {"json": {"errcode": 40007, "errmsg": "invalid media_id"}}])
+    mocked_uploader.upload_image(str(image_path))
+
+    mocked_uploader.upload_cache.verify_after = 0
+    assert mocked_uploader.upload_image(str(image_path)) == "old_id"
+    assert mocked_uploader.upload_image(str(image_path)) == "new_id"
+    assert material_mock.call_count == 2
+
+def test_upload_temp_image_from_bytes(mocked_uploader, requests_mock):
+    """测试直接上传内存中的图片字节"""
+    from io import BytesIO
+    buffer = BytesIO()
+    Image.new("RGB", (10, 10)).save(buffer, format="JPEG")
+    upload_mock = requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg", json={"url": "mock_url"})
+
+    assert mocked_uploader.upload_page(buffer.getvalue()) == "mock_url"
+    assert b'filename="image.jpg"' in upload_mock.last_request.body
+
+
+def test_request_metrics_by_endpoint(temp_dir, mocked_uploader, requests_mock):
+    """测试接口延迟、重试和上传字节按接口记录到metrics"""
+    mocked_uploader.http_backoff = 0.01
+    image_path = temp_dir / "a.png"
+    Image.new("RGB", (10, 10)).save(image_path)
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg",
+                       [{"status_code": 503}, {"json": {"url": "mock_url"}}])
+    mocked_uploader.upload_temp_image(str(image_path))
+
+    report = mocked_uploader.metrics.report()
+    assert report["api_latency"]["media/uploadimg"]["count"] == 2
+    assert report["api_latency"]["token"]["count"] == 1
+    counters = {(c["name"], tuple(c["labels"].items())): c["value"] for c in report["counters"]}
+    assert counters[("http_retries", (("endpoint", "media/uploadimg"),))] == 1
+    assert counters[("bytes_uploaded", (("kind", "uploadimg"),))] == os.path.getsize(image_path)
+
+
+def test_in_memory_uploader_writes_no_files(temp_dir, env_file, requests_mock):
+    """测试in_memory时不创建输出目录，token和上传缓存只保存在内存中"""
+    requests_mock.get("https://api.weixin.qq.com/cgi-bin/token",
+                      json={"access_token": "mock_token", "expires_in": 7200})
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg", json={"url": "mock_url"})
+    file_manager = FileManager(desktop_path=str(temp_dir), output_base_path=str(temp_dir / "output"),
+                               create_output_base=False)
+    uploader = WeChatUploader(file_manager, in_memory=True)
+    before = sorted(os.listdir(temp_dir))
+    try:
+        assert uploader.upload_page(b"\x89PNG page", filename="page_1.png") == "mock_url"
+        assert uploader.upload_page(b"\x89PNG page", filename="page_1.png") == "mock_url"
+    finally:
+        uploader.close()
+    assert requests_mock.call_count == 2  # token + 1次上传，第二次命中内存中的上传缓存
+    assert sorted(os.listdir(temp_dir)) == before
+    assert not (temp_dir / "output").exists()
+
+
+def test_create_article_raises_on_partial_draft_failure(temp_dir, file_manager, mocked_uploader, requests_mock):
+    """测试部分草稿分片失败时抛出PartialDraftError，调用方可从中取得成功分片的media_id"""
+    from src.wechat_uploader import PartialDraftError
+    pdf_paths = []
+    for name in ("a", "b"):
+        pdf_paths.append(str(temp_dir / f"{name}.pdf"))
+        output_folder = file_manager.create_output_folder(pdf_paths[-1])
+        Image.new("RGB", (32, 32), (len(name), 0, 0)).save(os.path.join(output_folder, f"{name}_page_1.png"))
+    cover_image_path = temp_dir / "cover_image.jpg"
+    Image.new("RGB", (32, 32)).save(cover_image_path, format="JPEG")
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/material/add_material", json={"media_id": "mock_media_id"})
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/media/uploadimg", json={"url": "mock_url"})
+    requests_mock.post("https://api.weixin.qq.com/cgi-bin/draft/add",
+                       [{"json": {"media_id": "mock_article_id"}}, {"json": {"errcode": 40007, "errmsg": "invalid"}}])
+
+    with pytest.raises(PartialDraftError) as excinfo:
+        mocked_uploader.create_article(pdf_paths, ["A", "B"], cover_image_path=str(cover_image_path), max_articles=1)
+    assert [shard.media_id for shard in excinfo.value.shards if shard.ok] == ["mock_article_id"]
+    assert len([shard for shard in excinfo.value.shards if not shard.ok]) == 1